@@ -19,7 +19,7 @@ schema = graphene.Schema(query=Query)
 
 
 class Query(crm.schema.Query, graphene.ObjectType):
-    pass
+    hello = graphene.String(default_value="Hello, GraphQL!")
 
 class Mutation(crm.schema.Mutation, graphene.ObjectType):
     pass
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,6 +50,115 @@ GRAPHENE = {
     "SCHEMA": "alx_backend_graphql.schema.schema"
 }
 
+# How background jobs (crm.cron, crm.tasks) run GraphQL documents:
+# "inprocess" executes against the schema in the job's own process,
+# "http" posts to CRM_GRAPHQL_URL (e.g. for remote health probes).
+CRM_GRAPHQL_EXECUTOR = "inprocess"
+CRM_GRAPHQL_URL = "http://localhost:8000/graphql"
+# Executor used by the heartbeat cron; None follows CRM_GRAPHQL_EXECUTOR.
+CRM_HEARTBEAT_EXECUTOR = None
+
+# Parsed + validated documents kept per process (LRU, keyed by SHA-256).
+CRM_GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+# Optional JSON manifest {sha256: query} of registered persisted queries.
+CRM_PERSISTED_QUERIES_FILE = None
+# Reject any document that is not in the manifest (production lockdown).
+CRM_PERSISTED_QUERIES_ONLY = False
+
+# Opt-in cache of query responses, invalidated per model by the mutations.
+# "CACHE" names an entry of CACHES: the default local-memory cache, or e.g.
+# {"BACKEND": "django.core.cache.backends.redis.RedisCache",
+#  "LOCATION": "redis://localhost:6379/1"} to share it across workers.
+CRM_RESPONSE_CACHE = {
+    "ENABLED": False,
+    "CACHE": "default",
+    "TIMEOUT": 300,
+}
+
+# Static limits checked before a document is executed (crm.complexity).
+# Composite fields cost 1 (scalars 0), times the first/last of every
+# enclosing connection; None disables a limit.
+CRM_QUERY_LIMITS = {
+    "MAX_COST": 5000,
+    "MAX_DEPTH": 10,
+    "DEFAULT_PAGE_SIZE": None,
+    "NESTED_PAGE_SIZE": 10,
+    "FIELD_WEIGHTS": {},
+}
+
+# Per-request resolver and SQL profiling (crm.profiling). A request is
+# profiled when it sends HEADER with a true value under DEBUG or from a
+# staff user, or with SECRET as its value; or at random with SAMPLE_RATE.
+# Profiles are logged to LOGGER; requested ones are also returned in the
+# response's extensions.profile if EXTENSIONS.
+CRM_PROFILING = {
+    "SAMPLE_RATE": 0.0,
+    "HEADER": "X-CRM-Profile",
+    "SECRET": os.environ.get("CRM_PROFILING_SECRET"),
+    "EXTENSIONS": True,
+    "LOGGER": "crm.profiling",
+}
+
+# Prometheus metrics served at /metrics (crm.metrics). With several
+# processes (gunicorn workers, Celery, cron) point MULTIPROCESS_DIR, or
+# $PROMETHEUS_MULTIPROC_DIR, at a directory they share and empty it on
+# deploy; each process writes its values there at most every
+# FLUSH_INTERVAL seconds and /metrics reports the sum.
+CRM_METRICS = {
+    "ENABLED": True,
+    "MULTIPROCESS_DIR": None,
+    "FLUSH_INTERVAL": 1.0,
+    "MAX_OPERATION_NAMES": 100,
+}
+
+# Serve /graphql with crm.views.AsyncCRMGraphQLView (set by asgi.py): root
+# fields of a query are resolved concurrently, in at most
+# CRM_ASYNC_GRAPHQL_THREADS worker threads per process.
+CRM_ASYNC_GRAPHQL = os.environ.get("CRM_ASYNC_GRAPHQL") == "1"
+CRM_ASYNC_GRAPHQL_THREADS = 8
+
+# Streaming exports at /export/customers and /export/orders, and the
+# export_crm_data command (crm.export): rows are read and written
+# CHUNK_SIZE at a time.
+CRM_EXPORT = {
+    "CHUNK_SIZE": 2000,
+}
+
+# Chunked imports at /import/customers and /import/products, and the
+# import_crm_data command (crm.importer): each chunk of CHUNK_SIZE rows is
+# validated and written in one transaction. The endpoint returns at most
+# MAX_REPORTED_ERRORS row errors.
+CRM_IMPORT = {
+    "CHUNK_SIZE": 1000,
+    "MAX_REPORTED_ERRORS": 1000,
+}
+
+# Celery (crm.celery): the report task and background mutations
+# (`background: true`, crm.jobs). Job progress and results are kept in the
+# crm.Job table, so no result backend is needed. CELERY_TASK_ALWAYS_EAGER=1
+# runs tasks inline, without a broker or worker, as the tests do.
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_TASK_ALWAYS_EAGER = os.environ.get("CELERY_TASK_ALWAYS_EAGER") == "1"
+CELERY_BEAT_SCHEDULE = {
+    # Safety net for replenishment events lost while the broker was down.
+    "replenish-low-stock": {
+        "task": "crm.tasks.replenish_stock",
+        "schedule": crontab(hour=3, minute=0),
+    },
+}
+
+# Event-driven restocking (crm.replenishment): once an order commits, its
+# products below their reorder threshold are restocked by a Celery task
+# queued DELAY seconds later. Orders for a product already queued join
+# that task; CACHE holds the pending marks and must be shared by the web
+# workers (e.g. Redis) for them to coalesce across processes.
+CRM_REPLENISHMENT = {
+    "ENABLED": True,
+    "CACHE": "default",
+    "DELAY": 5,
+    "PENDING_TIMEOUT": 300,
+}
+
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -1,9 +1,15 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, export_view, import_view, metrics_view
+
+GraphQLView = AsyncCRMGraphQLView if settings.CRM_ASYNC_GRAPHQL else CRMGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path("metrics", metrics_view),
+    path("export/<str:kind>", export_view),
+    path("import/<str:kind>", import_view),
 ]
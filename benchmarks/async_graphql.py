@@ -0,0 +1,98 @@
+"""
+Load test of /graphql under ASGI: sync view vs. AsyncCRMGraphQLView.
+
+    python -m benchmarks.async_graphql --requests 200 --concurrency 20 --db-latency-ms 2
+
+Clients run concurrently on one event loop. The sync view is called the way
+Django's ASGIHandler calls it (``sync_to_async``, thread-sensitive), the
+async view directly. ``--db-latency-ms`` adds a sleep to every SQL query to
+stand in for the network round trip of a remote database.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from benchmarks.common import setup_django, test_database
+from benchmarks.datasets import generate
+
+QUERY = """
+{
+  customersCount
+  ordersCount
+  totalRevenue
+  allCustomers(first: 10) { edges { node { name } } }
+  allProducts(first: 10) { edges { node { name stock } } }
+  allOrders(first: 10) { edges { node { totalAmount customer { name } } } }
+}
+"""
+
+
+def add_db_latency(seconds):
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.insert(0, delay)
+
+    # Worker threads open their own connections later on.
+    connection_created.connect(install, weak=False)
+    for connection in connections.all():
+        connection.execute_wrappers.append(delay)
+
+
+async def run(view, total, concurrency):
+    from django.test import AsyncRequestFactory
+
+    factory = AsyncRequestFactory()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def client():
+        async with semaphore:
+            request = factory.post("/graphql", json.dumps({"query": QUERY}), content_type="application/json")
+            start = time.perf_counter()
+            response = await view(request)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.content
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(total)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    setup_django()
+    from asgiref.sync import sync_to_async
+
+    from crm.views import AsyncCRMGraphQLView, CRMGraphQLView
+
+    views = [
+        ("sync", sync_to_async(CRMGraphQLView.as_view(), thread_sensitive=True)),
+        ("async", AsyncCRMGraphQLView.as_view()),
+    ]
+    with test_database():
+        generate(customers=50, products=20, orders=200, products_per_order=1)
+        add_db_latency(args.db_latency_ms / 1000)
+        print(f"{'view':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for name, view in views:
+            seconds, latencies = asyncio.run(run(view, args.requests, args.concurrency))
+            p50 = statistics.median(latencies) * 1000
+            p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+            print(f"{name:>6} {args.requests / seconds:>8.1f} {p50:>8.1f} {p95:>8.1f} {latencies[-1] * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
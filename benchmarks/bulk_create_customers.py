@@ -0,0 +1,62 @@
+"""
+Throughput of BulkCreateCustomers: per-row path vs. set-based path.
+
+    python -m benchmarks.bulk_create_customers --sizes 1000,10000,100000
+"""
+
+import argparse
+from types import SimpleNamespace
+
+from benchmarks.common import setup_django, test_database, timer
+
+
+def make_rows(size, offset=0):
+    rows = []
+    for i in range(offset, offset + size):
+        phone = "+1234567890" if i % 2 else "123-456-7890"
+        rows.append(SimpleNamespace(name=f"Customer {i}", email=f"customer{i}@example.com", phone=phone))
+    return rows
+
+
+def per_row_create(rows):
+    """The previous mutation body: one EXISTS and one INSERT per row."""
+    from django.db import transaction
+
+    from crm.models import Customer
+    from crm.services import validate_email_unique, validate_phone_format
+
+    with transaction.atomic():
+        for row in rows:
+            validate_email_unique(row.email)
+            validate_phone_format(row.phone)
+            Customer.objects.create(name=row.name, email=row.email, phone=row.phone)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--per-row-limit", type=int, default=10000,
+                        help="skip the per-row baseline above this many rows")
+    args = parser.parse_args()
+
+    setup_django()
+    from crm.models import Customer
+    from crm.services import bulk_create_customers
+
+    with test_database():
+        print(f"{'rows':>8} {'path':>9} {'seconds':>9} {'rows/s':>10}")
+        for size in [int(s) for s in args.sizes.split(",")]:
+            paths = [("bulk", lambda rows: bulk_create_customers(rows))]
+            if size <= args.per_row_limit:
+                paths.append(("per-row", per_row_create))
+            for name, run in paths:
+                Customer.objects.all().delete()
+                rows = make_rows(size)
+                with timer() as t:
+                    run(rows)
+                assert Customer.objects.count() == size
+                print(f"{size:>8} {name:>9} {t['seconds']:>9.3f} {size / t['seconds']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
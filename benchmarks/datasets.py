@@ -0,0 +1,24 @@
+"""
+Synthetic CRM datasets for the benchmarks, from crm.generator.
+
+The same sizes and seed always produce the same data.
+"""
+
+from datetime import datetime, timezone
+
+# Fixed so that generated dates do not depend on when the benchmark runs.
+END = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def generate(customers=1000, products=200, orders=5000, products_per_order=3, seed=0):
+    """Insert a dataset into the current database; return its parameters."""
+    from crm.generator import generate_dataset
+
+    return generate_dataset(
+        customers=customers,
+        products=products,
+        orders=orders,
+        products_per_order=(products_per_order, products_per_order),
+        seed=seed,
+        end=END,
+    )
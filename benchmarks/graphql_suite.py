@@ -0,0 +1,237 @@
+"""
+GraphQL hot-path benchmark suite, executed in-process against the schema.
+
+    python -m benchmarks.graphql_suite --customers 1000 --products 200 --orders 5000 \\
+        --iterations 50 --output bench.json
+
+Each case runs a fixed document through ``alx_backend_graphql.schema.schema``
+and reports latency percentiles, SQL statements per execution and the peak
+memory allocated by one execution (tracemalloc, measured in a separate
+pass so it does not skew latencies). Mutations run inside a rolled-back
+transaction, so every iteration sees the same dataset. The JSON written to
+``--output`` (or stdout) is meant to be compared between CI runs.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+from types import SimpleNamespace
+
+from benchmarks.common import BASE_DIR, setup_django, test_database
+
+ALL_ORDERS = """
+query ($first: Int) {
+  allOrders(first: $first, orderBy: "-orderDate") {
+    edges { node {
+      id totalAmount orderDate
+      customer { name email }
+      products(first: 5) { edges { node { name price } } }
+    } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+FILTERED_PRODUCTS = """
+query ($name: String, $stockLte: Decimal, $first: Int) {
+  allProducts(first: $first, name: $name, stock_Lte: $stockLte) {
+    edges { node { id name price stock } }
+  }
+}
+"""
+
+BULK_CREATE_CUSTOMERS = """
+mutation ($input: [CustomerInput]!) {
+  bulkCreateCustomers(input: $input) { customers { id } errors }
+}
+"""
+
+CREATE_ORDER = """
+mutation ($input: OrderInput!) {
+  createOrder(input: $input) { order { id totalAmount } }
+}
+"""
+
+ANALYTICS = """
+query ($start: Date!, $end: Date!) {
+  revenueByPeriod(start: $start, end: $end, period: MONTH) { period ordersCount revenue }
+  topCustomers(start: $start, end: $end) { customer { name } revenue }
+  topProducts(start: $start, end: $end) { product { name } quantity revenue }
+}
+"""
+
+UPDATE_LOW_STOCK_PRODUCTS = """
+mutation {
+  updateLowStockProducts { message updatedProducts { name stock } }
+}
+"""
+
+
+def cases(dataset):
+    """``(name, document, variables factory, is_mutation)`` for every case."""
+    from benchmarks.datasets import END
+    from crm.models import Customer, Product
+
+    customer_id = str(Customer.objects.order_by("pk").values_list("pk", flat=True).first())
+    product_ids = [str(pk) for pk in Product.objects.order_by("pk").values_list("pk", flat=True)[:3]]
+    counter = itertools.count()
+    # The datasets' year of orders.
+    year = {"start": (END - timedelta(days=365)).date().isoformat(), "end": END.date().isoformat()}
+
+    def new_customers(size=100):
+        batch = next(counter)
+        return {"input": [
+            {"name": f"Bench {batch}-{i}", "email": f"bench{batch}-{i}@example.com", "phone": "+1234567890"}
+            for i in range(size)
+        ]}
+
+    return [
+        ("all_orders_nested", ALL_ORDERS, lambda: {"first": 50}, False),
+        ("filtered_products", FILTERED_PRODUCTS, lambda: {"name": "Product 1", "stockLte": 25, "first": 50}, False),
+        ("analytics_year", ANALYTICS, lambda: year, False),
+        ("bulk_create_customers", BULK_CREATE_CUSTOMERS, new_customers, True),
+        ("create_order", CREATE_ORDER, lambda: {"input": {"customerId": customer_id, "productIds": product_ids}}, True),
+        ("update_low_stock_products", UPDATE_LOW_STOCK_PRODUCTS, lambda: None, True),
+    ]
+
+
+class QueryCounter:
+    """execute_wrapper counting statements on the default connection."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def execute_once(document, variables, is_mutation):
+    from django.db import transaction
+
+    from alx_backend_graphql.schema import schema
+
+    with transaction.atomic():
+        result = schema.execute(document, variable_values=variables, context_value=SimpleNamespace())
+        if is_mutation:
+            transaction.set_rollback(True)
+    if result.errors:
+        raise RuntimeError(f"Benchmark document failed: {result.errors}")
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_case(document, variables_factory, is_mutation, iterations, warmup):
+    from django.db import connection
+
+    for _ in range(warmup):
+        execute_once(document, variables_factory(), is_mutation)
+
+    latencies = []
+    query_counts = []
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        for _ in range(iterations):
+            variables = variables_factory()
+            before = counter.count
+            start = time.perf_counter()
+            execute_once(document, variables, is_mutation)
+            latencies.append((time.perf_counter() - start) * 1000)
+            query_counts.append(counter.count - before)
+
+    variables = variables_factory()
+    tracemalloc.start()
+    try:
+        execute_once(document, variables, is_mutation)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "latency_ms": {
+            "min": round(latencies[0], 3),
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p90": round(percentile(latencies, 0.90), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(latencies[-1], 3),
+            "mean": round(statistics.fmean(latencies), 3),
+        },
+        "queries": {"min": min(query_counts), "max": max(query_counts)},
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def environment():
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--products-per-order", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", help="comma-separated case names")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    setup_django()
+    from benchmarks.datasets import generate
+
+    with test_database():
+        dataset = generate(args.customers, args.products, args.orders, args.products_per_order, args.seed)
+        selected = set(args.only.split(",")) if args.only else None
+        results = {}
+        print(f"{'case':<28} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KiB':>9}", file=sys.stderr)
+        for name, document, variables, is_mutation in cases(dataset):
+            if selected and name not in selected:
+                continue
+            result = run_case(document, variables, is_mutation, args.iterations, args.warmup)
+            results[name] = result
+            latency = result["latency_ms"]
+            print(
+                f"{name:<28} {latency['p50']:>9.2f} {latency['p90']:>9.2f} {latency['p99']:>9.2f} "
+                f"{result['queries']['max']:>8} {result['peak_memory_kib']:>9.1f}",
+                file=sys.stderr,
+            )
+        report = {"environment": environment(), "dataset": dataset, "results": results}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Order product filters: JOIN on the M2M vs. subqueries on the through table.
+
+    python -m benchmarks.order_filters --orders 50000 --products-per-order 4 --explain
+
+Filtering ``products__name__icontains`` joins the through table and returns
+an order once per matching product, so pages come back short of distinct
+orders (or need DISTINCT). The filters test the condition with a subquery
+instead: EXISTS for product names, which match many orders and let a page
+stop early, and ``id IN`` for a product id, read from the through table's
+product_id index. For each filter and form this prints the rows returned,
+the distinct orders among them, the distinct orders in the first page, the
+median time to fetch that page and, with ``--explain``, the query plan.
+"""
+
+import argparse
+import statistics
+import time
+
+from benchmarks.common import setup_django, test_database
+
+
+def variants(value, product_id):
+    """``(filter, {form: queryset})`` pairs, the old JOIN form first."""
+    from crm.filters import order_has_product
+    from crm.models import Order
+
+    orders = Order.objects.order_by("pk")
+    through = Order.products.through.objects
+    return [
+        ("product_name", {
+            "join": orders.filter(products__name__icontains=value),
+            "exists": orders.filter(order_has_product(name__icontains=value)),
+            "in": orders.filter(pk__in=through.filter(product__name__icontains=value).values("order_id")),
+        }),
+        ("product_id", {
+            "join": orders.filter(products__id=product_id),
+            "exists": orders.filter(order_has_product(id=product_id)),
+            "in": orders.filter(pk__in=through.filter(product_id=product_id).values("order_id")),
+        }),
+    ]
+
+
+def measure(queryset, page_size, repeat):
+    pks = list(queryset.values_list("pk", flat=True))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(queryset[:page_size])
+        timings.append((time.perf_counter() - start) * 1000)
+    page = list(queryset.values_list("pk", flat=True)[:page_size])
+    return {
+        "rows": len(pks),
+        "distinct": len(set(pks)),
+        "page_distinct": len(set(page)),
+        "ms": statistics.median(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--products-per-order", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--search", default="Product 1",
+                        help="productName value; the default matches Product 1, 10-19, 100-199")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--explain", action="store_true", help="print both query plans")
+    args = parser.parse_args()
+
+    setup_django()
+    from benchmarks.datasets import generate
+    from crm.models import Product
+
+    with test_database():
+        generate(args.customers, args.products, args.orders, args.products_per_order, args.seed)
+        product_id = Product.objects.order_by("pk").values_list("pk", flat=True).first()
+        print(f"{'filter':<14} {'form':>7} {'rows':>9} {'orders':>9} {'page':>6} {'ms':>9}")
+        for name, querysets in variants(args.search, product_id):
+            for form, queryset in querysets.items():
+                result = measure(queryset, args.page_size, args.repeat)
+                print(
+                    f"{name:<14} {form:>7} {result['rows']:>9} {result['distinct']:>9} "
+                    f"{result['page_distinct']:>6} {result['ms']:>9.2f}"
+                )
+                if args.explain:
+                    print(queryset.explain(), end="\n\n")
+
+
+if __name__ == "__main__":
+    main()
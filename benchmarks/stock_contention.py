@@ -0,0 +1,135 @@
+"""
+Concurrent createOrder on one hot product: conditional UPDATE vs. read-modify-write.
+
+    python -m benchmarks.stock_contention --stock 200 --threads 16 --orders 400 --think-ms 1
+
+Threads place single-product orders for the same product through
+``alx_backend_graphql.schema.schema`` until ``--orders`` have been tried,
+twice as many as there is stock by default. With ``reserve`` (what
+CreateOrder does) every created order takes its unit: exactly ``--stock``
+orders succeed and the stock ends at 0. ``naive`` reads the stock, checks
+it and saves it back, the race reserve_stock() closes: ``--think-ms``
+widens the window between the read and the write, and the orders created
+without taking stock are counted as oversold. Database lock errors (SQLite
+serializes writers) are retried and counted apart from shortfalls. SQLite's
+table locks also turn most naive races into lock errors; the oversold
+orders show against PostgreSQL.
+"""
+
+import argparse
+import threading
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from benchmarks.common import setup_django, test_database
+
+MUTATION = """
+mutation ($input: OrderInput!) { createOrder(input: $input) { order { id } message } }
+"""
+
+
+def naive_reserve(think):
+    from crm.models import Product
+    from crm.services import InsufficientStock
+
+    def reserve(products, quantities=None):
+        for product in products:
+            stock = Product.objects.values_list("stock", flat=True).get(pk=product.pk)
+            time.sleep(think)
+            if stock < 1:
+                raise InsufficientStock(f"Insufficient stock for {product.name}.")
+            Product.objects.filter(pk=product.pk).update(stock=stock - 1)
+
+    return reserve
+
+
+def run(customer_id, product_id, threads, orders, retries):
+    from django.db import connections
+
+    from alx_backend_graphql.schema import schema
+
+    variables = {"input": {"customerId": str(customer_id), "productIds": [str(product_id)]}}
+    counts = dict.fromkeys(["created", "shortfall", "locked", "failed"], 0)
+    lock = threading.Lock()
+    remaining = iter(range(orders))
+
+    def place():
+        for attempt in range(retries + 1):
+            result = schema.execute(MUTATION, variable_values=variables, context_value=SimpleNamespace())
+            if not result.errors:
+                return "created" if result.data["createOrder"]["order"] else "shortfall"
+            if not any("locked" in str(e) for e in result.errors):
+                return "failed"
+            with lock:
+                counts["locked"] += 1
+            time.sleep(0.001 * (attempt + 1))
+        return "failed"
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                outcome = place()
+                with lock:
+                    counts[outcome] += 1
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    counts["seconds"] = time.perf_counter() - start
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--orders", type=int, default=None, help="orders tried; default twice the stock")
+    parser.add_argument("--think-ms", type=float, default=1.0, help="naive: pause between reading and writing")
+    parser.add_argument("--retries", type=int, default=50, help="attempts of an order hitting a lock error")
+    parser.add_argument("--variant", choices=["reserve", "naive", "both"], default="both")
+    args = parser.parse_args()
+    orders = args.orders or 2 * args.stock
+
+    setup_django()
+    from django.test import override_settings
+
+    from crm.models import Customer, Order, Product
+
+    variants = ["reserve", "naive"] if args.variant == "both" else [args.variant]
+    print(f"{'variant':<8} {'created':>8} {'short':>6} {'locked':>7} {'failed':>7} "
+          f"{'stock':>6} {'oversold':>9} {'orders/s':>9}")
+    # No broker here: replenishment would put the stock back mid-run anyway.
+    with test_database(), override_settings(CRM_REPLENISHMENT={"ENABLED": False}):
+        customer = Customer.objects.create(name="Bench", email="bench@example.com")
+        for variant in variants:
+            Order.objects.all().delete()
+            product = Product.objects.create(name=f"Hot {variant}", price=Decimal("1.00"), stock=args.stock)
+            patch = mock.patch("crm.schema.reserve_stock", naive_reserve(args.think_ms / 1000))
+            if variant == "naive":
+                patch.start()
+            try:
+                counts = run(customer.pk, product.pk, args.threads, orders, args.retries)
+            finally:
+                if variant == "naive":
+                    patch.stop()
+            stock = Product.objects.get(pk=product.pk).stock
+            # Orders created without their unit of stock being taken (lost updates).
+            oversold = counts["created"] - (args.stock - stock)
+            print(
+                f"{variant:<8} {counts['created']:>8} {counts['shortfall']:>6} {counts['locked']:>7} "
+                f"{counts['failed']:>7} {stock:>6} {oversold:>9} {counts['created'] / counts['seconds']:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
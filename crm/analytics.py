@@ -0,0 +1,187 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from crm.models import DailyCustomerRevenue, DailyProductSales, DailyRevenue, LINE_TOTAL, Order, OrderItem
+
+BATCH_SIZE = 500
+PERIODS = {"day": None, "week": TruncWeek, "month": TruncMonth}
+CENTS = Decimal("0.01")
+
+
+def order_day(value):
+    """The day (in the current time zone) an order date falls on."""
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# ==========================================================
+# Maintenance
+# ==========================================================
+def _key_condition(keys, key_values):
+    condition = Q()
+    for values in key_values:
+        condition |= Q(**dict(zip(keys, values)))
+    return condition
+
+
+def _increment(model, keys, deltas, delete_empty=False):
+    """
+    Add ``deltas`` ({key values: {field: delta}}) to the rows of ``model``
+    identified by ``keys``: the missing rows are inserted first, then every
+    row is updated by one ``UPDATE ... SET f = f + CASE ... END`` per chunk.
+    Concurrent orders add to the same rows without a read-modify-write.
+    With ``delete_empty``, rows brought back to zero are deleted.
+    """
+    pending = iter(deltas.items())
+    while chunk := list(islice(pending, BATCH_SIZE)):
+        model.objects.bulk_create(
+            [model(**dict(zip(keys, key))) for key, _ in chunk], ignore_conflicts=True
+        )
+        matches = [(_key_condition(keys, [key]), values) for key, values in chunk]
+        changes = {}
+        for field in chunk[0][1]:
+            output = model._meta.get_field(field)
+            case = Case(
+                *[When(match, then=Value(values[field], output_field=output)) for match, values in matches],
+                default=Value(0, output_field=output),
+                output_field=output,
+            )
+            changes[field] = F(field) + case
+        rows = model.objects.filter(_key_condition(keys, [key for key, _ in chunk]))
+        rows.update(**changes)
+        if delete_empty:
+            rows.filter(**dict.fromkeys(changes, 0)).delete()
+
+
+def record_order_rollups(orders):
+    """
+    Call inside the transaction that created ``orders``: ``(order, items)``
+    pairs. Adds them to the daily revenue, customer and product rollups.
+    """
+    revenue = defaultdict(lambda: {"orders_count": 0, "revenue": Decimal("0")})
+    customers = defaultdict(lambda: {"orders_count": 0, "revenue": Decimal("0")})
+    products = defaultdict(lambda: {"quantity": 0, "revenue": Decimal("0")})
+    for order, items in orders:
+        day = order_day(order.order_date)
+        for totals in (revenue[(day,)], customers[(day, order.customer_id)]):
+            totals["orders_count"] += 1
+            totals["revenue"] += order.total_amount
+        for item in items:
+            totals = products[(day, item.product_id)]
+            totals["quantity"] += item.quantity
+            totals["revenue"] += item.line_total
+    _increment(DailyRevenue, ["date"], revenue)
+    _increment(DailyCustomerRevenue, ["date", "customer_id"], customers)
+    _increment(DailyProductSales, ["date", "product_id"], products)
+
+
+def _rollup_rows(orders, items):
+    """``(model, keys, rows)``: ``orders`` and their ``items`` aggregated by day in the database."""
+    tz = timezone.get_current_timezone()
+    orders = orders.annotate(date=TruncDate("order_date", tzinfo=tz)).order_by()
+    items = items.annotate(date=TruncDate("order__order_date", tzinfo=tz)).order_by()
+    return [
+        (DailyRevenue, ["date"], orders.values("date").annotate(
+            orders_count=Count("pk"), revenue=Sum("total_amount"),
+        )),
+        (DailyCustomerRevenue, ["date", "customer_id"], orders.values("date", "customer_id").annotate(
+            orders_count=Count("pk"), revenue=Sum("total_amount"),
+        )),
+        # revenue first: the quantity annotation then shadows the column.
+        (DailyProductSales, ["date", "product_id"], items.values("date", "product_id").annotate(
+            revenue=Sum(LINE_TOTAL), quantity=Sum("quantity"),
+        )),
+    ]
+
+
+def forget_orders(orders):
+    """
+    Call inside the transaction, before deleting ``orders``: take them out
+    of the rollups. Rows left empty are deleted, as a rebuild would.
+    """
+    items = OrderItem.objects.filter(order__in=orders)
+    for model, keys, rows in _rollup_rows(orders, items):
+        deltas = {}
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            key = tuple(row.pop(name) for name in keys)
+            deltas[key] = {name: -value for name, value in row.items()}
+        _increment(model, keys, deltas, delete_empty=True)
+
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Recompute the rollups of the days ``start`` to ``end`` (inclusive; all
+    days by default) from the orders; used by the reconciliation command
+    and after bulk loads that bypass the mutations.
+    """
+    orders = Order.objects.all()
+    items = OrderItem.objects.all()
+    rollups = [DailyRevenue.objects.all(), DailyCustomerRevenue.objects.all(), DailyProductSales.objects.all()]
+    if start is not None:
+        orders = orders.filter(order_date__gte=day_start(start))
+        items = items.filter(order__order_date__gte=day_start(start))
+        rollups = [queryset.filter(date__gte=start) for queryset in rollups]
+    if end is not None:
+        orders = orders.filter(order_date__lt=day_start(end + timedelta(days=1)))
+        items = items.filter(order__order_date__lt=day_start(end + timedelta(days=1)))
+        rollups = [queryset.filter(date__lte=end) for queryset in rollups]
+
+    with transaction.atomic():
+        for queryset in rollups:
+            queryset.delete()
+        for model, _, rows in _rollup_rows(orders, items):
+            rows = rows.iterator(chunk_size=BATCH_SIZE)
+            while chunk := [model(**row) for row in islice(rows, BATCH_SIZE)]:
+                model.objects.bulk_create(chunk)
+
+
+# ==========================================================
+# Queries
+# ==========================================================
+def _amounts(rows):
+    # SQLite returns sums without their scale (10 for 10.00).
+    for row in rows:
+        row["revenue"] = row["revenue"].quantize(CENTS)
+    return rows
+
+
+def revenue_by_period(start, end, period="day"):
+    """``[{"period", "orders_count", "revenue"}]`` for the buckets of ``start`` to ``end``."""
+    rows = DailyRevenue.objects.filter(date__gte=start, date__lte=end)
+    trunc = PERIODS[period]
+    bucket = F("date") if trunc is None else trunc("date")
+    return _amounts(list(
+        rows.annotate(period=bucket).values("period")
+        .annotate(orders_count=Sum("orders_count"), revenue=Sum("revenue"))
+        .order_by("period")
+    ))
+
+
+def top_customers(start, end, limit):
+    """``[{"customer_id", "orders_count", "revenue"}]``, highest revenue first."""
+    rows = DailyCustomerRevenue.objects.filter(date__gte=start, date__lte=end)
+    return _amounts(list(
+        rows.values("customer_id")
+        .annotate(orders_count=Sum("orders_count"), revenue=Sum("revenue"))
+        .order_by("-revenue", "customer_id")[:limit]
+    ))
+
+
+def top_products(start, end, limit):
+    """``[{"product_id", "quantity", "revenue"}]``, highest revenue first."""
+    rows = DailyProductSales.objects.filter(date__gte=start, date__lte=end)
+    return _amounts(list(
+        rows.values("product_id")
+        .annotate(quantity=Sum("quantity"), revenue=Sum("revenue"))
+        .order_by("-revenue", "product_id")[:limit]
+    ))
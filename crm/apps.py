@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from crm.metrics import install_query_counter
+
+        connection_created.connect(install_query_counter, dispatch_uid="crm.metrics.install_query_counter")
@@ -0,0 +1,147 @@
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode, FragmentDefinitionNode, FragmentSpreadNode, GraphQLError, InlineFragmentNode,
+    get_named_type, get_operation_ast, is_composite_type,
+)
+from graphql.execution.values import get_argument_values
+
+DEFAULT_SETTINGS = {
+    "MAX_COST": 5000,
+    "MAX_DEPTH": 10,
+    # Page size assumed for connections queried without first/last;
+    # None means graphene's RELAY_CONNECTION_MAX_LIMIT.
+    "DEFAULT_PAGE_SIZE": None,
+    # Default first of the connections on object types (an order's
+    # products, see crm.dataloaders.BatchedConnectionField), and their cost:
+    # a few rows per parent, not a full page each.
+    "NESTED_PAGE_SIZE": 10,
+    # {"Type.field": weight}, merged over FIELD_WEIGHTS.
+    "FIELD_WEIGHTS": {},
+}
+
+# Weights that differ from the default: 1 for object fields, 0 for scalars.
+FIELD_WEIGHTS = {
+    "Mutation.bulkCreateCustomers": 10,
+    "Mutation.bulkCreateOrders": 10,
+    "Mutation.updateLowStockProducts": 10,
+}
+
+
+class QueryComplexityError(GraphQLError):
+    def __init__(self, message, code, cost, depth, limits):
+        super().__init__(message, extensions={
+            "code": code,
+            "cost": cost,
+            "maxCost": limits["MAX_COST"],
+            "depth": depth,
+            "maxDepth": limits["MAX_DEPTH"],
+        })
+
+
+def get_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, "CRM_QUERY_LIMITS", {})}
+
+
+# ==========================================================
+# Static analysis
+# ==========================================================
+class _Analyzer:
+    def __init__(self, schema, document, variables, limits, root_type):
+        self.schema = schema
+        self.root_type = root_type
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.weights = {**FIELD_WEIGHTS, **limits["FIELD_WEIGHTS"]}
+        self.page_size = limits["DEFAULT_PAGE_SIZE"] or graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        self.nested_page_size = limits["NESTED_PAGE_SIZE"] or self.page_size
+
+    def fields(self, selection_set, parent_type, visited=()):
+        """``(field_node, parent_type)`` pairs, with fragments inlined."""
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection, parent_type
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                fragment_type = self.schema.get_type(condition.name.value) if condition else parent_type
+                yield from self.fields(selection.selection_set, fragment_type, visited)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    continue
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                yield from self.fields(fragment.selection_set, fragment_type, visited + (name,))
+
+    def page(self, field_def, field_node, parent_type):
+        """Rows a connection field may return; 1 for anything else."""
+        if "first" not in field_def.args and "last" not in field_def.args:
+            return 1
+        try:
+            args = get_argument_values(field_def, field_node, self.variables)
+        except GraphQLError:
+            # Bad arguments are reported by execution; assume the default.
+            args = {}
+        sizes = [args[name] for name in ("first", "last") if args.get(name) is not None]
+        if sizes:
+            return min(sizes)
+        # Connections of object types (not root fields) default to a nested page.
+        return self.page_size if parent_type is self.root_type else self.nested_page_size
+
+    def selection_set(self, selection_set, parent_type):
+        """``(cost, depth)`` of the fields selected on ``parent_type``."""
+        cost = depth = 0
+        for field_node, field_parent in self.fields(selection_set, parent_type):
+            name = field_node.name.value
+            if name.startswith("__"):
+                # Introspection (e.g. GraphiQL) is never limited.
+                continue
+            field_def = getattr(field_parent, "fields", {}).get(name)
+            if field_def is None:
+                continue
+            field_type = get_named_type(field_def.type)
+            weight = self.weights.get(f"{field_parent.name}.{name}", 1 if is_composite_type(field_type) else 0)
+            child_cost = child_depth = 0
+            if field_node.selection_set:
+                child_cost, child_depth = self.selection_set(field_node.selection_set, field_type)
+            cost += weight + self.page(field_def, field_node, field_parent) * child_cost
+            depth = max(depth, child_depth + 1)
+        return cost, depth
+
+
+def analyze(schema, document, variables=None, operation_name=None):
+    """``(cost, depth)`` of the operation that would be executed."""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0, 0
+    root_type = schema.get_root_type(operation.operation)
+    analyzer = _Analyzer(schema, document, variables, get_settings(), root_type)
+    return analyzer.selection_set(operation.selection_set, root_type)
+
+
+def check_query_limits(schema, document, variables=None, operation_name=None):
+    """
+    Reject a document whose static cost or depth exceeds CRM_QUERY_LIMITS.
+
+    Every composite field costs its weight (1 by default, scalars 0) and
+    the cost of its selection is multiplied by the connection's
+    ``first``/``last`` (or the default, or nested, page size). Runs on the validated
+    document before any resolver, so a rejected query issues no SQL.
+    """
+    limits = get_settings()
+    cost, depth = analyze(schema, document, variables, operation_name)
+    if limits["MAX_DEPTH"] is not None and depth > limits["MAX_DEPTH"]:
+        raise QueryComplexityError(
+            f"Query depth {depth} exceeds the maximum of {limits['MAX_DEPTH']}.",
+            "QUERY_TOO_DEEP", cost, depth, limits,
+        )
+    if limits["MAX_COST"] is not None and cost > limits["MAX_COST"]:
+        raise QueryComplexityError(
+            f"Query cost {cost} exceeds the maximum of {limits['MAX_COST']}.",
+            "QUERY_TOO_COMPLEX", cost, depth, limits,
+        )
+    return cost, depth
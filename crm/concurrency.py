@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from graphql import ExecutionContext, OperationType
+
+from crm.profiling import capture_sql
+
+DEFAULT_THREADS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The bounded pool root fields are resolved in, shared by the process."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "CRM_ASYNC_GRAPHQL_THREADS", DEFAULT_THREADS),
+                    thread_name_prefix="crm-graphql",
+                )
+    return _executor
+
+
+def run_in_worker(context, fn, *args):
+    # Each worker thread has its own database connection; treat every job
+    # like a request so CONN_MAX_AGE and broken connections are honoured.
+    close_old_connections()
+    try:
+        with capture_sql(context):
+            return fn(*args)
+    finally:
+        close_old_connections()
+
+
+class ConcurrentExecutionContext(ExecutionContext):
+    """
+    Resolves every root field of a query in its own worker thread.
+
+    Each root field (resolver plus its whole sub-selection) runs synchronously
+    in the pool, so the ORM is never called from the event loop, while
+    graphql-core gathers the root fields concurrently. Mutations keep their
+    serial execution on the calling thread.
+    """
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if path.prev is not None or self.operation.operation != OperationType.QUERY:
+            return super().execute_field(parent_type, source, field_nodes, path)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Plain execute() from synchronous code: behave like the base class.
+            return super().execute_field(parent_type, source, field_nodes, path)
+        return loop.run_in_executor(
+            get_executor(),
+            partial(
+                run_in_worker, self.context_value,
+                super().execute_field, parent_type, source, field_nodes, path,
+            ),
+        )
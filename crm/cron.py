@@ -1,32 +1,39 @@
 import datetime
-import requests
-from gql.transport.requests import RequestsHTTPTransport", "from gql import", "gql", "Client
 
+from django.conf import settings
+
+from crm.executor import execute_graphql
+from crm.metrics import observe_job
+
+HEARTBEAT_LOG = "/tmp/crm_heartbeat_log.txt"
+LOW_STOCK_LOG = "/tmp/low_stock_updates_log.txt"
+
+
+@observe_job
 def log_crm_heartbeat():
     timestamp = datetime.datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
     log_message = f"{timestamp} CRM is alive\n"
 
     # Write log
-    with open("/tmp/crm_heartbeat_log.txt", "a") as f:
+    with open(HEARTBEAT_LOG, "a") as f:
         f.write(log_message)
 
-    # Optional: ping GraphQL "hello" query
+    # Optional: ping GraphQL "hello" query. Set CRM_HEARTBEAT_EXECUTOR = "http"
+    # to probe the web tier instead of the schema.
     try:
-        query = {"query": "{ hello }"}
-        response = requests.post("http://localhost:8000/graphql", json=query)
-        if response.status_code == 200:
-            with open("/tmp/crm_heartbeat_log.txt", "a") as f:
-                f.write(f"{timestamp} GraphQL OK: {response.json()}\n")
-        else:
-            with open("/tmp/crm_heartbeat_log.txt", "a") as f:
-                f.write(f"{timestamp} GraphQL ERROR: {response.status_code}\n")
+        data = execute_graphql("{ hello }", mode=getattr(settings, "CRM_HEARTBEAT_EXECUTOR", None))
+        with open(HEARTBEAT_LOG, "a") as f:
+            if "errors" in data:
+                f.write(f"{timestamp} GraphQL ERROR: {data['errors']}\n")
+            else:
+                f.write(f"{timestamp} GraphQL OK: {data}\n")
     except Exception as e:
-        with open("/tmp/crm_heartbeat_log.txt", "a") as f:
+        with open(HEARTBEAT_LOG, "a") as f:
             f.write(f"{timestamp} GraphQL EXCEPTION: {str(e)}\n")
 #-------------------------------
 
+@observe_job
 def update_low_stock():
-    url = "http://localhost:8000/graphql"
     query = """
     mutation {
         updateLowStockProducts {
@@ -40,13 +47,11 @@ def update_low_stock():
     """
 
     try:
-        response = requests.post(url, json={'query': query})
-        data = response.json()
+        data = execute_graphql(query)
 
-        now = datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
-        log_file = "/tmp/low_stock_updates_log.txt"
+        now = datetime.datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
 
-        with open(log_file, "a") as f:
+        with open(LOW_STOCK_LOG, "a") as f:
             if "errors" in data:
                 f.write(f"{now} ERROR: {data['errors']}\n")
             else:
@@ -57,5 +62,5 @@ def update_low_stock():
                     f.write(f"- {product['name']} new stock: {product['stock']}\n")
 
     except Exception as e:
-        with open("/tmp/low_stock_updates_log.txt", "a") as f:
-            f.write(f"EXCEPTION {str(e)}\n")
\ No newline at end of file
+        with open(LOW_STOCK_LOG, "a") as f:
+            f.write(f"EXCEPTION {str(e)}\n")
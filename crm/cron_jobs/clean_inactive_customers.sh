@@ -15,6 +15,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql.settings")
 django.setup()
 
 from crm.models import Customer
+from crm.stats import delete_customers
 from django.db.models import Max
 
 one_year_ago = timezone.now() - timedelta(days=365)
@@ -25,8 +26,7 @@ customers = Customer.objects.annotate(
     last_order_date__lt=one_year_ago
 ) | Customer.objects.filter(orders__isnull=True)
 
-count = customers.count()
-customers.delete()
+count = delete_customers(customers)
 print(count)
 EOF
 )
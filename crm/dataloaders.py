@@ -0,0 +1,345 @@
+import threading
+from collections import defaultdict
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import Least, RowNumber
+from graphene_django import DjangoConnectionField
+from graphene_django.filter import DjangoFilterConnectionField
+from graphql_relay import get_offset_with_default
+
+from crm.complexity import get_settings as get_query_limits
+from crm.models import Customer, Product, Order, OrderItem
+
+
+# ==========================================================
+# Loaders
+# ==========================================================
+class DataLoader:
+    """
+    Synchronous per-request loader.
+
+    Keys are queued with ``prime()`` (usually for a whole page of parent
+    objects) and the first ``load()`` fetches every queued key in a single
+    ``batch_load()`` call. Results are cached for the rest of the request.
+    Loaders of one request share a lock, so root fields resolved in
+    parallel threads (see crm.concurrency) can use them safely.
+    """
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self._cache = {}
+        self._queue = {}
+
+    def batch_load(self, keys):
+        """Return a dict mapping keys to values for ``keys``."""
+        raise NotImplementedError
+
+    def empty(self):
+        return None
+
+    def prime(self, keys):
+        with self.loaders.lock:
+            for key in keys:
+                if key not in self._cache:
+                    self._queue[key] = None
+
+    def load(self, key):
+        with self.loaders.lock:
+            if key not in self._cache:
+                self.prime([key])
+                self.dispatch()
+            return self._cache[key]
+
+    def dispatch(self):
+        with self.loaders.lock:
+            keys = list(self._queue)
+            self._queue.clear()
+            if not keys:
+                return
+            values = self.batch_load(keys)
+            for key in keys:
+                self._cache[key] = values.get(key, self.empty())
+
+
+class ListLoader(DataLoader):
+    def empty(self):
+        return []
+
+
+class CustomerLoader(DataLoader):
+    """customer id -> Customer"""
+
+    def batch_load(self, keys):
+        customers = Customer.objects.in_bulk(keys)
+        self.loaders.prime(customers.values())
+        return customers
+
+
+class ProductLoader(DataLoader):
+    """product id -> Product"""
+
+    def batch_load(self, keys):
+        products = Product.objects.in_bulk(keys)
+        self.loaders.prime(products.values())
+        return products
+
+
+class OrderProductsLoader(ListLoader):
+    """order id -> [Product], read from the order items"""
+
+    def batch_load(self, order_ids):
+        through = OrderItem.objects.filter(order_id__in=order_ids)
+        products = {}
+        result = defaultdict(list)
+        for row in through.select_related("product").order_by("order_id", "product_id"):
+            product = products.setdefault(row.product_id, row.product)
+            result[row.order_id].append(product)
+        self.loaders.prime(products.values())
+        return result
+
+
+class OrderItemsLoader(ListLoader):
+    """order id -> [OrderItem], with their products"""
+
+    def batch_load(self, order_ids):
+        items = OrderItem.objects.filter(order_id__in=order_ids).select_related("product")
+        result = defaultdict(list)
+        for item in items.order_by("order_id", "product_id"):
+            result[item.order_id].append(item)
+        self.loaders.prime({item.product_id: item.product for group in result.values() for item in group}.values())
+        return result
+
+
+class Page:
+    """
+    Items ``start`` to ``start + len(items)`` of a list of ``length`` items.
+
+    What the page loaders return: the connection field sees the full
+    length (totalCount, pageInfo) and slices it down to the fetched page.
+    """
+
+    def __init__(self, items, start, length):
+        self.items = items
+        self.start = start
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self.items[index - self.start]
+        start, stop, _ = index.indices(self.length)
+        first = max(start, self.start)
+        last = max(min(stop, self.start + len(self.items)), first)
+        return Page(self.items[first - self.start:last - self.start], first - start, max(stop - start, 0))
+
+
+def page_window(args, max_limit):
+    """
+    ``(after, stop, last)``: the positions of a parent's list a connection
+    page can show, from its first/last/after/before arguments. Rows after
+    position ``after`` and up to ``stop`` (None: the end), of which the
+    ``last`` ones (None: all).
+    """
+    after = get_offset_with_default(args.get("after"), -1) + 1
+    stop = get_offset_with_default(args.get("before"), None)
+    first, last = args.get("first"), args.get("last")
+    if first is None and last is None:
+        first = max_limit
+    if first is not None:
+        stop = after + first if stop is None else min(stop, after + first)
+    return after, stop, last
+
+
+class PageLoader(DataLoader):
+    """
+    (parent id, page_window()) -> Page of the parent's related rows.
+
+    Parents are primed by id; the first load() of a window fetches that
+    window for every primed parent in one query, numbering each parent's
+    rows with ROW_NUMBER() so that only the page is read, whatever the
+    number of related rows.
+    """
+    parent_field = None
+    order_field = "pk"
+
+    def __init__(self, loaders):
+        super().__init__(loaders)
+        self._parents = set()
+
+    def queryset(self, parent_ids):
+        raise NotImplementedError
+
+    def item(self, row):
+        return row
+
+    def prime(self, keys):
+        with self.loaders.lock:
+            self._parents.update(keys)
+
+    def load(self, parent_id, window):
+        with self.loaders.lock:
+            self._parents.add(parent_id)
+            for parent in self._parents:
+                if (parent, window) not in self._cache:
+                    self._queue[(parent, window)] = None
+            self.dispatch()
+            return self._cache[(parent_id, window)]
+
+    def batch_load(self, keys):
+        by_window = defaultdict(list)
+        for parent, window in keys:
+            by_window[window].append(parent)
+        result = {}
+        for window, parents in by_window.items():
+            after, stop, last = window
+            rows = self.queryset(parents).annotate(
+                position=Window(RowNumber(), partition_by=F(self.parent_field), order_by=F(self.order_field).asc()),
+                length=Window(Count("pk"), partition_by=F(self.parent_field)),
+            ).filter(position__gt=after)
+            if stop is not None:
+                rows = rows.filter(position__lte=stop)
+            if last is not None:
+                end = F("length") if stop is None else Least(F("length"), stop)
+                rows = rows.filter(position__gt=end - last)
+            pages = defaultdict(list)
+            lengths = {}
+            for row in rows.order_by(self.parent_field, "position"):
+                parent = getattr(row, self.parent_field)
+                pages[parent].append(self.item(row))
+                lengths[parent] = row.length
+            missing = [parent for parent in parents if parent not in lengths]
+            if missing:
+                # Pages past the end (or of size 0) still report their length.
+                counts = self.queryset(missing).order_by().values_list(self.parent_field).annotate(Count("pk"))
+                lengths.update(counts)
+            for parent in parents:
+                length = lengths.get(parent, 0)
+                end = length if stop is None else min(stop, length)
+                start = after if last is None else max(after, end - last)
+                result[(parent, window)] = Page(pages.get(parent, []), min(start, length), length)
+            self.loaders.prime(item for items in pages.values() for item in items)
+        return result
+
+    def empty(self):
+        return Page([], 0, 0)
+
+
+class CustomerOrdersLoader(PageLoader):
+    """(customer id, window) -> Page of Orders"""
+    parent_field = "customer_id"
+
+    def queryset(self, customer_ids):
+        return Order.objects.filter(customer_id__in=customer_ids)
+
+
+class ProductOrdersLoader(PageLoader):
+    """(product id, window) -> Page of Orders, read from the order items"""
+    parent_field = "product_id"
+    order_field = "order_id"
+
+    def queryset(self, product_ids):
+        return OrderItem.objects.filter(product_id__in=product_ids).select_related("order")
+
+    def item(self, row):
+        return row.order
+
+
+class Loaders:
+    """All loaders for one request, plus the priming rules between them."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.customer = CustomerLoader(self)
+        self.product = ProductLoader(self)
+        self.order_products = OrderProductsLoader(self)
+        self.order_items = OrderItemsLoader(self)
+        self.customer_orders = CustomerOrdersLoader(self)
+        self.product_orders = ProductOrdersLoader(self)
+
+    def prime(self, instances):
+        # Queue the relations of every object we have seen so that the next
+        # level of the query is fetched in one batch, whatever the parent.
+        with self.lock:
+            for instance in instances:
+                if isinstance(instance, Order):
+                    # Relations already fetched by the queryset optimizer are not
+                    # queued again, but their own relations still are.
+                    if Order.customer.is_cached(instance):
+                        self.prime([instance.customer])
+                    else:
+                        self.customer.prime([instance.customer_id])
+                    if is_prefetched(instance, "products"):
+                        self.prime(instance.products.all())
+                    else:
+                        self.order_products.prime([instance.pk])
+                    self.order_items.prime([instance.pk])
+                elif isinstance(instance, Customer):
+                    self.customer_orders.prime([instance.pk])
+                elif isinstance(instance, Product):
+                    self.product_orders.prime([instance.pk])
+
+
+def is_prefetched(instance, name):
+    return name in getattr(instance, "_prefetched_objects_cache", {})
+
+
+def get_loaders(info):
+    """Return the loaders attached to the current request (``info.context``)."""
+    context = info.context
+    loaders = getattr(context, "crm_loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        try:
+            context.crm_loaders = loaders
+        except AttributeError:
+            # No request object (e.g. schema.execute() without context_value):
+            # still correct, just not batched across objects.
+            pass
+    return loaders
+
+
+# ==========================================================
+# Connection fields
+# ==========================================================
+class BatchingConnectionMixin:
+    """Primes the request loaders with every node of the resolved page."""
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager, queryset_resolver,
+                            max_limit, enforce_first_or_last, root, info, **args):
+        result = super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver,
+            max_limit, enforce_first_or_last, root, info, **args
+        )
+        edges = getattr(result, "edges", None)
+        if edges is not None:
+            get_loaders(info).prime(edge.node for edge in edges)
+        return result
+
+
+class BatchedConnectionField(BatchingConnectionMixin, DjangoConnectionField):
+    """
+    Connection of an object's relation (a customer's orders). Queried
+    without first/last it returns CRM_QUERY_LIMITS' NESTED_PAGE_SIZE rows,
+    the page size crm.complexity costs it at, rather than a full page.
+    """
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager, queryset_resolver,
+                            max_limit, enforce_first_or_last, root, info, **args):
+        page_size = get_query_limits()["NESTED_PAGE_SIZE"]
+        if page_size and args.get("first") is None and args.get("last") is None:
+            args["first"] = min(page_size, max_limit) if max_limit else page_size
+        return super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver,
+            max_limit, enforce_first_or_last, root, info, **args
+        )
+
+
+class BatchedFilterConnectionField(BatchingConnectionMixin, DjangoFilterConnectionField):
+    pass
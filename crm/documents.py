@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from graphql import GraphQLError, parse
+from graphql.validation import validate
+from graphene_django.settings import graphene_settings
+
+DEFAULT_CACHE_SIZE = 256
+
+
+class PersistedQueryError(GraphQLError):
+    def __init__(self, message, code):
+        super().__init__(message, extensions={"code": code})
+
+
+# ==========================================================
+# Parsed + validated document cache
+# ==========================================================
+class DocumentCache:
+    """Thread-safe bounded LRU of parsed and validated documents, keyed by SHA-256."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def set(self, key, document):
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    def __len__(self):
+        return len(self._documents)
+
+
+_cache = None
+
+
+def get_document_cache():
+    global _cache
+    if _cache is None:
+        _cache = DocumentCache(getattr(settings, "CRM_GRAPHQL_DOCUMENT_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    return _cache
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def load_manifest(path):
+    """``{sha256: query}`` from the JSON file at ``path``; hashes are checked."""
+    if not path:
+        return {}
+    with open(path) as f:
+        manifest = json.load(f)
+    for key, query in manifest.items():
+        if query_hash(query) != key:
+            raise ValueError(f"Persisted query {key} does not match its SHA-256 hash.")
+    return manifest
+
+
+# ==========================================================
+# Resolution
+# ==========================================================
+def resolve_document(schema, query, extensions=None, validation_rules=None):
+    """
+    Return ``(document, errors)`` for a request, Automatic Persisted Queries
+    style: ``extensions.persistedQuery.sha256Hash`` may replace the query
+    text. Only documents that parse and validate are cached, so a cache hit
+    costs a hash lookup. With ``CRM_PERSISTED_QUERIES_ONLY`` only documents
+    from the ``CRM_PERSISTED_QUERIES_FILE`` manifest are accepted.
+
+    Returns ``(None, [])`` when the request carries neither a query nor a hash.
+    """
+    persisted = (extensions or {}).get("persistedQuery") or {}
+    key = persisted.get("sha256Hash")
+    manifest = load_manifest(getattr(settings, "CRM_PERSISTED_QUERIES_FILE", None))
+
+    if query:
+        actual = query_hash(query)
+        if key and key != actual:
+            raise PersistedQueryError("provided sha does not match query", "PERSISTED_QUERY_HASH_MISMATCH")
+        key = actual
+    elif not key:
+        return None, []
+
+    if getattr(settings, "CRM_PERSISTED_QUERIES_ONLY", False) and key not in manifest:
+        raise PersistedQueryError("PersistedQueryNotRegistered", "PERSISTED_QUERY_NOT_REGISTERED")
+
+    cache = get_document_cache()
+    document = cache.get(key)
+    if document is not None:
+        return document, []
+
+    if not query:
+        query = manifest.get(key)
+        if query is None:
+            # The client retries with the full query text, which registers it.
+            raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+
+    try:
+        document = parse(query)
+    except GraphQLError as e:
+        return None, [e]
+    errors = validate(schema, document, validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+    if errors:
+        return None, errors
+    cache.set(key, document)
+    return document, []
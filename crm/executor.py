@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import requests
+from django.conf import settings
+
+IN_PROCESS = "inprocess"
+HTTP = "http"
+
+
+def execute_graphql(query, variables=None, mode=None):
+    """
+    Run a GraphQL document for background jobs and return the response dict
+    (``{"data": ..., "errors": [...]}``, as the HTTP endpoint would).
+
+    ``mode`` defaults to ``settings.CRM_GRAPHQL_EXECUTOR``: ``"inprocess"``
+    executes against ``alx_backend_graphql.schema.schema`` directly, with no
+    HTTP, JSON or web worker involved; ``"http"`` posts to
+    ``settings.CRM_GRAPHQL_URL`` and is meant for remote health probes.
+    """
+    mode = mode or getattr(settings, "CRM_GRAPHQL_EXECUTOR", IN_PROCESS)
+    if mode == HTTP:
+        url = getattr(settings, "CRM_GRAPHQL_URL", "http://localhost:8000/graphql")
+        response = requests.post(url, json={"query": query, "variables": variables or {}})
+        response.raise_for_status()
+        return response.json()
+    if mode != IN_PROCESS:
+        raise ValueError(f"Unknown GraphQL executor mode: {mode!r}")
+
+    from alx_backend_graphql.schema import schema
+
+    # A plain namespace stands in for the request so per-request state
+    # (e.g. the crm.dataloaders loaders) still has somewhere to live.
+    result = schema.execute(query, variable_values=variables, context_value=SimpleNamespace())
+    return result.formatted
@@ -0,0 +1,107 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from crm.filters import CustomerFilter, OrderFilter
+from crm.models import Customer, Order, OrderItem
+
+DEFAULT_SETTINGS = {
+    # Rows fetched per round trip, and per block written to the client.
+    "CHUNK_SIZE": 2000,
+}
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def get_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, "CRM_EXPORT", {})}
+
+
+# ==========================================================
+# Rows
+# ==========================================================
+CUSTOMER_COLUMNS = ["id", "name", "email", "phone", "created_at"]
+ORDER_COLUMNS = ["id", "customer_id", "total_amount", "order_date", "product_ids"]
+
+
+def customer_rows(queryset, chunk_size):
+    return queryset.values(*CUSTOMER_COLUMNS).iterator(chunk_size=chunk_size)
+
+
+def order_rows(queryset, chunk_size):
+    # One through-table query per chunk of orders; a JOIN would repeat
+    # every order once per product.
+    rows = queryset.values(*ORDER_COLUMNS[:-1]).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        product_ids = defaultdict(list)
+        through = OrderItem.objects.filter(order_id__in=[row["id"] for row in chunk])
+        for order_id, product_id in through.order_by("product_id").values_list("order_id", "product_id"):
+            product_ids[order_id].append(product_id)
+        for row in chunk:
+            row["product_ids"] = product_ids[row["id"]]
+            yield row
+
+
+EXPORTS = {
+    "customers": (Customer, CustomerFilter, CUSTOMER_COLUMNS, customer_rows),
+    "orders": (Order, OrderFilter, ORDER_COLUMNS, order_rows),
+}
+
+
+def export_rows(kind, params=None, chunk_size=None):
+    """
+    ``(columns, rows)`` of the ``kind`` rows matching ``params``, in id order.
+
+    ``params`` are the fields of the kind's FilterSet (``customer_name``,
+    ``order_date__gte``, ...); invalid values raise ValidationError. Rows
+    are dicts, read ``chunk_size`` at a time with a server-side cursor
+    where the database has them.
+    """
+    model, filterset_class, columns, rows = EXPORTS[kind]
+    filterset = filterset_class(params or {}, queryset=model.objects.all())
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    chunk_size = chunk_size or get_settings()["CHUNK_SIZE"]
+    return columns, rows(filterset.qs.order_by("pk"), chunk_size)
+
+
+# ==========================================================
+# Formats
+# ==========================================================
+class _Line:
+    """csv.writer target returning each line instead of storing it."""
+
+    def write(self, line):
+        return line
+
+
+def render(columns, rows, format, chunk_size=None):
+    """Encode ``rows`` as NDJSON or CSV: an iterator of one string per chunk of rows."""
+    if format not in CONTENT_TYPES:
+        raise ValueError(f"Unknown export format {format!r}; use one of {', '.join(CONTENT_TYPES)}.")
+    return _render(columns, rows, format, chunk_size or get_settings()["CHUNK_SIZE"])
+
+
+def _render(columns, rows, format, chunk_size):
+    if format == "csv":
+        writer = csv.writer(_Line())
+        yield writer.writerow(columns)
+
+        def encode(row):
+            if "product_ids" in row:
+                row["product_ids"] = " ".join(map(str, row["product_ids"]))
+            return writer.writerow([row[column] for column in columns])
+    else:
+        def encode(row):
+            return json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield "".join(encode(row) for row in chunk)
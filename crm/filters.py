@@ -1,6 +1,19 @@
 import django_filters
-from django.db.models import Q
-from .models import Customer, Product, Order
+from django.db.models import Exists, OuterRef, Q
+from .models import Customer, Product, Order, OrderItem
+
+
+# Filtering on ``products__...`` joins the through table and returns an
+# order once per matching product; these test it with a subquery instead.
+def order_has_product(**lookups):
+    """EXISTS over the through table: cheap when many orders match."""
+    through = OrderItem.objects.filter(order_id=OuterRef('pk'))
+    return Exists(through.filter(**{f'product__{key}': value for key, value in lookups.items()}))
+
+
+def order_has_product_id(product_id):
+    """``id IN`` the product's through rows: read from the product_id index."""
+    return Q(pk__in=OrderItem.objects.filter(product_id=product_id).values('order_id'))
 
 # ✅ CUSTOMER FILTER
 class CustomerFilter(django_filters.FilterSet):
@@ -9,11 +22,16 @@ class CustomerFilter(django_filters.FilterSet):
     created_at__gte = django_filters.DateFilter(field_name='created_at', lookup_expr='gte')
     created_at__lte = django_filters.DateFilter(field_name='created_at', lookup_expr='lte')
     phone_pattern = django_filters.CharFilter(method='filter_phone_pattern')
+    search = django_filters.CharFilter(method='filter_search')
 
     def filter_phone_pattern(self, queryset, name, value):
         # Exemple : +1, +229, etc.
         return queryset.filter(phone__startswith=value)
 
+    def filter_search(self, queryset, name, value):
+        # Name or email; served by the pg_trgm indexes on PostgreSQL (migration 0004).
+        return queryset.filter(Q(name__icontains=value) | Q(email__icontains=value))
+
     class Meta:
         model = Customer
         fields = ['name', 'email', 'created_at', 'phone']
@@ -25,6 +43,10 @@ class ProductFilter(django_filters.FilterSet):
     price__lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     stock__gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte')
     stock__lte = django_filters.NumberFilter(field_name='stock', lookup_expr='lte')
+    search = django_filters.CharFilter(method='filter_search')
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(name__icontains=value)
 
     class Meta:
         model = Product
@@ -39,15 +61,20 @@ class OrderFilter(django_filters.FilterSet):
     customer_name = django_filters.CharFilter(method='filter_customer_name')
     product_name = django_filters.CharFilter(method='filter_product_name')
     product_id = django_filters.NumberFilter(method='filter_product_id')
+    search = django_filters.CharFilter(method='filter_search')
 
     def filter_customer_name(self, queryset, name, value):
         return queryset.filter(customer__name__icontains=value)
 
     def filter_product_name(self, queryset, name, value):
-        return queryset.filter(products__name__icontains=value)
+        return queryset.filter(order_has_product(name__icontains=value))
 
     def filter_product_id(self, queryset, name, value):
-        return queryset.filter(products__id=value)
+        return queryset.filter(order_has_product_id(value))
+
+    def filter_search(self, queryset, name, value):
+        # Customer name or any product name.
+        return queryset.filter(Q(customer__name__icontains=value) | order_has_product(name__icontains=value))
 
     class Meta:
         model = Order
@@ -0,0 +1,224 @@
+import io
+import math
+import random
+import time
+from array import array
+from bisect import bisect
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from crm.models import (
+    CRMStats, Customer, DailyCustomerRevenue, DailyProductSales, DailyRevenue, Order, OrderItem, Product,
+)
+from crm.analytics import rebuild_rollups
+from crm.stats import rebuild_stats
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+# ==========================================================
+# Helpers
+# ==========================================================
+def zipf_cum_weights(size, exponent):
+    """Cumulative weights of ranks 1..size under a Zipf(``exponent``) law."""
+    total = 0.0
+    weights = array("d")
+    for rank in range(1, size + 1):
+        total += 1.0 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+def copy_supported():
+    return connection.vendor == "postgresql"
+
+
+def copy_rows(model, columns, rows):
+    """Load ``rows`` into ``model``'s table with COPY (PostgreSQL only)."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ", ".join(connection.ops.quote_name(column) for column in columns)
+    sql = f"COPY {table} ({names}) FROM STDIN"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy"):
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            # psycopg2
+            data = io.StringIO("".join("\t".join(str(value) for value in row) + "\n" for row in rows))
+            raw.copy_expert(sql, data)
+
+
+def flush_crm_tables():
+    """
+    Empty the CRM tables, their rollups and the stats row without loading
+    their rows (TRUNCATE/DELETE); the stats are then rebuilt at zero.
+    """
+    models = [
+        DailyProductSales, DailyCustomerRevenue, DailyRevenue, OrderItem, Order, Customer, Product, CRMStats,
+    ]
+    tables = [model._meta.db_table for model in models]
+    connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables))
+    rebuild_stats()
+
+
+class Progress:
+    """Calls ``callback(label, done, total, seconds)`` after every chunk."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.started = time.perf_counter()
+
+    def __call__(self, label, done, total):
+        if self.callback is not None:
+            self.callback(label, done, total, time.perf_counter() - self.started)
+
+
+# ==========================================================
+# Generator
+# ==========================================================
+def generate_dataset(
+    customers=1000,
+    products=100,
+    orders=10000,
+    products_per_order=(1, 5),
+    days=365,
+    zipf_exponent=1.1,
+    seed=0,
+    end=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    use_copy=None,
+    progress=None,
+):
+    """
+    Insert a synthetic dataset and return its parameters.
+
+    Product popularity follows a Zipf law over a seeded random ranking of
+    the products. Customers sign up uniformly over the ``days`` before
+    ``end`` and order at uniform times between sign-up and ``end``. Rows
+    are written in ``chunk_size`` transactions with ``bulk_create``, and the
+    order items with COPY on PostgreSQL. Only ids, sign-up times and
+    prices are kept between chunks, in compact arrays, so memory stays
+    bounded by the row counts rather than by the objects. The same seed,
+    ``end`` and starting database give the same data.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        raise NotSupportedError("Generating orders needs bulk_create() to return primary keys.")
+    rng = random.Random(seed)
+    end = end or timezone.now()
+    start = end - timedelta(days=days)
+    window = (end - start).total_seconds()
+    use_copy = copy_supported() if use_copy is None else use_copy
+    report = Progress(progress)
+
+    # Customers: ids and sign-up times.
+    base = Customer.objects.aggregate(last=Max("pk"))["last"] or 0
+    customer_ids = array("q")
+    customer_created = array("d")
+    for offset in range(0, customers, chunk_size):
+        chunk = []
+        for i in range(offset, min(offset + chunk_size, customers)):
+            number = base + i
+            chunk.append(Customer(
+                name=f"Customer {number}",
+                email=f"customer{number}@example.com",
+                phone=f"+1{rng.randrange(10 ** 9, 10 ** 10)}" if rng.random() < 0.8 else None,
+            ))
+        signed_up = [start + timedelta(seconds=rng.uniform(0, window)) for _ in chunk]
+        with transaction.atomic():
+            # bulk_create() stamps auto_now_add fields with now(), so the
+            # generated sign-up times are written by a second statement.
+            Customer.objects.bulk_create(chunk)
+            for customer, created_at in zip(chunk, signed_up):
+                customer.created_at = created_at
+            Customer.objects.bulk_update(chunk, ["created_at"])
+        for customer in chunk:
+            customer_ids.append(customer.pk)
+            customer_created.append(customer.created_at.timestamp())
+        report("customers", len(customer_ids), customers)
+
+    # Products: ids, prices and a Zipf popularity ranking.
+    product_ids = array("q")
+    product_prices = []
+    for offset in range(0, products, chunk_size):
+        chunk = [
+            Product(
+                name=f"Product {i}",
+                # Log-normal prices: many cheap items, a long tail of expensive ones.
+                price=Decimal(min(max(math.exp(rng.gauss(3.5, 1.0)), 1), 99999)).quantize(Decimal("0.01")),
+                stock=rng.randint(0, 100),
+            )
+            for i in range(offset, min(offset + chunk_size, products))
+        ]
+        with transaction.atomic():
+            Product.objects.bulk_create(chunk)
+        for product in chunk:
+            product_ids.append(product.pk)
+            product_prices.append(product.price)
+        report("products", len(product_ids), products)
+
+    ranking = list(range(products))
+    rng.shuffle(ranking)
+    cum_weights = zipf_cum_weights(products, zipf_exponent)
+    total_weight = cum_weights[-1] if products else 0
+    low, high = products_per_order
+    high = min(high, products)
+    low = min(low, high)
+
+    # Orders and their items (one of each product, at its price).
+    created = 0
+    end_ts = end.timestamp()
+    for offset in range(0, orders if products and customers else 0, chunk_size):
+        chunk = []
+        selections = []
+        for _ in range(min(chunk_size, orders - offset)):
+            index = rng.randrange(customers)
+            picks = set()
+            wanted = rng.randint(low, high)
+            while len(picks) < wanted:
+                picks.add(ranking[bisect(cum_weights, rng.random() * total_weight)])
+            picks = sorted(picks)
+            signed_up = customer_created[index]
+            ordered = signed_up + rng.random() * (end_ts - signed_up)
+            chunk.append(Order(
+                customer_id=customer_ids[index],
+                total_amount=sum(product_prices[p] for p in picks),
+                order_date=datetime.fromtimestamp(ordered, tz=end.tzinfo),
+            ))
+            selections.append(picks)
+        with transaction.atomic():
+            Order.objects.bulk_create(chunk)
+            rows = [
+                (order.pk, product_ids[p], 1, product_prices[p])
+                for order, picks in zip(chunk, selections)
+                for p in picks
+            ]
+            if use_copy:
+                copy_rows(OrderItem, ["order_id", "product_id", "quantity", "unit_price"], rows)
+            else:
+                OrderItem.objects.bulk_create([
+                    OrderItem(order_id=order_id, product_id=product_id, quantity=quantity, unit_price=unit_price)
+                    for order_id, product_id, quantity, unit_price in rows
+                ])
+        created += len(chunk)
+        report("orders", created, orders)
+
+    # Generated rows bypass the mutations: recompute the maintained totals.
+    rebuild_stats()
+    rebuild_rollups()
+    return {
+        "customers": customers,
+        "products": products,
+        "orders": created,
+        "products_per_order": [low, high],
+        "days": days,
+        "zipf_exponent": zipf_exponent,
+        "seed": seed,
+    }
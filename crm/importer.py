@@ -0,0 +1,260 @@
+import csv
+import json
+import os
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from crm import response_cache
+from crm.models import Customer, Product
+from crm.services import existing_emails, validate_phone_format
+from crm.stats import record_customers
+
+DEFAULT_SETTINGS = {
+    # Rows validated and written per transaction.
+    "CHUNK_SIZE": 1000,
+    # Row errors returned by the upload endpoint; the rest are only counted.
+    "MAX_REPORTED_ERRORS": 1000,
+}
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+# What to do with rows that already exist (same email, or same product id).
+MODES = ("skip", "update")
+
+
+def get_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, "CRM_IMPORT", {})}
+
+
+# ==========================================================
+# Reading
+# ==========================================================
+def format_for(filename):
+    """Import format guessed from a file name, or None."""
+    return FORMATS.get(Path(filename or "").suffix.lower())
+
+
+def read_rows(stream, format):
+    """
+    ``(line number, row)`` pairs read incrementally from a text stream.
+
+    Rows are dicts keyed by column; an NDJSON line that is not a JSON
+    object gives None, reported as an error by the import.
+    """
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == "ndjson":
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError:
+                row = None
+            yield line, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unknown import format {format!r}; use csv or ndjson.")
+
+
+# ==========================================================
+# Validation
+# ==========================================================
+def _clean_fields(model, row, names):
+    # The model fields' own checks: required, max_length, email, digits...
+    values = {}
+    for name in names:
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        try:
+            values[name] = model._meta.get_field(name).clean(value, None)
+        except ValidationError as e:
+            raise ValueError(f"{name}: {' '.join(e.messages)}")
+    return values
+
+
+def clean_customer(row):
+    """Field values of a customer row, or ValueError, as BulkCreateCustomers checks them."""
+    values = _clean_fields(Customer, row, ["name", "email", "phone"])
+    values["phone"] = values["phone"] or None
+    validate_phone_format(values["phone"])
+    return values
+
+
+def clean_product(row):
+    """Field values of a product row, or ValueError, as CreateProduct checks them."""
+    row = dict(row)
+    if row.get("stock") in (None, ""):
+        row["stock"] = 0
+    names = ["name", "price", "stock"]
+    if row.get("id") not in (None, ""):
+        names.append("id")
+    values = _clean_fields(Product, row, names)
+    if values["price"] <= 0:
+        raise ValueError("Price must be positive.")
+    return values
+
+
+# ==========================================================
+# Writing
+# ==========================================================
+def _target(fields):
+    # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target.
+    return fields if connection.features.supports_update_conflicts_with_target else None
+
+
+class _Import:
+    """Counts, duplicate detection and error reporting across chunks."""
+
+    def __init__(self, mode, error_report=None, state=None):
+        self.mode = mode
+        self.seen = set()
+        self.counts = dict.fromkeys(["rows", "created", "updated", "skipped", "failed"], 0)
+        self.counts.update(state or {})
+        self.errors = []
+        self.failed_rows = []
+        self.stream = error_report
+        self.report = csv.writer(error_report) if error_report is not None else None
+        if self.report is not None and not self.counts["rows"]:
+            self.report.writerow(["line", "error", "row"])
+
+    def fail(self, line, row, error):
+        self.counts["failed"] += 1
+        if len(self.errors) < get_settings()["MAX_REPORTED_ERRORS"]:
+            self.errors.append({"line": line, "error": str(error)})
+        self.failed_rows.append([line, str(error), json.dumps(row, default=str)])
+
+    def commit(self, chunk):
+        # Reported once the chunk is written, so a resumed import does not
+        # report the rows of an interrupted chunk twice.
+        self.counts["rows"] += len(chunk)
+        if self.report is not None:
+            self.report.writerows(self.failed_rows)
+            self.stream.flush()
+        self.failed_rows = []
+
+    def clean(self, chunk, clean, key):
+        """Valid values of ``chunk``; a repeated ``key`` is an error."""
+        valid = []
+        for line, row in chunk:
+            try:
+                if row is None:
+                    raise ValueError("Not a JSON object.")
+                values = clean(row)
+                unique = values.get(key)
+                if unique is not None and unique in self.seen:
+                    raise ValueError(f"Duplicate {key} in input.")
+            except ValueError as e:
+                self.fail(line, row, e)
+                continue
+            if unique is not None:
+                self.seen.add(unique)
+            valid.append(values)
+        return valid
+
+    def customers(self, chunk):
+        valid = self.clean(chunk, clean_customer, "email")
+        emails = [values["email"] for values in valid]
+        with transaction.atomic():
+            taken = existing_emails(emails)
+            if self.mode == "update":
+                Customer.objects.bulk_create(
+                    [Customer(**values) for values in valid],
+                    update_conflicts=True, unique_fields=_target(["email"]), update_fields=["name", "phone"],
+                )
+                self.counts["updated"] += len(taken)
+                created = len(valid) - len(taken)
+            else:
+                # Conflicts from concurrent inserts are skipped as well.
+                Customer.objects.bulk_create(
+                    [Customer(**values) for values in valid if values["email"] not in taken],
+                    ignore_conflicts=True,
+                )
+                created = len(existing_emails(emails)) - len(taken)
+                self.counts["skipped"] += len(valid) - created
+            self.counts["created"] += created
+            record_customers(created)
+            self._invalidate("customer")
+
+    def products(self, chunk):
+        valid = self.clean(chunk, clean_product, "id")
+        numbered = [values for values in valid if "id" in values]
+        with transaction.atomic():
+            existing = set(Product.objects.filter(pk__in=[v["id"] for v in numbered]).values_list("pk", flat=True))
+            if self.mode == "update":
+                Product.objects.bulk_create(
+                    [Product(**values) for values in numbered],
+                    update_conflicts=True, unique_fields=_target(["id"]), update_fields=["name", "price", "stock"],
+                )
+                self.counts["updated"] += len(existing)
+            else:
+                Product.objects.bulk_create(
+                    [Product(**values) for values in numbered if values["id"] not in existing],
+                    ignore_conflicts=True,
+                )
+                self.counts["skipped"] += len(existing)
+            Product.objects.bulk_create([Product(**values) for values in valid if "id" not in values])
+            self.counts["created"] += len(valid) - len(existing)
+            if len(numbered) > len(existing):
+                # Explicit ids do not advance PostgreSQL's sequence.
+                with connection.cursor() as cursor:
+                    for sql in connection.ops.sequence_reset_sql(no_style(), [Product]):
+                        cursor.execute(sql)
+            self._invalidate("product")
+
+    def _invalidate(self, tag):
+        if response_cache.is_enabled():
+            transaction.on_commit(lambda: response_cache.invalidate_tags(tag))
+
+
+def _load_checkpoint(path, source):
+    if path is None or not Path(path).exists():
+        return None
+    state = json.loads(Path(path).read_text())
+    if state.get("source") != source:
+        raise ValueError(f"Checkpoint {path} belongs to another import ({state.get('source')}).")
+    return state["counts"]
+
+
+def _save_checkpoint(path, source, counts):
+    tmp = Path(f"{path}.tmp")
+    tmp.write_text(json.dumps({"source": source, "counts": counts}))
+    os.replace(tmp, path)
+
+
+def import_rows(kind, rows, mode="skip", chunk_size=None, checkpoint=None, source=None, error_report=None):
+    """
+    Validate and write customer or product ``rows`` (from read_rows) by chunks.
+
+    Each chunk is checked with the rules of the mutations, against the
+    emails (or product ids) seen so far and, in one query, the database,
+    then written with one ``bulk_create`` in its own transaction: existing
+    rows are skipped (``ignore_conflicts``) or, in "update" mode,
+    overwritten (``update_conflicts``). After every chunk the counts are
+    saved to the ``checkpoint`` file; an import given an existing
+    checkpoint for the same ``source`` resumes after the rows it covers.
+    Failed rows are written to the ``error_report`` text stream as CSV
+    (line, error, row). Returns the counts and the first row errors.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown import mode {mode!r}; use skip or update.")
+    state = _load_checkpoint(checkpoint, source)
+    run = _Import(mode, error_report, state)
+    write = {"customers": run.customers, "products": run.products}[kind]
+    chunk_size = chunk_size or get_settings()["CHUNK_SIZE"]
+
+    rows = iter(rows)
+    if state:
+        for _ in islice(rows, state["rows"]):
+            pass
+    while chunk := list(islice(rows, chunk_size)):
+        write(chunk)
+        run.commit(chunk)
+        if checkpoint is not None:
+            _save_checkpoint(checkpoint, source, run.counts)
+    return dict(run.counts, errors=run.errors)
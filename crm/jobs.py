@@ -0,0 +1,113 @@
+import logging
+from types import SimpleNamespace
+
+from django.db import transaction
+from django.utils import timezone
+
+from crm import response_cache
+from crm.models import Job
+from crm.services import (
+    BULK_BATCH_SIZE, bulk_create_customers, chunked, restock_low_stock_products, validate_phone_format,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# Handlers
+# ==========================================================
+# Each handler runs a mutation body from its JSON payload, reports every
+# finished step with progress(done, errors) and returns the job's result.
+def _bulk_create_customers(payload, progress):
+    rows = [SimpleNamespace(name=row["name"], email=row["email"], phone=row.get("phone")) for row in payload["input"]]
+    # bulk_create_customers() only sees one chunk: catch repeats across
+    # chunks here, with the message it gives within one.
+    seen = set()
+    unique = []
+    duplicates = []
+    for row in rows:
+        try:
+            validate_phone_format(row.phone)
+        except ValueError:
+            unique.append(row)
+            continue
+        if row.email in seen:
+            duplicates.append(f"{row.email}: Duplicate email in input.")
+            continue
+        seen.add(row.email)
+        unique.append(row)
+    if duplicates:
+        progress(len(duplicates), duplicates)
+
+    customer_ids = []
+    for chunk in chunked(unique, BULK_BATCH_SIZE):
+        created, errors = bulk_create_customers(chunk)
+        customer_ids += [customer.pk for customer in created]
+        progress(len(chunk), errors)
+    return {"created": len(customer_ids), "customerIds": customer_ids}
+
+
+def _update_low_stock_products(payload, progress):
+    updated = restock_low_stock_products(threshold=payload["threshold"], increment=payload["increment"])
+    progress(1, [])
+    return {"message": f"{len(updated)} product(s) updated", "productIds": [product.pk for product in updated]}
+
+
+# kind -> (handler, steps in a payload, response cache tags it invalidates)
+HANDLERS = {
+    "bulk_create_customers": (_bulk_create_customers, lambda payload: len(payload["input"]), ("customer",)),
+    "update_low_stock_products": (_update_low_stock_products, lambda payload: 1, ("product",)),
+}
+
+
+# ==========================================================
+# Queue
+# ==========================================================
+def enqueue(kind, payload):
+    """Record a ``kind`` job and hand it to Celery once the transaction commits."""
+    from crm.tasks import run_job
+
+    _, total, _ = HANDLERS[kind]
+    job = Job.objects.create(kind=kind, payload=payload, total=total(payload))
+
+    def send():
+        try:
+            run_job.delay(str(job.pk))
+        except Exception as e:
+            # Broker unreachable: fail the job rather than leave it pending.
+            logger.exception("Could not enqueue job %s", job.pk)
+            _finish(job.pk, Job.FAILED, errors=[f"Could not enqueue the job: {e}"])
+
+    transaction.on_commit(send)
+    return job
+
+
+def _finish(job_id, status, **fields):
+    Job.objects.filter(pk=job_id).update(status=status, payload={}, finished_at=timezone.now(), **fields)
+
+
+def run(job_id):
+    """Run a pending job; a job already claimed by another worker is left alone."""
+    claimed = Job.objects.filter(pk=job_id, status=Job.PENDING).update(
+        status=Job.RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    job = Job.objects.get(pk=job_id)
+    handler, _, tags = HANDLERS[job.kind]
+    state = {"done": 0, "errors": []}
+
+    def progress(done, errors):
+        state["done"] += done
+        state["errors"] += errors
+        Job.objects.filter(pk=job_id).update(done=state["done"], errors=state["errors"])
+        if response_cache.is_enabled():
+            response_cache.invalidate_tags(*tags)
+
+    try:
+        result = handler(job.payload, progress)
+    except Exception as e:
+        _finish(job_id, Job.FAILED, errors=state["errors"] + [f"Job failed: {e}"])
+        raise
+    _finish(job_id, Job.SUCCEEDED, result=result)
+    return result
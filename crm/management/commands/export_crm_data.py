@@ -0,0 +1,41 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.export import CONTENT_TYPES, EXPORTS, export_rows, get_settings, render
+
+
+class Command(BaseCommand):
+    help = "Stream customers or orders as NDJSON or CSV, with the filters of the GraphQL API."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=sorted(CONTENT_TYPES), default="ndjson")
+        parser.add_argument("--output", help="Write to this file instead of stdout.")
+        parser.add_argument(
+            "--filter", action="append", default=[], metavar="FIELD=VALUE",
+            help="CustomerFilter/OrderFilter field, e.g. customer_name=Ann or order_date__gte=2025-01-01. Repeatable.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options["filter"]:
+            field, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"--filter expects FIELD=VALUE, got {item!r}.")
+            params[field] = value
+        chunk_size = options["chunk_size"] or get_settings()["CHUNK_SIZE"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+        try:
+            columns, rows = export_rows(options["kind"], params, chunk_size)
+        except ValidationError as e:
+            raise CommandError(f"Invalid filters: {e.message_dict}")
+
+        blocks = render(columns, rows, options["format"], chunk_size)
+        if options["output"]:
+            with open(options["output"], "w", newline="") as f:
+                f.writelines(blocks)
+        else:
+            for block in blocks:
+                self.stdout.write(block, ending="")
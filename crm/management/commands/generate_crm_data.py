@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm.generator import DEFAULT_CHUNK_SIZE, copy_supported, flush_crm_tables, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic CRM dataset (customers, products, orders) at any scale."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=100)
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument("--min-products", type=int, default=1, help="Products per order, at least.")
+        parser.add_argument("--max-products", type=int, default=5, help="Products per order, at most.")
+        parser.add_argument("--days", type=int, default=365, help="Spread of created_at/order_date.")
+        parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of product popularity.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--end", help="Latest generated date (YYYY-MM-DD); defaults to now. Fix it for reproducible data."
+        )
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--no-copy", action="store_true", help="Use bulk_create even on PostgreSQL.")
+        parser.add_argument("--flush", action="store_true", help="Delete all customers, products, orders and their totals first.")
+
+    def handle(self, *args, **options):
+        if options["min_products"] < 1 or options["max_products"] < options["min_products"]:
+            raise CommandError("Need 1 <= --min-products <= --max-products.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        end = None
+        if options["end"]:
+            try:
+                end = timezone.make_aware(datetime.strptime(options["end"], "%Y-%m-%d"))
+            except ValueError:
+                raise CommandError("--end must be a date in YYYY-MM-DD format.")
+
+        if options["flush"]:
+            flush_crm_tables()
+            self.stdout.write("Flushed customers, products, orders and their totals.")
+
+        summary = generate_dataset(
+            customers=options["customers"],
+            products=options["products"],
+            orders=options["orders"],
+            products_per_order=(options["min_products"], options["max_products"]),
+            days=options["days"],
+            zipf_exponent=options["zipf"],
+            seed=options["seed"],
+            end=end,
+            chunk_size=options["chunk_size"],
+            use_copy=copy_supported() and not options["no_copy"],
+            progress=self.progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {summary['customers']} customers, {summary['products']} products "
+            f"and {summary['orders']} orders."
+        ))
+
+    def progress(self, label, done, total, seconds):
+        percent = 100 * done / total if total else 100
+        self.stdout.write(f"{label}: {done}/{total} ({percent:.0f}%) {seconds:.1f}s")
@@ -0,0 +1,57 @@
+import csv
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.importer import MODES, format_for, get_settings, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import customers or products from a CSV or NDJSON file, by chunks, resumably."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["customers", "products"])
+        parser.add_argument("path", help="CSV with a header row, or NDJSON (one JSON object per line).")
+        parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension.")
+        parser.add_argument(
+            "--mode", choices=MODES, default="skip",
+            help="Existing emails (customers) or ids (products): skip them or update them.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument(
+            "--checkpoint", help="Progress file, saved after every chunk; an import given it again resumes there.",
+        )
+        parser.add_argument("--errors", help="Write failed rows (line, error, row) to this CSV file.")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        format = options["format"] or format_for(path.name)
+        if format is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format.")
+        chunk_size = options["chunk_size"] or get_settings()["CHUNK_SIZE"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+        checkpoint = options["checkpoint"]
+        resuming = checkpoint is not None and Path(checkpoint).exists()
+
+        errors = open(options["errors"], "a" if resuming else "w", newline="") if options["errors"] else None
+        try:
+            with path.open(newline="", encoding="utf-8-sig") as f:
+                summary = import_rows(
+                    options["kind"],
+                    read_rows(f, format),
+                    mode=options["mode"],
+                    chunk_size=chunk_size,
+                    checkpoint=checkpoint,
+                    source=f"{options['kind']}:{path.resolve()}",
+                    error_report=errors,
+                )
+        except (OSError, ValueError, csv.Error) as e:
+            raise CommandError(str(e))
+        finally:
+            if errors is not None:
+                errors.close()
+
+        summary.pop("errors")
+        self.stdout.write(self.style.SUCCESS(f"Imported {options['kind']}: {json.dumps(summary)}"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from crm.analytics import rebuild_rollups
+from crm.stats import compute_stats, get_stats, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the maintained CRM totals (customersCount, ordersCount, totalRevenue) "
+        "and the daily analytics rollups from the tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only report drift between the maintained totals and the tables.",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            stored = get_stats()
+            actual = compute_stats()
+            drift = {
+                name: (getattr(stored, name), value)
+                for name, value in actual.items()
+                if getattr(stored, name) != value
+            }
+            if not drift:
+                self.stdout.write(self.style.SUCCESS("CRM stats are up to date."))
+            for name, (old, new) in drift.items():
+                self.stdout.write(self.style.WARNING(f"{name}: stored {old}, actual {new}"))
+            return
+
+        stats = rebuild_stats()
+        rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt CRM stats: {stats}"))
+        self.stdout.write(self.style.SUCCESS("Rebuilt the daily analytics rollups."))
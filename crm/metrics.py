@@ -0,0 +1,304 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_SETTINGS = {
+    "ENABLED": True,
+    # Directory shared by all processes (gunicorn workers, Celery, cron);
+    # falls back to $PROMETHEUS_MULTIPROC_DIR. None keeps metrics per process.
+    "MULTIPROCESS_DIR": None,
+    "FLUSH_INTERVAL": 1.0,
+    # Distinct operation names kept as labels; the rest count as "other".
+    "MAX_OPERATION_NAMES": 100,
+}
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def get_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, "CRM_METRICS", {})}
+
+
+# ==========================================================
+# Registry
+# ==========================================================
+class Registry:
+    """
+    Metrics of this process. With a multiprocess directory every process
+    periodically writes its values to its own file there, and collect()
+    sums all files, so any worker serves the totals of the whole fleet.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._reset_process()
+
+    def _reset_process(self):
+        # A forked worker starts from zero rather than repeating its parent.
+        self.pid = os.getpid()
+        self.filename = f"{self.pid}-{uuid.uuid4().hex}.json"
+        self.last_flush = 0.0
+        for metric in self.metrics.values():
+            metric.values.clear()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def update(self, metric, key, update):
+        with self.lock:
+            if os.getpid() != self.pid:
+                self._reset_process()
+            update(metric.values, key)
+        self.flush()
+
+    def state(self):
+        with self.lock:
+            return {
+                name: [[list(key), value] for key, value in metric.values.items()]
+                for name, metric in self.metrics.items()
+            }
+
+    def flush(self, force=False):
+        directory = multiprocess_dir()
+        if directory is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < get_settings()["FLUSH_INTERVAL"]:
+            return
+        self.last_flush = now
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        path = Path(directory) / self.filename
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(self.state()))
+        os.replace(tmp, path)
+
+    def collect(self):
+        """``{name: {label values: value}}`` for this process or all of them."""
+        directory = multiprocess_dir()
+        if directory is None:
+            states = [self.state()]
+        else:
+            self.flush(force=True)
+            states = []
+            for path in Path(directory).glob("*.json"):
+                try:
+                    states.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+        totals = {name: {} for name in self.metrics}
+        for state in states:
+            for name, samples in state.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in samples:
+                    key = tuple(key)
+                    totals[name][key] = metric.merge(totals[name].get(key), value)
+        return totals
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, samples in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for key in sorted(samples):
+                lines.extend(metric.samples(dict(zip(metric.labelnames, key)), samples[key]))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush(force=True))
+
+
+def multiprocess_dir():
+    return get_settings()["MULTIPROCESS_DIR"] or os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = defaultdict(float)
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        if not get_settings()["ENABLED"]:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+
+        def update(values, key):
+            values[key] += amount
+
+        registry.update(self, key, update)
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def samples(self, labels, value):
+        return [f"{self.name}{_labels(labels)} {_number(value)}"]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # label values -> per-bucket counts followed by the sum
+        self.values = {}
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        if not get_settings()["ENABLED"]:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+
+        def update(values, key):
+            counts = values.setdefault(key, [0] * len(self.buckets) + [0.0])
+            counts[index] += 1
+            counts[-1] += value
+
+        registry.update(self, key, update)
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+    def samples(self, labels, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, value):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels(dict(labels, le=_number(bound)))} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(labels)} {_number(value[-1])}")
+        lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+# ==========================================================
+# CRM metrics
+# ==========================================================
+GRAPHQL_REQUEST_DURATION = Histogram(
+    "crm_graphql_request_duration_seconds",
+    "Time to answer a /graphql request, by operation name and HTTP status.",
+    ["operation", "status"],
+)
+MUTATION_DURATION = Histogram(
+    "crm_graphql_mutation_duration_seconds",
+    "Time spent in a mutation's mutate(), by mutation class.",
+    ["mutation"],
+)
+JOB_DURATION = Histogram(
+    "crm_job_duration_seconds",
+    "Run time of cron and Celery jobs, by job and outcome.",
+    ["job", "status"],
+)
+DB_QUERIES = Counter(
+    "crm_db_queries_total",
+    "SQL statements executed, by database alias.",
+    ["alias"],
+)
+DB_QUERY_DURATION = Counter(
+    "crm_db_query_duration_seconds_total",
+    "Time spent executing SQL statements, by database alias.",
+    ["alias"],
+)
+
+_operation_names = set()
+
+
+def operation_label(operation_name):
+    # Operation names come from clients: bound the label's cardinality.
+    if not operation_name:
+        return "anonymous"
+    if operation_name not in _operation_names:
+        if len(_operation_names) >= get_settings()["MAX_OPERATION_NAMES"]:
+            return "other"
+        _operation_names.add(operation_name)
+    return operation_name
+
+
+def observe_request(operation_name, status_code, seconds):
+    GRAPHQL_REQUEST_DURATION.observe(seconds, operation=operation_label(operation_name), status=status_code)
+
+
+def observe_mutation(mutate):
+    """Decorate a mutate method to record its duration under its class name."""
+    mutation = mutate.__qualname__.split(".")[0]
+
+    @wraps(mutate)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return mutate(*args, **kwargs)
+        finally:
+            MUTATION_DURATION.observe(time.perf_counter() - start, mutation=mutation)
+    return wrapper
+
+
+def observe_job(job):
+    """Decorate a cron or Celery job function to record its run time."""
+    @wraps(job)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = job(*args, **kwargs)
+            status = "success"
+            return result
+        finally:
+            JOB_DURATION.observe(time.perf_counter() - start, job=job.__name__, status=status)
+    return wrapper
+
+
+def count_queries(execute, sql, params, many, context):
+    """Connection execute_wrapper feeding the DB counters."""
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        alias = context["connection"].alias
+        DB_QUERIES.inc(alias=alias)
+        DB_QUERY_DURATION.inc(time.perf_counter() - start, alias=alias)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver: count every statement of the connection."""
+    if count_queries not in connection.execute_wrappers:
+        # Bottom of the stack: connections are often opened inside an
+        # execute_wrapper() block, which pops the last wrapper on exit.
+        connection.execute_wrappers.insert(0, count_queries)
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:00
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def build_stats(apps, schema_editor):
+    CRMStats = apps.get_model('crm', 'CRMStats')
+    Customer = apps.get_model('crm', 'Customer')
+    Order = apps.get_model('crm', 'Order')
+    CRMStats.objects.create(
+        pk=1,
+        customers_count=Customer.objects.count(),
+        orders_count=Order.objects.count(),
+        total_revenue=Order.objects.aggregate(total=Sum('total_amount'))['total'] or 0,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_customer_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CRMStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customers_count', models.BigIntegerField(default=0)),
+                ('orders_count', models.BigIntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
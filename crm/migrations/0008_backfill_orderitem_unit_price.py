@@ -0,0 +1,39 @@
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+CHUNK_SIZE = 5000
+
+
+def backfill_unit_prices(apps, schema_editor):
+    """
+    Copy the product's price into the line items missing one, CHUNK_SIZE
+    rows per transaction so that a large table is never locked as a whole.
+    The price at order time is lost: the current price is the best we have.
+    Only rows still missing a price are read, so an interrupted run resumes.
+    """
+    OrderItem = apps.get_model("crm", "OrderItem")
+    Product = apps.get_model("crm", "Product")
+    db = schema_editor.connection.alias
+    items = OrderItem.objects.using(db).filter(unit_price__isnull=True)
+    price = Subquery(Product.objects.using(db).filter(pk=OuterRef("product_id")).values("price")[:1])
+    last = 0
+    while True:
+        ids = list(items.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:CHUNK_SIZE])
+        if not ids:
+            break
+        with transaction.atomic(using=db):
+            items.filter(pk__gt=last, pk__lte=ids[-1]).update(unit_price=price)
+        last = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits on its own.
+    atomic = False
+
+    dependencies = [
+        ('crm', '0007_orderitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_unit_prices, migrations.RunPython.noop),
+    ]
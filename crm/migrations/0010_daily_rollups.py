@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def build_rollups(apps, schema_editor):
+    Order = apps.get_model('crm', 'Order')
+    OrderItem = apps.get_model('crm', 'OrderItem')
+    tz = timezone.get_current_timezone()
+    orders = Order.objects.annotate(date=TruncDate('order_date', tzinfo=tz)).order_by()
+    items = OrderItem.objects.annotate(date=TruncDate('order__order_date', tzinfo=tz)).order_by()
+    line_total = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    sources = [
+        ('DailyRevenue', orders.values('date').annotate(orders_count=Count('pk'), revenue=Sum('total_amount'))),
+        ('DailyCustomerRevenue', orders.values('date', 'customer_id').annotate(
+            orders_count=Count('pk'), revenue=Sum('total_amount'),
+        )),
+        ('DailyProductSales', items.values('date', 'product_id').annotate(
+            revenue=Sum(line_total), quantity=Sum('quantity'),
+        )),
+    ]
+    for name, rows in sources:
+        model = apps.get_model('crm', name)
+        model.objects.bulk_create((model(**row) for row in rows.iterator(chunk_size=1000)), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_alter_orderitem_unit_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders_count', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCustomerRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders_count', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='crm.customer')),
+            ],
+            options={
+                'unique_together': {('date', 'customer')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='crm.product')),
+            ],
+            options={
+                'unique_together': {('date', 'product')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
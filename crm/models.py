@@ -1,4 +1,7 @@
+import uuid
+
 from django.db import models
+from django.db.models import F, Sum
 from django.utils import timezone
 
 class Customer(models.Model):
@@ -7,6 +10,11 @@ class Customer(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # created_at range filters and keyset pages ordered by createdAt.
+            models.Index(fields=["created_at", "id"], name="crm_customer_created_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -16,6 +24,16 @@ class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Replenished by reorder_quantity once stock falls below reorder_threshold
+    # (crm.replenishment); None uses LOW_STOCK_THRESHOLD / RESTOCK_INCREMENT.
+    reorder_threshold = models.PositiveIntegerField(null=True, blank=True)
+    reorder_quantity = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # stock range filters and the low-stock restock UPDATE.
+            models.Index(fields=["stock", "id"], name="crm_product_stock_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -23,14 +41,123 @@ class Product(models.Model):
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="orders")
-    products = models.ManyToManyField(Product, related_name="orders")
+    products = models.ManyToManyField(Product, related_name="orders", through="OrderItem")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     order_date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # order_date range filters and keyset pages ordered by orderDate.
+            models.Index(fields=["order_date", "id"], name="crm_order_date_idx"),
+        ]
+
     def calculate_total(self):
-        total = sum(product.price for product in self.products.all())
+        """Recompute total_amount from the captured line items, in one aggregate query."""
+        total = self.items.aggregate(total=Sum(LINE_TOTAL))["total"] or 0
         self.total_amount = total
-        self.save()
+        Order.objects.filter(pk=self.pk).update(total_amount=total)
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer.name}"
+
+
+LINE_TOTAL = models.ExpressionWrapper(
+    F("quantity") * F("unit_price"), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+)
+
+
+class OrderItem(models.Model):
+    """A line of an order: how many of a product, at its price when ordered."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="order_items")
+    quantity = models.PositiveIntegerField(default=1)
+    # Captured from Product.price: later price changes leave the order alone.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        # The table of the former auto-created Order.products through model.
+        db_table = "crm_order_products"
+        unique_together = [("order", "product")]
+
+    @property
+    def line_total(self):
+        return self.quantity * self.unit_price
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} @ {self.unit_price}"
+
+
+class CRMStats(models.Model):
+    """Running totals behind customersCount / ordersCount / totalRevenue (single row)."""
+    customers_count = models.BigIntegerField(default=0)
+    orders_count = models.BigIntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.customers_count} customers, {self.orders_count} orders, {self.total_revenue} revenue"
+
+
+class Job(models.Model):
+    """A mutation run in the background by crm.tasks.run_job; polled with the `job` query."""
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (RUNNING, "Running"), (SUCCEEDED, "Succeeded"), (FAILED, "Failed")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # The mutation's arguments; cleared once the job has finished.
+    payload = models.JSONField(default=dict)
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
+
+
+# ==========================================================
+# Daily rollups (crm.analytics)
+# ==========================================================
+# Maintained as orders are created, so that analytics over a date range
+# read one row per day (per customer, per product) instead of the orders.
+class DailyRevenue(models.Model):
+    date = models.DateField(unique=True)
+    orders_count = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.orders_count} orders, {self.revenue} revenue"
+
+
+class DailyCustomerRevenue(models.Model):
+    date = models.DateField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="daily_revenue")
+    orders_count = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [("date", "customer")]
+
+    def __str__(self):
+        return f"{self.date} {self.customer_id}: {self.revenue}"
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales")
+    quantity = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [("date", "product")]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id}: {self.quantity} sold, {self.revenue}"
@@ -0,0 +1,105 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+# ==========================================================
+# Selection set helpers
+# ==========================================================
+def collect_fields(info, selection_set, fields=None):
+    """Flatten a selection set (fragments included) into {name: [FieldNode]}."""
+    if fields is None:
+        fields = {}
+    if selection_set is None:
+        return fields
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            fields.setdefault(selection.name.value, []).append(selection)
+        elif isinstance(selection, InlineFragmentNode):
+            collect_fields(info, selection.selection_set, fields)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments[selection.name.value]
+            collect_fields(info, fragment.selection_set, fields)
+    return fields
+
+
+def sub_fields(info, field_nodes):
+    fields = {}
+    for field_node in field_nodes:
+        collect_fields(info, field_node.selection_set, fields)
+    return fields
+
+
+def connection_node_fields(info, field_nodes):
+    """Fields selected under ``edges { node { ... } }`` of a connection."""
+    edges = sub_fields(info, field_nodes).get("edges", [])
+    return sub_fields(info, sub_fields(info, edges).get("node", []))
+
+
+# ==========================================================
+# Optimizer
+# ==========================================================
+class QueryPlan:
+    def __init__(self):
+        self.only = set()
+        self.select_related = []
+        self.prefetch_related = []
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset.only(*self.only)
+
+
+def _model_field(model, graphql_name):
+    if graphql_name == "id":
+        return model._meta.pk
+    try:
+        return model._meta.get_field(to_snake_case(graphql_name))
+    except FieldDoesNotExist:
+        return None
+
+
+def build_plan(info, model, fields, plan=None, prefix=""):
+    """
+    Translate the selected fields of ``model`` into only()/select_related()
+    and prefetch_related() arguments. Forward foreign keys are joined,
+    forward many-to-many relations get a Prefetch restricted to the selected
+    columns; reverse relations are left to the request loaders.
+    """
+    if plan is None:
+        plan = QueryPlan()
+    plan.only.add(prefix + model._meta.pk.name)
+    # Foreign key columns are cheap and the loaders read them to batch.
+    for field in model._meta.concrete_fields:
+        if field.many_to_one:
+            plan.only.add(prefix + field.name)
+
+    for name, field_nodes in fields.items():
+        field = _model_field(model, name)
+        if field is None or (field.auto_created and not field.concrete):
+            continue
+        if field.many_to_one:
+            plan.select_related.append(prefix + field.name)
+            build_plan(info, field.related_model, sub_fields(info, field_nodes),
+                       plan, prefix + field.name + "__")
+        elif field.many_to_many:
+            if prefix:
+                continue
+            related_plan = build_plan(
+                info, field.related_model, connection_node_fields(info, field_nodes)
+            )
+            queryset = related_plan.apply(field.related_model._default_manager.all())
+            plan.prefetch_related.append(Prefetch(field.name, queryset=queryset))
+        elif field.concrete:
+            plan.only.add(prefix + field.name)
+    return plan
+
+
+def optimize_queryset(queryset, info):
+    """Restrict ``queryset`` to what the connection field in ``info`` selects."""
+    fields = connection_node_fields(info, info.field_nodes)
+    return build_plan(info, queryset.model, fields).apply(queryset)
@@ -0,0 +1,165 @@
+import json
+
+import graphene
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from graphene import relay
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.utils import maybe_queryset
+from graphql import GraphQLError
+from graphql_relay.utils import base64, unbase64
+
+from crm.dataloaders import BatchedFilterConnectionField
+
+CURSOR_PREFIX = "keyset:"
+
+
+# ==========================================================
+# Connection with an on-demand totalCount
+# ==========================================================
+class CountableConnection(relay.Connection):
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(root, info):
+        # Keyset pages never count the table; only do it when asked to.
+        if root.length is None:
+            root.length = root.iterable.count()
+        return root.length
+
+
+# ==========================================================
+# Cursor helpers
+# ==========================================================
+def parse_order_by(model, order_by):
+    """Return ``(column, descending)`` for an ``orderBy`` argument."""
+    if not order_by:
+        return "id", False
+    descending = order_by.startswith("-")
+    column = to_snake_case(order_by.lstrip("-"))
+    try:
+        field = model._meta.get_field(column)
+    except FieldDoesNotExist:
+        field = None
+    if field is None or not field.concrete or field.is_relation or field.null:
+        raise GraphQLError(f"Cannot order by '{order_by}'.")
+    return field.name, descending
+
+
+def encode_cursor(column, node):
+    field = node._meta.get_field(column)
+    return base64(CURSOR_PREFIX + json.dumps([column, field.value_to_string(node), node.pk]))
+
+
+def decode_cursor(model, column, cursor):
+    try:
+        payload = unbase64(cursor)
+        if not payload.startswith(CURSOR_PREFIX):
+            raise ValueError
+        cursor_column, value, pk = json.loads(payload[len(CURSOR_PREFIX):])
+    except (TypeError, ValueError):
+        raise GraphQLError(f"Invalid cursor '{cursor}'.")
+    if cursor_column != column:
+        raise GraphQLError("Cursor does not match the requested orderBy.")
+    return model._meta.get_field(column).to_python(value), pk
+
+
+def keyset_filter(column, descending, value, pk, forward):
+    """Rows strictly after (``forward``) or before the ``(value, pk)`` key."""
+    lookup = "gt" if forward != descending else "lt"
+    if column == "id":
+        return Q(**{f"pk__{lookup}": pk})
+    return Q(**{f"{column}__{lookup}": value}) | Q(**{column: value, f"pk__{lookup}": pk})
+
+
+def ensure_loaded(queryset, column):
+    """Keep the ordering column selected when the optimizer used only()."""
+    fields, defer = queryset.query.deferred_loading
+    if defer:
+        return queryset.defer(None).defer(*(set(fields) - {column}))
+    if column not in fields:
+        return queryset.only(*fields, column)
+    return queryset
+
+
+def check_limit(name, value):
+    if value is not None and value < 0:
+        raise GraphQLError(f"Argument '{name}' must be a non-negative integer.")
+
+
+# ==========================================================
+# Keyset connection field
+# ==========================================================
+class KeysetConnectionField(BatchedFilterConnectionField):
+    """
+    Filter connection that pages on ``(orderBy column, id)`` instead of
+    offsets. ``after``/``before`` become range conditions on that key, so
+    every page is a single index range scan and no COUNT(*) is issued
+    unless the client selects ``totalCount``.
+    """
+
+    def __init__(self, type_, *args, order_by=None, **kwargs):
+        super().__init__(type_, *args, **kwargs)
+        if order_by is not None:
+            self.args = dict(self._base_args, order_by=order_by)
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        queryset = maybe_queryset(iterable)
+        if not isinstance(queryset, QuerySet):
+            return super().resolve_connection(connection, args, iterable, max_limit=max_limit)
+
+        model = queryset.model
+        column, descending = parse_order_by(model, args.get("order_by"))
+        queryset = ensure_loaded(queryset, column)
+        prefix = "-" if descending else ""
+        ordering = [prefix + column, prefix + "pk"] if column != "id" else [prefix + "pk"]
+
+        after, before = args.get("after"), args.get("before")
+        first, last, offset = args.get("first"), args.get("last"), args.get("offset")
+        check_limit("first", first)
+        check_limit("last", last)
+        check_limit("offset", offset)
+        if first is None and last is None and max_limit is not None:
+            first = max_limit
+
+        page = queryset.order_by(*ordering)
+        if after:
+            value, pk = decode_cursor(model, column, after)
+            page = page.filter(keyset_filter(column, descending, value, pk, forward=True))
+        if before:
+            value, pk = decode_cursor(model, column, before)
+            page = page.filter(keyset_filter(column, descending, value, pk, forward=False))
+
+        if first is None:
+            # Only `last`: read the key range backwards from the end.
+            rows = list(page.reverse()[:last + 1])
+            has_previous_page = len(rows) > last
+            nodes = rows[:last][::-1]
+            has_next_page = bool(before)
+        else:
+            start = offset or 0
+            rows = list(page[start:start + first + 1])
+            has_next_page = len(rows) > first
+            nodes = rows[:first]
+            has_previous_page = bool(after) or start > 0
+            if last is not None and len(nodes) > last:
+                nodes = nodes[-last:]
+                has_previous_page = True
+
+        edges = [connection.Edge(node=node, cursor=encode_cursor(column, node)) for node in nodes]
+        result = connection(
+            edges=edges,
+            page_info=relay.PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page,
+            ),
+        )
+        result.iterable = queryset
+        result.length = None
+        return result
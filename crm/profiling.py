@@ -0,0 +1,177 @@
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+DEFAULT_SETTINGS = {
+    "SAMPLE_RATE": 0.0,
+    "HEADER": "X-CRM-Profile",
+    # HEADER is honoured under DEBUG, for staff users, or when it carries
+    # this shared secret; from anyone else it is ignored.
+    "SECRET": None,
+    "EXTENSIONS": True,
+    "LOGGER": "crm.profiling",
+}
+TRUE_VALUES = {"1", "true", "yes", "on"}
+
+
+def get_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, "CRM_PROFILING", {})}
+
+
+# ==========================================================
+# Per-request profile
+# ==========================================================
+class Profile:
+    """Resolver timings and SQL statements of one GraphQL request."""
+
+    def __init__(self, operation_name=None, query_hash=None, requested=False):
+        self.operation_name = operation_name
+        self.query_hash = query_hash
+        # Asked for by an allowed HEADER, rather than sampled.
+        self.requested = requested
+        self.started = time.perf_counter()
+        self.duration = None
+        self.fields = defaultdict(lambda: [0, 0.0])
+        self.queries = []
+        # Root fields of the async view record from several threads.
+        self._lock = threading.Lock()
+
+    def record_field(self, name, seconds):
+        with self._lock:
+            field = self.fields[name]
+            field[0] += 1
+            field[1] += seconds
+
+    def record_sql(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.queries.append((sql, repr(params), time.perf_counter() - start))
+
+    @contextmanager
+    def capture_sql(self):
+        """Record every statement run on this thread's connections."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.record_sql))
+            yield
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def as_dict(self):
+        repeated = Counter((sql, params) for sql, params, _ in self.queries)
+        return {
+            "operationName": self.operation_name,
+            "queryHash": self.query_hash,
+            "durationMs": _ms(self.duration),
+            "sql": {
+                "count": len(self.queries),
+                "timeMs": _ms(sum(seconds for _, _, seconds in self.queries)),
+                "duplicates": [
+                    {"sql": sql, "count": count}
+                    for (sql, _), count in repeated.most_common() if count > 1
+                ],
+            },
+            "resolvers": [
+                {"field": name, "calls": calls, "timeMs": _ms(seconds)}
+                for name, (calls, seconds) in sorted(self.fields.items(), key=lambda item: -item[1][1])
+            ],
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+class ProfilingMiddleware:
+    """Graphene middleware timing every resolver of a profiled request."""
+
+    def resolve(self, next, root, info, **args):
+        profile = get_profile(info.context)
+        if profile is None:
+            return next(root, info, **args)
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            profile.record_field(f"{info.parent_type.name}.{info.field_name}", time.perf_counter() - start)
+
+
+# ==========================================================
+# Request integration
+# ==========================================================
+def header_value(request):
+    header = get_settings()["HEADER"]
+    return request.headers.get(header, "") if header else ""
+
+
+def header_allowed(request, value):
+    """Whether the profiling header ``value`` sent with ``request`` is honoured."""
+    secret = get_settings()["SECRET"]
+    if secret:
+        if hmac.compare_digest(value.encode(), str(secret).encode()):
+            return True
+    if value.lower() not in TRUE_VALUES:
+        return False
+    if settings.DEBUG:
+        return True
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_staff)
+
+
+def should_profile(request):
+    """``(profiled, requested)``: requested by an allowed header, or sampled."""
+    value = header_value(request)
+    if value and header_allowed(request, value):
+        return True, True
+    return random.random() < get_settings()["SAMPLE_RATE"], False
+
+
+def start_profile(request, operation_name=None, query_hash=None):
+    """Attach a Profile to ``request`` if it is to be profiled, else None."""
+    profiled, requested = should_profile(request)
+    if not profiled:
+        return None
+    request.crm_profile = Profile(operation_name, query_hash, requested)
+    return request.crm_profile
+
+
+def get_profile(context):
+    return getattr(context, "crm_profile", None)
+
+
+@contextmanager
+def capture_sql(context):
+    """Profile.capture_sql() for the request in ``context``, if profiled."""
+    profile = get_profile(context)
+    if profile is None:
+        yield
+        return
+    with profile.capture_sql():
+        yield
+
+
+def report(profile):
+    """
+    Log a finished profile. Return it for the response extensions if it
+    was requested and EXTENSIONS is on: sampled profiles are only logged,
+    their SQL is not shown to whoever made the request.
+    """
+    profile.finish()
+    options = get_settings()
+    data = profile.as_dict()
+    logging.getLogger(options["LOGGER"]).info(
+        "graphql profile %s", json.dumps(data), extra={"crm_profile": data}
+    )
+    return data if options["EXTENSIONS"] and profile.requested else None
@@ -0,0 +1,72 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from crm.models import Product
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "crm:replenish"
+DEFAULT_SETTINGS = {
+    "ENABLED": True,
+    # Shared by the web workers so that they coalesce together (e.g. Redis).
+    "CACHE": "default",
+    # Seconds a replenishment waits for the rest of a burst of orders.
+    "DELAY": 5,
+    # Seconds after which a product whose replenishment was lost (worker
+    # crash) can be scheduled again.
+    "PENDING_TIMEOUT": 300,
+}
+
+
+def get_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, "CRM_REPLENISHMENT", {})}
+
+
+def get_cache():
+    return caches[get_settings()["CACHE"]]
+
+
+def _pending_key(product_id):
+    return f"{KEY_PREFIX}:pending:{product_id}"
+
+
+def stock_changed(product_ids):
+    """Call inside the transaction that takes stock: replenish once it commits."""
+    if not get_settings()["ENABLED"] or not product_ids:
+        return
+    product_ids = sorted(set(product_ids))
+    transaction.on_commit(lambda: schedule(product_ids))
+
+
+def schedule(product_ids):
+    """
+    Queue the replenishment of the ``product_ids`` now below their reorder
+    threshold, unless one is already pending for them: a burst of orders
+    for a product coalesces into the first one's task.
+    """
+    from crm.services import below_reorder_threshold
+    from crm.tasks import replenish_stock
+
+    options = get_settings()
+    low = Product.objects.filter(below_reorder_threshold(), pk__in=product_ids).values_list("pk", flat=True)
+    cache = get_cache()
+    # cache.add() is atomic: only the first event of a burst gets through.
+    due = [pk for pk in low if cache.add(_pending_key(pk), True, timeout=options["PENDING_TIMEOUT"])]
+    if not due:
+        return []
+    try:
+        replenish_stock.apply_async(args=[due], countdown=options["DELAY"])
+    except Exception:
+        # Broker unreachable: let the next order try again.
+        logger.exception("Could not queue the replenishment of products %s", due)
+        release(due)
+        return []
+    return due
+
+
+def release(product_ids):
+    """Let new events schedule ``product_ids`` again; called as their task starts."""
+    get_cache().delete_many([_pending_key(pk) for pk in product_ids])
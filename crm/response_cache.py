@@ -0,0 +1,163 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphene_django.registry import get_global_registry
+from graphql import TypeInfo, TypeInfoVisitor, Visitor, get_named_type, print_ast, visit
+
+KEY_PREFIX = "crm:graphql"
+DEFAULT_SETTINGS = {"ENABLED": False, "CACHE": "default", "TIMEOUT": 300}
+
+# Root fields that read models without returning their types.
+FIELD_TAGS = {
+    "customersCount": {"customer"},
+    "ordersCount": {"order"},
+    "totalRevenue": {"order"},
+    "revenueByPeriod": {"order"},
+    "topCustomers": {"order"},
+    "topProducts": {"order"},
+}
+# Root fields whose answers must never come from the cache.
+UNCACHEABLE_FIELDS = {"responseCacheStats", "job"}
+
+
+def get_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, "CRM_RESPONSE_CACHE", {})}
+
+
+def is_enabled():
+    return get_settings()["ENABLED"]
+
+
+def get_cache():
+    return caches[get_settings()["CACHE"]]
+
+
+# ==========================================================
+# Tags
+# ==========================================================
+def _type_tags():
+    tags = {}
+    for model, graphene_type in get_global_registry()._registry.items():
+        names = [graphene_type._meta.name]
+        connection = getattr(graphene_type._meta, "connection", None)
+        if connection is not None:
+            # `orders { totalCount }` reads orders without reaching OrderType.
+            names += [connection._meta.name, connection.Edge._meta.name]
+        for name in names:
+            tags[name] = model._meta.model_name
+    return tags
+
+
+class _TagCollector(Visitor):
+    def __init__(self, type_info, type_tags):
+        super().__init__()
+        self.type_info = type_info
+        self.type_tags = type_tags
+        self.tags = set()
+        self.cacheable = True
+
+    def enter_field(self, node, *args):
+        name = node.name.value
+        if name in UNCACHEABLE_FIELDS:
+            self.cacheable = False
+        self.tags.update(FIELD_TAGS.get(name, ()))
+        named_type = get_named_type(self.type_info.get_type())
+        if named_type is not None and named_type.name in self.type_tags:
+            self.tags.add(self.type_tags[named_type.name])
+
+
+def document_tags(schema, document):
+    """``(tags, cacheable)``: the model tags a document reads."""
+    type_info = TypeInfo(schema)
+    collector = _TagCollector(type_info, _type_tags())
+    visit(document, TypeInfoVisitor(type_info, collector))
+    return collector.tags, collector.cacheable
+
+
+def _tag_key(tag):
+    return f"{KEY_PREFIX}:tag:{tag}"
+
+
+def tag_versions(tags):
+    cache = get_cache()
+    keys = [_tag_key(tag) for tag in sorted(tags)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock, not 0: an evicted tag must never bring
+            # back entries cached under an older version.
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    cache = get_cache()
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            cache.set(_tag_key(tag), time.time_ns(), timeout=None)
+
+
+def invalidates(*tags):
+    """Decorate a mutate method: bump ``tags`` once its transaction commits."""
+    def decorator(mutate):
+        @wraps(mutate)
+        def wrapper(*args, **kwargs):
+            result = mutate(*args, **kwargs)
+            if is_enabled():
+                transaction.on_commit(lambda: invalidate_tags(*tags))
+            return result
+        return wrapper
+    return decorator
+
+
+# ==========================================================
+# Entries
+# ==========================================================
+def cache_key(schema, document, variables, operation_name):
+    """Cache key for a query, or None when it must not be cached."""
+    tags, cacheable = document_tags(schema, document)
+    if not cacheable:
+        return None
+    payload = json.dumps(
+        [print_ast(document), variables or {}, operation_name, tag_versions(tags)],
+        sort_keys=True, default=str,
+    )
+    return f"{KEY_PREFIX}:response:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def get_response(key):
+    cache = get_cache()
+    data = cache.get(key)
+    _count("hits" if data is not None else "misses")
+    return data
+
+
+def set_response(key, data):
+    get_cache().set(key, data, timeout=get_settings()["TIMEOUT"])
+
+
+def _count(name):
+    cache = get_cache()
+    key = f"{KEY_PREFIX}:stats:{name}"
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def cache_stats():
+    cache = get_cache()
+    counts = cache.get_many([f"{KEY_PREFIX}:stats:hits", f"{KEY_PREFIX}:stats:misses"])
+    return {
+        "hits": counts.get(f"{KEY_PREFIX}:stats:hits", 0),
+        "misses": counts.get(f"{KEY_PREFIX}:stats:misses", 0),
+    }
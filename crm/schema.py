@@ -1,41 +1,145 @@
-import re
 from graphene import relay
+from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.utils import timezone
 import graphene
 from graphene_django import DjangoObjectType
 from .models import Customer, Product, Order
 from graphene_django.types import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
 #from .filters import CustomerFilterInput, ProductFilterInput, OrderFilterInput
-from crm.models import Product, Customer, Order
-from crm.filters import CustomerFilter, ProductFilter, OrderFilter
+from crm.models import Product, Customer, Order, OrderItem, Job
+from crm.filters import CustomerFilter, ProductFilter, OrderFilter, order_has_product
+from crm.jobs import enqueue
+from crm.replenishment import stock_changed
+from crm.dataloaders import BatchedConnectionField, get_loaders, is_prefetched, page_window
+from crm.optimizer import optimize_queryset
+from crm.pagination import CountableConnection, KeysetConnectionField
+from crm.metrics import observe_mutation
+from crm.response_cache import cache_stats, invalidates
+from crm.analytics import record_order_rollups, revenue_by_period, top_customers, top_products
+from crm.stats import get_stats, record_customers, record_orders
+from crm.services import (
+    LOW_STOCK_THRESHOLD, RESTOCK_INCREMENT, InsufficientStock, bulk_create_customers, bulk_create_orders,
+    order_items, order_total, requested_quantities, reserve_stock, restock_low_stock_products,
+    validate_email_unique, validate_phone_format,
+)
 
 
 # ==========================================================
 # Object Types
 # ==========================================================
+def orders_window(args):
+    # Only the requested page of a customer's or product's orders is read.
+    return page_window(args, graphene_settings.RELAY_CONNECTION_MAX_LIMIT)
+
+
 class CustomerType(DjangoObjectType):
     createdAt = graphene.DateTime(source='created_at')
+    orders = BatchedConnectionField(lambda: OrderType)
     class Meta:
         model = Customer
 #        interfaces = (graphene.relay.Node,)
         interfaces = (relay.Node,)
-        fields = ("id", "name", "email", "phone")
+        connection_class = CountableConnection
+        fields = ("id", "name", "email", "phone", "orders")
+
+    def resolve_orders(self, info, **kwargs):
+        return get_loaders(info).customer_orders.load(self.pk, orders_window(kwargs))
 
 
 class ProductType(DjangoObjectType):
+    orders = BatchedConnectionField(lambda: OrderType)
     class Meta:
         model = Product
         interfaces = (relay.Node,)
-        fields = ("id", "name", "price", "stock")
+        connection_class = CountableConnection
+        fields = ("id", "name", "price", "stock", "reorder_threshold", "reorder_quantity", "orders")
+
+    def resolve_orders(self, info, **kwargs):
+        return get_loaders(info).product_orders.load(self.pk, orders_window(kwargs))
+
+
+class OrderItemType(DjangoObjectType):
+    """A line of an order, at the unit price captured when it was placed."""
+    line_total = graphene.Decimal()
+
+    class Meta:
+        model = OrderItem
+        fields = ("product", "quantity", "unit_price")
 
 
 class OrderType(DjangoObjectType):
+    products = BatchedConnectionField(ProductType)
+    items = graphene.List(graphene.NonNull(OrderItemType))
     class Meta:
         model = Order
         interfaces = (relay.Node,)
-        fields = ("id", "customer", "products", "total_amount", "order_date")
+        connection_class = CountableConnection
+        fields = ("id", "customer", "products", "items", "total_amount", "order_date")
+
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customer.load(self.customer_id)
+
+    def resolve_products(self, info, **kwargs):
+        if is_prefetched(self, "products"):
+            return list(self.products.all())
+        return get_loaders(info).order_products.load(self.pk)
+
+    def resolve_items(self, info):
+        return get_loaders(info).order_items.load(self.pk)
+
+
+class JobType(DjangoObjectType):
+    """A mutation running in the background; poll it with `job(id)`."""
+    progress = graphene.Float(description="Fraction of the steps done, 0 to 1.")
+    errors = graphene.List(graphene.String)
+    result = graphene.JSONString()
+
+    class Meta:
+        model = Job
+        fields = ("id", "kind", "status", "total", "done", "errors", "result", "created_at", "started_at", "finished_at")
+
+    def resolve_progress(self, info):
+        return self.done / self.total if self.total else float(self.status == Job.SUCCEEDED)
+
+
+class RevenuePeriod(graphene.Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class RevenueBucketType(graphene.ObjectType):
+    period = graphene.Date(description="First day of the bucket (Monday for weeks).")
+    orders_count = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class CustomerRevenueType(graphene.ObjectType):
+    customer = graphene.Field(CustomerType)
+    orders_count = graphene.Int()
+    revenue = graphene.Decimal()
+
+    def resolve_customer(self, info):
+        return get_loaders(info).customer.load(self["customer_id"])
+
+
+class ProductSalesType(graphene.ObjectType):
+    product = graphene.Field(ProductType)
+    quantity = graphene.Int()
+    revenue = graphene.Decimal()
+
+    def resolve_product(self, info):
+        return get_loaders(info).product.load(self["product_id"])
+
+
+class ResponseCacheStatsType(graphene.ObjectType):
+    hits = graphene.Int()
+    misses = graphene.Int()
 
 
 # ==========================================================
@@ -51,27 +155,22 @@ class ProductInput(graphene.InputObjectType):
     name = graphene.String(required=True)
     price = graphene.Float(required=True)
     stock = graphene.Int(required=False, default_value=0)
+    reorder_threshold = graphene.Int(required=False)
+    reorder_quantity = graphene.Int(required=False)
+
+
+class OrderItemInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    quantity = graphene.Int(required=False, default_value=1)
 
 
 class OrderInput(graphene.InputObjectType):
     customer_id = graphene.ID(required=True)
-    product_ids = graphene.List(graphene.ID, required=True)
+    product_ids = graphene.List(graphene.ID, required=False, description="One of each product.")
+    items = graphene.List(OrderItemInput, required=False, description="Products with their quantities.")
     order_date = graphene.DateTime(required=False)
 
 
-# ==========================================================
-# Utility: Validation helpers
-# ==========================================================
-def validate_email_unique(email):
-    if Customer.objects.filter(email=email).exists():
-        raise ValueError("Email already exists.")
-
-
-def validate_phone_format(phone):
-    if phone and not re.match(r"^(\+\d{7,15}|\d{3}-\d{3}-\d{4})$", phone):
-        raise ValueError("Invalid phone number format.")
-
-
 # ==========================================================
 # Mutations
 # ==========================================================
@@ -85,17 +184,20 @@ class CreateCustomer(graphene.Mutation):
     message = graphene.String()
 
     @staticmethod
+    @observe_mutation
+    @invalidates("customer")
     def mutate(root, info, input):
         try:
             validate_email_unique(input.email)
             validate_phone_format(input.phone)
 
-            customer = Customer.objects.create(
-                name=input.name,
-                email=input.email,
-                phone=input.phone
-            )
-            customer.save()
+            with transaction.atomic():
+                customer = Customer.objects.create(
+                    name=input.name,
+                    email=input.email,
+                    phone=input.phone
+                )
+                record_customers(1)
             return CreateCustomer(customer=customer, message="Customer created successfully.")
         except ValueError as e:
             return CreateCustomer(customer=None, message=str(e))
@@ -105,31 +207,22 @@ class CreateCustomer(graphene.Mutation):
 class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
         input = graphene.List(CustomerInput, required=True)
+        background = graphene.Boolean(
+            default_value=False, description="Run as a job and return it at once instead of the customers."
+        )
 
     customers = graphene.List(CustomerType)
     errors = graphene.List(graphene.String)
+    job = graphene.Field(JobType)
 
     @staticmethod
-    def mutate(root, info, input):
-        created_customers = []
-        errors = []
-
-        with transaction.atomic():
-            for cust in input:
-                try:
-                    validate_email_unique(cust.email)
-                    validate_phone_format(cust.phone)
-                    customer = Customer.objects.create(
-                        name=cust.name,
-                        email=cust.email,
-                        phone=cust.phone
-                    )
-                    created_customers.append(customer)
-                except ValueError as e:
-                    errors.append(f"{cust.email}: {str(e)}")
-                except Exception as e:
-                    errors.append(f"{cust.email}: Unexpected error ({e})")
-
+    @observe_mutation
+    @invalidates("customer")
+    def mutate(root, info, input, background=False):
+        if background:
+            rows = [{"name": row.name, "email": row.email, "phone": row.phone} for row in input]
+            return BulkCreateCustomers(job=enqueue("bulk_create_customers", {"input": rows}))
+        created_customers, errors = bulk_create_customers(input)
         return BulkCreateCustomers(customers=created_customers, errors=errors)
 
 
@@ -142,16 +235,24 @@ class CreateProduct(graphene.Mutation):
     message = graphene.String()
 
     @staticmethod
+    @observe_mutation
+    @invalidates("product")
     def mutate(root, info, input):
         if input.price <= 0:
             return CreateProduct(product=None, message="Price must be positive.")
         if input.stock < 0:
             return CreateProduct(product=None, message="Stock cannot be negative.")
+        if (input.reorder_threshold or 0) < 0:
+            return CreateProduct(product=None, message="Reorder threshold cannot be negative.")
+        if input.reorder_quantity is not None and input.reorder_quantity <= 0:
+            return CreateProduct(product=None, message="Reorder quantity must be positive.")
 
         product = Product.objects.create(
             name=input.name,
             price=input.price,
-            stock=input.stock or 0
+            stock=input.stock or 0,
+            reorder_threshold=input.reorder_threshold,
+            reorder_quantity=input.reorder_quantity,
         )
         return CreateProduct(product=product, message="Product created successfully.")
 
@@ -165,30 +266,89 @@ class CreateOrder(graphene.Mutation):
     message = graphene.String()
 
     @staticmethod
+    @observe_mutation
+    @invalidates("order", "product")
     def mutate(root, info, input):
         try:
             customer = Customer.objects.get(id=input.customer_id)
         except Customer.DoesNotExist:
             return CreateOrder(order=None, message="Invalid customer ID.")
 
-        if not input.product_ids:
-            return CreateOrder(order=None, message="At least one product must be provided.")
+        try:
+            quantities = requested_quantities(input)
+        except ValueError as e:
+            return CreateOrder(order=None, message=str(e))
 
-        products = list(Product.objects.filter(id__in=input.product_ids))
-        if len(products) != len(input.product_ids):
+        products = Product.objects.in_bulk([pk for pk in quantities if pk is not None])
+        if len(products) != len(quantities):
             return CreateOrder(order=None, message="Some product IDs are invalid.")
 
-        total_amount = sum(p.price for p in products)
-        order = Order.objects.create(
-            customer=customer,
-            total_amount=total_amount,
-            order_date=input.order_date or timezone.now()
-        )
-        order.products.set(products)
+        items = order_items(products, quantities)
+        total_amount = order_total(items)
+        try:
+            with transaction.atomic():
+                # Rolled back with the order on a shortfall.
+                reserve_stock(products.values(), quantities)
+                order = Order.objects.create(
+                    customer=customer,
+                    total_amount=total_amount,
+                    order_date=input.order_date or timezone.now()
+                )
+                for item in items:
+                    item.order = order
+                OrderItem.objects.bulk_create(items)
+                record_orders(1, total_amount)
+                record_order_rollups([(order, items)])
+                stock_changed(list(products))
+        except InsufficientStock as e:
+            return CreateOrder(order=None, message=str(e))
 
         return CreateOrder(order=order, message="Order created successfully.")
 
 
+# ---- BulkCreateOrders ----
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(OrderInput, required=True)
+
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+
+    @staticmethod
+    @observe_mutation
+    @invalidates("order", "product")
+    def mutate(root, info, input):
+        orders, errors = bulk_create_orders(input)
+        return BulkCreateOrders(orders=orders, errors=errors)
+
+
+# ---- UpdateLowStockProducts ----
+class UpdateLowStockProducts(graphene.Mutation):
+    class Arguments:
+        threshold = graphene.Int(required=False, default_value=LOW_STOCK_THRESHOLD)
+        increment = graphene.Int(required=False, default_value=RESTOCK_INCREMENT)
+        background = graphene.Boolean(
+            default_value=False, description="Run as a job and return it at once instead of the products."
+        )
+
+    updated_products = graphene.List(ProductType)
+    message = graphene.String()
+    job = graphene.Field(JobType)
+
+    @observe_mutation
+    @invalidates("product")
+    def mutate(self, info, threshold=LOW_STOCK_THRESHOLD, increment=RESTOCK_INCREMENT, background=False):
+        if increment <= 0:
+            return UpdateLowStockProducts(updated_products=[], message="Increment must be positive.")
+        if background:
+            job = enqueue("update_low_stock_products", {"threshold": threshold, "increment": increment})
+            return UpdateLowStockProducts(message="Restock job queued.", job=job)
+
+        updated = restock_low_stock_products(threshold=threshold, increment=increment)
+        message = f"{len(updated)} product(s) updated"
+        return UpdateLowStockProducts(updated_products=updated, message=message)
+
+
 # ==========================================================
 # Root Mutation Class
 # ==========================================================
@@ -197,6 +357,22 @@ class Mutation(graphene.ObjectType):
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
+    update_low_stock_products = UpdateLowStockProducts.Field()
+
+
+# ==========================================================
+# Analytics arguments
+# ==========================================================
+ANALYTICS_DEFAULT_LIMIT = 10
+ANALYTICS_MAX_LIMIT = 100
+
+
+def check_date_range(start, end, limit=None):
+    if end < start:
+        raise GraphQLError("'end' must not be before 'start'.")
+    if limit is not None and not 1 <= limit <= ANALYTICS_MAX_LIMIT:
+        raise GraphQLError(f"'limit' must be between 1 and {ANALYTICS_MAX_LIMIT}.")
 
 
 # ==========================================================
@@ -204,17 +380,17 @@ class Mutation(graphene.ObjectType):
 # ==========================================================
 # --- QUERY ---
 class Query(graphene.ObjectType):
-    all_customers = DjangoFilterConnectionField(
+    all_customers = KeysetConnectionField(
         CustomerType,
         filterset_class=CustomerFilter,
         order_by=graphene.String()
     )
-    all_products = DjangoFilterConnectionField(
+    all_products = KeysetConnectionField(
         ProductType,
         filterset_class=ProductFilter,
         order_by=graphene.String()
     )
-    all_orders = DjangoFilterConnectionField(
+    all_orders = KeysetConnectionField(
         OrderType,
         filterset_class=OrderFilter,
         order_by=graphene.String()
@@ -224,19 +400,67 @@ class Query(graphene.ObjectType):
     customers_count = graphene.Int()
     orders_count = graphene.Int()
     total_revenue = graphene.Float()
+    response_cache_stats = graphene.Field(ResponseCacheStatsType)
+    job = graphene.Field(JobType, id=graphene.ID(required=True))
+    revenue_by_period = graphene.List(
+        RevenueBucketType,
+        start=graphene.Date(required=True),
+        end=graphene.Date(required=True),
+        period=RevenuePeriod(default_value=RevenuePeriod.DAY.value),
+    )
+    top_customers = graphene.List(
+        CustomerRevenueType,
+        start=graphene.Date(required=True),
+        end=graphene.Date(required=True),
+        limit=graphene.Int(default_value=ANALYTICS_DEFAULT_LIMIT),
+    )
+    top_products = graphene.List(
+        ProductSalesType,
+        start=graphene.Date(required=True),
+        end=graphene.Date(required=True),
+        limit=graphene.Int(default_value=ANALYTICS_DEFAULT_LIMIT),
+    )
 
+    # Read from the maintained totals (crm.stats), not the tables.
     def resolve_customers_count(self, info):
-        return Customer.objects.count()
+        return get_stats().customers_count
 
     def resolve_orders_count(self, info):
-        return Order.objects.count()
+        return get_stats().orders_count
 
     def resolve_total_revenue(self, info):
-        return Order.objects.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
+        return float(get_stats().total_revenue)
+
+    def resolve_response_cache_stats(self, info):
+        return ResponseCacheStatsType(**cache_stats())
+
+    # Analytics read the daily rollups (crm.analytics), not the orders.
+    def resolve_revenue_by_period(self, info, start, end, period=RevenuePeriod.DAY.value):
+        check_date_range(start, end)
+        return revenue_by_period(start, end, getattr(period, "value", period))
+
+    def resolve_top_customers(self, info, start, end, limit=ANALYTICS_DEFAULT_LIMIT):
+        check_date_range(start, end, limit)
+        rows = top_customers(start, end, limit)
+        get_loaders(info).customer.prime(row["customer_id"] for row in rows)
+        return rows
+
+    def resolve_top_products(self, info, start, end, limit=ANALYTICS_DEFAULT_LIMIT):
+        check_date_range(start, end, limit)
+        rows = top_products(start, end, limit)
+        get_loaders(info).product.prime(row["product_id"] for row in rows)
+        return rows
+
+    def resolve_job(self, info, id):
+        try:
+            return Job.objects.filter(pk=id).first()
+        except ValidationError:
+            # Not a UUID: no such job.
+            return None
 
         
     # --- resolvers ---
-    def resolve_all_customers(self, info, filter=None, order_by=None):
+    def resolve_all_customers(self, info, filter=None, order_by=None, **kwargs):
         qs = Customer.objects.all()
         if filter:
             if filter.get("nameIcontains"):
@@ -247,11 +471,10 @@ class Query(graphene.ObjectType):
                 qs = qs.filter(created_at__gte=filter["createdAtGte"])
             if filter.get("createdAtLte"):
                 qs = qs.filter(created_at__lte=filter["createdAtLte"])
-        if order_by:
-            qs = qs.order_by(order_by)
-        return qs
+        # Ordering is applied by KeysetConnectionField, which pages on it.
+        return optimize_queryset(qs, info)
 
-    def resolve_all_products(self, info, filter=None, order_by=None):
+    def resolve_all_products(self, info, filter=None, order_by=None, **kwargs):
         qs = Product.objects.all()
         if filter:
             if filter.get("nameIcontains"):
@@ -264,11 +487,10 @@ class Query(graphene.ObjectType):
                 qs = qs.filter(stock__gte=filter["stockGte"])
             if filter.get("stockLte"):
                 qs = qs.filter(stock__lte=filter["stockLte"])
-        if order_by:
-            qs = qs.order_by(order_by)
-        return qs
+        # Ordering is applied by KeysetConnectionField, which pages on it.
+        return optimize_queryset(qs, info)
 
-    def resolve_all_orders(self, info, filter=None, order_by=None):
+    def resolve_all_orders(self, info, filter=None, order_by=None, **kwargs):
         qs = Order.objects.all()
         if filter:
             if filter.get("totalAmountGte"):
@@ -282,29 +504,6 @@ class Query(graphene.ObjectType):
             if filter.get("customerName"):
                 qs = qs.filter(customer__name__icontains=filter["customerName"])
             if filter.get("productName"):
-                qs = qs.filter(products__name__icontains=filter["productName"])
-        if order_by:
-            qs = qs.order_by(order_by)
-        return qs
-
-#--------------------------
-
-class UpdateLowStockProducts(graphene.Mutation):
-    updated_products = graphene.List(ProductType)
-    message = graphene.String()
-
-    def mutate(self, info):
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated = []
-
-        for product in low_stock_products:
-            product.stock += 10
-            product.save()
-            updated.append(product)
-
-        message = f"{len(updated)} product(s) updated"
-        return UpdateLowStockProducts(updated_products=updated, message=message)
-
-
-class Mutation(graphene.ObjectType):
-    update_low_stock_products = UpdateLowStockProducts.Field()
\ No newline at end of file
+                qs = qs.filter(order_has_product(name__icontains=filter["productName"]))
+        # Ordering is applied by KeysetConnectionField, which pages on it.
+        return optimize_queryset(qs, info)
@@ -1,14 +1,8 @@
-from .models import Customer, Product
+from django.core.management import call_command
 
-def seed_data():
-    Customer.objects.all().delete()
-    Product.objects.all().delete()
-
-    Customer.objects.create(name="Alice", email="alice@example.com", phone="+1234567890")
-    Customer.objects.create(name="Bob", email="bob@example.com", phone="123-456-7890")
 
-    Product.objects.create(name="Laptop", price=999.99, stock=5)
-    Product.objects.create(name="Phone", price=499.99, stock=10)
-    Product.objects.create(name="Headphones", price=99.99, stock=20)
+def seed_data():
+    """Replace the CRM data with a small generated dataset (see generate_crm_data)."""
+    call_command("generate_crm_data", customers=50, products=20, orders=200, flush=True)
 
     print("✅ Database seeded successfully.")
@@ -0,0 +1,315 @@
+import re
+from collections import Counter
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from crm.analytics import record_order_rollups
+from crm.models import Customer, Product, Order, OrderItem
+from crm.replenishment import stock_changed
+from crm.stats import record_customers, record_orders
+
+BULK_BATCH_SIZE = 500
+LOW_STOCK_THRESHOLD = 10
+RESTOCK_INCREMENT = 10
+
+
+# ==========================================================
+# Utility: Validation helpers
+# ==========================================================
+def validate_email_unique(email):
+    if Customer.objects.filter(email=email).exists():
+        raise ValueError("Email already exists.")
+
+
+def validate_phone_format(phone):
+    if phone and not re.match(r"^(\+\d{7,15}|\d{3}-\d{3}-\d{4})$", phone):
+        raise ValueError("Invalid phone number format.")
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_emails(emails, batch_size=BULK_BATCH_SIZE):
+    """Emails among ``emails`` that are already taken, one query per chunk."""
+    emails = list(emails)
+    found = set()
+    for chunk in chunked(emails, batch_size):
+        found.update(Customer.objects.filter(email__in=chunk).values_list("email", flat=True))
+    return found
+
+
+# ==========================================================
+# Customers
+# ==========================================================
+def bulk_create_customers(rows, batch_size=BULK_BATCH_SIZE):
+    """
+    Validate and insert customer ``rows`` (objects with name/email/phone).
+
+    Phones are checked in Python, emails with one ``email__in`` query per
+    chunk plus in-batch duplicate detection, and valid rows are inserted with
+    chunked ``bulk_create``. Returns ``(created_customers, errors)`` where
+    errors are ``"<email>: <reason>"`` strings, as the mutation reports them.
+    """
+    errors = []
+    candidates = []
+    seen = set()
+    for row in rows:
+        try:
+            validate_phone_format(row.phone)
+            if row.email in seen:
+                raise ValueError("Duplicate email in input.")
+            seen.add(row.email)
+            candidates.append(row)
+        except ValueError as e:
+            errors.append(f"{row.email}: {str(e)}")
+
+    taken = existing_emails(seen, batch_size)
+    customers = []
+    for row in candidates:
+        if row.email in taken:
+            errors.append(f"{row.email}: Email already exists.")
+        else:
+            customers.append(Customer(name=row.name, email=row.email, phone=row.phone))
+
+    created = []
+    for chunk in chunked(customers, batch_size):
+        try:
+            # A savepoint per chunk: a conflicting concurrent insert only
+            # affects this chunk, never the caller's transaction.
+            with transaction.atomic():
+                created.extend(Customer.objects.bulk_create(chunk))
+                record_customers(len(chunk))
+        except IntegrityError:
+            created.extend(_create_one_by_one(chunk, errors))
+    return created, errors
+
+
+def _create_one_by_one(customers, errors):
+    created = []
+    for customer in customers:
+        try:
+            with transaction.atomic():
+                customer.save(force_insert=True)
+                record_customers(1)
+            created.append(customer)
+        except IntegrityError:
+            errors.append(f"{customer.email}: Email already exists.")
+    return created
+
+
+# ==========================================================
+# Products
+# ==========================================================
+def update_returning_supported():
+    # MariaDB/MySQL only support RETURNING on INSERT/DELETE, not UPDATE.
+    return (
+        connection.vendor in ("postgresql", "sqlite")
+        and connection.features.can_return_columns_from_insert
+    )
+
+
+def restock_low_stock_products(threshold=LOW_STOCK_THRESHOLD, increment=RESTOCK_INCREMENT):
+    """
+    Add ``increment`` to the stock of every product below ``threshold``.
+
+    The increment is a single ``UPDATE ... SET stock = stock + n`` so it
+    cannot lose concurrent writes. Updated rows come back through
+    ``RETURNING`` where the backend supports it, otherwise through one
+    locked id lookup and one follow-up fetch: the query count never
+    depends on the catalog size.
+    """
+    if update_returning_supported():
+        table = connection.ops.quote_name(Product._meta.db_table)
+        columns = ", ".join(connection.ops.quote_name(f.column) for f in Product._meta.concrete_fields)
+        stock = connection.ops.quote_name(Product._meta.get_field("stock").column)
+        with transaction.atomic():
+            return list(Product.objects.raw(
+                f"UPDATE {table} SET {stock} = {stock} + %s WHERE {stock} < %s RETURNING {columns}",
+                [increment, threshold],
+            ))
+
+    with transaction.atomic():
+        low_stock = Product.objects.select_for_update().filter(stock__lt=threshold)
+        ids = list(low_stock.values_list("pk", flat=True))
+        Product.objects.filter(pk__in=ids).update(stock=F("stock") + increment)
+        return list(Product.objects.filter(pk__in=ids))
+
+
+def below_reorder_threshold():
+    """Filter for products whose stock is under their own (or the default) threshold."""
+    return Q(stock__lt=Coalesce("reorder_threshold", Value(LOW_STOCK_THRESHOLD)))
+
+
+def replenish_products(product_ids=None):
+    """
+    Add its reorder quantity to the stock of every product (of
+    ``product_ids``, or all) that is below its reorder threshold; return
+    the ids updated. The condition is re-checked under the row locks, so
+    a repeated run is a no-op once the stock is back above the threshold.
+    """
+    low_stock = Product.objects.filter(below_reorder_threshold())
+    if product_ids is not None:
+        low_stock = low_stock.filter(pk__in=product_ids)
+    with transaction.atomic():
+        ids = list(low_stock.select_for_update().values_list("pk", flat=True))
+        Product.objects.filter(pk__in=ids).update(
+            stock=F("stock") + Coalesce("reorder_quantity", Value(RESTOCK_INCREMENT))
+        )
+    return ids
+
+
+# ==========================================================
+# Orders
+# ==========================================================
+class InsufficientStock(ValueError):
+    pass
+
+
+def reserve_stock(products, quantities=None):
+    """
+    Take ``quantities[pk]`` (default 1) of each of ``products`` from stock.
+
+    Call inside the order's transaction. Each product is decremented by a
+    conditional ``UPDATE ... SET stock = stock - n WHERE stock >= n``: no
+    read-modify-write race and no lock held before the write. The rows
+    are locked in id order, so two orders sharing products cannot
+    deadlock. A shortfall raises InsufficientStock; the caller's
+    transaction must then roll back the decrements already made. Call
+    crm.replenishment.stock_changed() for the products afterwards.
+    """
+    quantities = quantities or {}
+    for product in sorted(products, key=lambda p: p.pk):
+        quantity = quantities.get(product.pk, 1)
+        taken = Product.objects.filter(pk=product.pk, stock__gte=quantity).update(stock=F("stock") - quantity)
+        if not taken:
+            raise InsufficientStock(f"Insufficient stock for {product.name}.")
+
+
+def parse_ids(values):
+    """Integer ids from GraphQL ID values; None for anything malformed."""
+    ids = []
+    for value in values or []:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            ids.append(None)
+    return ids
+
+
+def requested_quantities(row):
+    """
+    ``{product id: quantity}`` of an order input row (product_ids/items).
+
+    Each of ``product_ids`` is one unit, however often it is repeated;
+    ``items`` add their quantity. Malformed ids map to None. Raises ValueError with the
+    mutations' message for an empty order or a quantity below 1.
+    """
+    quantities = Counter(dict.fromkeys(parse_ids(row.product_ids), 1))
+    for item in getattr(row, "items", None) or []:
+        quantity = 1 if item.quantity is None else item.quantity
+        if quantity < 1:
+            raise ValueError("Quantity must be positive.")
+        quantities[parse_ids([item.product_id])[0]] += quantity
+    if not quantities:
+        raise ValueError("At least one product must be provided.")
+    return quantities
+
+
+def order_items(products, quantities):
+    """Unsaved OrderItems for ``quantities``, at the products' current prices."""
+    return [
+        OrderItem(product=products[pk], quantity=quantity, unit_price=products[pk].price)
+        for pk, quantity in sorted(quantities.items())
+    ]
+
+
+def order_total(items):
+    return sum(item.line_total for item in items)
+
+
+def bulk_create_orders(rows, batch_size=BULK_BATCH_SIZE):
+    """
+    Create orders for ``rows`` (objects with customer_id/product_ids/items/order_date).
+
+    Every referenced customer and product is fetched with one query each,
+    line items capture the current prices and totals are computed from
+    them in memory. The stock of the whole batch is reserved with one
+    conditional UPDATE per product (order by order, in savepoints, only
+    when some product falls short), then orders and all their items are
+    inserted with one ``bulk_create`` each. Rows failing validation or
+    short of stock are skipped and reported as ``"Order <index>: <reason>"``
+    with the same reasons as CreateOrder.
+    """
+    rows = list(rows)
+    customer_ids = parse_ids(row.customer_id for row in rows)
+    quantities = []
+    for row in rows:
+        try:
+            quantities.append(requested_quantities(row))
+        except ValueError as e:
+            quantities.append(e)
+
+    customers = Customer.objects.in_bulk({pk for pk in customer_ids if pk is not None})
+    products = Product.objects.in_bulk(
+        {pk for requested in quantities if isinstance(requested, Counter) for pk in requested if pk is not None}
+    )
+
+    errors = []
+    candidates = []
+    for index, row in enumerate(rows):
+        customer = customers.get(customer_ids[index])
+        if customer is None:
+            errors.append(f"Order {index}: Invalid customer ID.")
+            continue
+        requested = quantities[index]
+        if isinstance(requested, ValueError):
+            errors.append(f"Order {index}: {requested}")
+            continue
+        if any(pk not in products for pk in requested):
+            errors.append(f"Order {index}: Some product IDs are invalid.")
+            continue
+        items = order_items(products, requested)
+        candidates.append((index, Order(
+            customer=customer,
+            total_amount=order_total(items),
+            order_date=row.order_date or timezone.now(),
+        ), items))
+
+    demand = Counter()
+    for _, _, items in candidates:
+        demand.update({item.product_id: item.quantity for item in items})
+    with transaction.atomic():
+        try:
+            # The whole batch at once: one UPDATE per product, whatever the
+            # number of orders.
+            with transaction.atomic():
+                reserve_stock([products[pk] for pk in demand], demand)
+            accepted = candidates
+        except InsufficientStock:
+            accepted = []
+            for index, order, items in candidates:
+                try:
+                    # A savepoint per order: a shortfall only undoes its own decrements.
+                    with transaction.atomic():
+                        reserve_stock(
+                            [item.product for item in items], {item.product_id: item.quantity for item in items}
+                        )
+                except InsufficientStock as e:
+                    errors.append(f"Order {index}: {e}")
+                    continue
+                accepted.append((index, order, items))
+        orders = [order for _, order, _ in accepted]
+        Order.objects.bulk_create(orders, batch_size=batch_size)
+        for _, order, items in accepted:
+            for item in items:
+                item.order = order
+        OrderItem.objects.bulk_create([item for _, _, items in accepted for item in items], batch_size=batch_size)
+        record_orders(len(orders), sum(order.total_amount for order in orders))
+        record_order_rollups((order, items) for _, order, items in accepted)
+        stock_changed([item.product_id for _, _, items in accepted for item in items])
+    return orders, errors
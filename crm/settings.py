@@ -1,6 +1,7 @@
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat', 'django_crontab'),
-    ('0 */12 * * *', 'crm.cron.update_low_stock'),
+    # Low stock is replenished as orders take it (crm.replenishment);
+    # crm.cron.update_low_stock stays available for manual runs.
 ]
 #----------------
 
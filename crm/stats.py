@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from crm.analytics import forget_orders
+from crm.models import CRMStats, Customer, Order
+from crm.response_cache import invalidates
+
+STATS_PK = 1
+
+
+def compute_stats():
+    """Aggregate the totals from scratch (full table scans)."""
+    return {
+        "customers_count": Customer.objects.count(),
+        "orders_count": Order.objects.count(),
+        "total_revenue": Order.objects.aggregate(total=Sum("total_amount"))["total"] or Decimal("0"),
+    }
+
+
+def rebuild_stats():
+    """Recompute the stats row; used by the reconciliation command."""
+    with transaction.atomic():
+        stats, _ = CRMStats.objects.select_for_update().update_or_create(
+            pk=STATS_PK, defaults=dict(compute_stats(), updated_at=timezone.now())
+        )
+    return stats
+
+
+def get_stats():
+    """O(1) read of the maintained totals."""
+    stats = CRMStats.objects.filter(pk=STATS_PK).first()
+    if stats is None:
+        stats = rebuild_stats()
+    return stats
+
+
+def _apply(**deltas):
+    changes = {name: F(name) + delta for name, delta in deltas.items() if delta}
+    if not changes:
+        return
+    updated = CRMStats.objects.filter(pk=STATS_PK).update(updated_at=timezone.now(), **changes)
+    if not updated:
+        # No row yet: building it now already includes the caller's rows.
+        rebuild_stats()
+
+
+def record_customers(delta):
+    """Call inside the transaction that created (+n) or deleted (-n) customers."""
+    _apply(customers_count=delta)
+
+
+def record_orders(delta, revenue):
+    """Call inside the transaction that created (+n) or deleted (-n) orders."""
+    _apply(orders_count=delta, total_revenue=revenue)
+
+
+@invalidates("customer", "order")
+def delete_customers(queryset):
+    """Delete customers (and their orders, by cascade) keeping the stats and rollups in step."""
+    with transaction.atomic():
+        ids = set(queryset.values_list("pk", flat=True))
+        orders = Order.objects.filter(customer_id__in=ids)
+        revenue = orders.aggregate(total=Sum("total_amount"))["total"]
+        forget_orders(orders)
+        _, deleted = Customer.objects.filter(pk__in=ids).delete()
+        customers = deleted.get(Customer._meta.label, 0)
+        record_customers(-customers)
+        record_orders(-deleted.get(Order._meta.label, 0), -(revenue or 0))
+    return customers
@@ -1,11 +1,19 @@
 from celery import shared_task
-import requests
 from datetime import datetime
 
+from crm import response_cache
+from crm.executor import execute_graphql
+from crm.jobs import run
+from crm.metrics import observe_job
+from crm.replenishment import release
+from crm.services import replenish_products
+
+REPORT_LOG = "/tmp/crm_report_log.txt"
+
+
 @shared_task
+@observe_job
 def generate_crm_report():
-    url = "http://localhost:8000/graphql"
-    
     query = """
     query {
         customersCount
@@ -15,13 +23,12 @@ def generate_crm_report():
     """
 
     try:
-        response = requests.post(url, json={'query': query})
-        data = response.json()
+        # Runs in the worker process; no round-trip through the web tier.
+        data = execute_graphql(query)
 
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_file = "/tmp/crm_report_log.txt"
 
-        with open(log_file, "a") as f:
+        with open(REPORT_LOG, "a") as f:
             if "errors" in data:
                 f.write(f"{now} ERROR: {data['errors']}\n")
             else:
@@ -31,5 +38,25 @@ def generate_crm_report():
                     f"{result['ordersCount']} orders, {result['totalRevenue']} revenue\n"
                 )
     except Exception as e:
-        with open("/tmp/crm_report_log.txt", "a") as f:
+        with open(REPORT_LOG, "a") as f:
             f.write(f"EXCEPTION {str(e)}\n")
+
+
+@shared_task(ignore_result=True)
+@observe_job
+def run_job(job_id):
+    """Run a background mutation recorded by crm.jobs.enqueue()."""
+    run(job_id)
+
+
+@shared_task(ignore_result=True)
+@observe_job
+def replenish_stock(product_ids=None):
+    """Restock ``product_ids`` (scheduled by crm.replenishment), or every low product."""
+    if product_ids is not None:
+        # Orders committed from now on schedule a new run.
+        release(product_ids)
+    updated = replenish_products(product_ids)
+    if updated and response_cache.is_enabled():
+        response_cache.invalidate_tags("product")
+    return updated
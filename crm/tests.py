@@ -1,3 +1,1444 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import AsyncRequestFactory, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_relay import to_global_id
+
+from crm import documents, metrics, response_cache
+from crm.celery import app as celery_app
+from crm.complexity import analyze
+from crm.dataloaders import ProductOrdersLoader
+from crm.analytics import rebuild_rollups
+from crm.models import (
+    Customer, DailyCustomerRevenue, DailyProductSales, DailyRevenue, Order, OrderItem, Product,
+)
+from crm.views import AsyncCRMGraphQLView
+from alx_backend_graphql.schema import schema
+from crm.replenishment import stock_changed
+from crm.stats import delete_customers, get_stats, rebuild_stats
+
+
+def add_items(order, products):
+    OrderItem.objects.bulk_create(OrderItem(order=order, product=p, unit_price=p.price) for p in products)
+    return order
+
+
+def create_orders(customers=5, products=4, orders=20):
+    customer_objs = [
+        Customer.objects.create(name=f"Customer {i}", email=f"customer{i}@example.com")
+        for i in range(customers)
+    ]
+    product_objs = [
+        Product.objects.create(name=f"Product {i}", price=Decimal("10.00") + i, stock=20)
+        for i in range(products)
+    ]
+    order_objs = []
+    for i in range(orders):
+        order = Order.objects.create(customer=customer_objs[i % customers])
+        add_items(order, product_objs[: (i % products) + 1])
+        order_objs.append(order)
+    return customer_objs, product_objs, order_objs
+
+
+# Deliberately deep queries: batching is what is under test here.
+@override_settings(CRM_QUERY_LIMITS={"MAX_COST": None, "MAX_DEPTH": None})
+class DataLoaderTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders()
+
+    def test_order_relations_are_batched(self):
+        # page joined with customers + prefetched products
+        with self.assertNumQueries(2):
+            response = self.query("""
+                {
+                  allOrders(first: 20) {
+                    edges { node { customer { name } products { edges { node { name } } } } }
+                  }
+                }
+            """)
+        self.assertResponseNoErrors(response)
+        edges = response.json()["data"]["allOrders"]["edges"]
+        self.assertEqual(len(edges), 20)
+        self.assertEqual(edges[0]["node"]["customer"]["name"], "Customer 0")
+        self.assertEqual(len(edges[3]["node"]["products"]["edges"]), 4)
+
+    def test_reverse_relations_are_batched(self):
+        # page + customer.orders + order.products + product.orders
+        with self.assertNumQueries(4):
+            response = self.query("""
+                {
+                  allCustomers(first: 5) {
+                    edges { node { name orders { edges { node {
+                      products { edges { node { orders { edges { node { id } } } } } }
+                    } } } } }
+                  }
+                }
+            """)
+        self.assertResponseNoErrors(response)
+        customers = response.json()["data"]["allCustomers"]["edges"]
+        self.assertEqual(len(customers), 5)
+        self.assertEqual(len(customers[0]["node"]["orders"]["edges"]), 4)
+
+    def test_reverse_relations_read_only_the_page(self):
+        read = mock.patch.object(ProductOrdersLoader, "item", autospec=True, side_effect=lambda self, row: row.order)
+        with CaptureQueriesContext(connection) as queries, read as item:
+            response = self.query("""
+                {
+                  allProducts(first: 4) { edges { node { name
+                    first: orders(first: 2) { totalCount pageInfo { hasNextPage } edges { node { id } } }
+                    last: orders(last: 1) { pageInfo { hasPreviousPage } edges { node { id } } }
+                  } } }
+                }
+            """)
+        self.assertResponseNoErrors(response)
+        products = response.json()["data"]["allProducts"]["edges"]
+        # Product 0 is in all 20 orders, Product 3 in 5 of them.
+        first, last = products[0]["node"]["first"], products[0]["node"]["last"]
+        self.assertEqual(first["totalCount"], 20)
+        self.assertTrue(first["pageInfo"]["hasNextPage"])
+        self.assertEqual(len(first["edges"]), 2)
+        self.assertTrue(last["pageInfo"]["hasPreviousPage"])
+        self.assertEqual(last["edges"][0]["node"]["id"], to_global_id("OrderType", Order.objects.latest("pk").pk))
+        self.assertEqual(products[3]["node"]["first"]["totalCount"], 5)
+        # One query per page size, reading 2 + 1 orders per product.
+        self.assertEqual(sum("ROW_NUMBER" in q["sql"] for q in queries.captured_queries), 2)
+        self.assertEqual(item.call_count, 4 * 3)
+
+
+class QuerysetOptimizerTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders()
+
+    def test_only_selected_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query("""
+                { allCustomers(first: 5) { edges { node { name } } } }
+            """)
+        self.assertResponseNoErrors(response)
+        page_sql = queries.captured_queries[-1]["sql"]
+        self.assertIn('"crm_customer"."name"', page_sql)
+        self.assertNotIn('"crm_customer"."email"', page_sql)
+
+    def test_prefetch_is_restricted_to_selected_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query("""
+                fragment ProductName on ProductType { name }
+                {
+                  allOrders(first: 5) {
+                    edges { node { totalAmount customer { email } products { edges { node { ...ProductName } } } } }
+                  }
+                }
+            """)
+        self.assertResponseNoErrors(response)
+        self.assertEqual(len(queries), 2)
+        page_sql, products_sql = queries.captured_queries[0]["sql"], queries.captured_queries[1]["sql"]
+        self.assertIn('"crm_customer"."email"', page_sql)
+        self.assertNotIn('"crm_customer"."name"', page_sql)
+        self.assertIn('"crm_product"."name"', products_sql)
+        self.assertNotIn('"crm_product"."price"', products_sql)
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(products=7)
+
+    def fetch_all(self, field, order_by, page_size, backwards=False):
+        if backwards:
+            args, cursor_name, more_name = f"last: {page_size}", "startCursor", "hasPreviousPage"
+        else:
+            args, cursor_name, more_name = f"first: {page_size}", "endCursor", "hasNextPage"
+        names, cursor = [], None
+        while True:
+            position = ""
+            if cursor:
+                position = f', {"before" if backwards else "after"}: "{cursor}"'
+            response = self.query(f"""
+                {{ {field}({args}, orderBy: "{order_by}"{position}) {{
+                    pageInfo {{ {cursor_name} {more_name} }}
+                    edges {{ node {{ name }} }}
+                }} }}
+            """)
+            self.assertResponseNoErrors(response)
+            data = response.json()["data"][field]
+            page = [edge["node"]["name"] for edge in data["edges"]]
+            names = page + names if backwards else names + page
+            if not data["pageInfo"][more_name]:
+                return names
+            cursor = data["pageInfo"][cursor_name]
+
+    def test_pages_follow_order_by(self):
+        expected = list(Product.objects.order_by("-price", "-id").values_list("name", flat=True))
+        self.assertEqual(self.fetch_all("allProducts", "-price", 3), expected)
+        self.assertEqual(self.fetch_all("allProducts", "-price", 2, backwards=True), expected)
+
+    def test_ties_are_broken_by_id(self):
+        Product.objects.update(price=Decimal("5.00"))
+        expected = list(Product.objects.order_by("price", "id").values_list("name", flat=True))
+        self.assertEqual(self.fetch_all("allProducts", "price", 2), expected)
+
+    def test_no_offset_or_count_unless_total_count_selected(self):
+        first = self.query('{ allOrders(first: 5, orderBy: "orderDate") { pageInfo { endCursor } } }')
+        cursor = first.json()["data"]["allOrders"]["pageInfo"]["endCursor"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(
+                f'{{ allOrders(first: 5, after: "{cursor}", orderBy: "orderDate") {{ edges {{ node {{ id }} }} }} }}'
+            )
+        self.assertResponseNoErrors(response)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("OFFSET", queries.captured_queries[0]["sql"])
+
+        response = self.query('{ allOrders(first: 5, customerName: "Customer 1") { totalCount } }')
+        self.assertEqual(response.json()["data"]["allOrders"]["totalCount"], 4)
+
+    def test_invalid_order_by(self):
+        response = self.query('{ allCustomers(first: 5, orderBy: "phone") { edges { node { id } } } }')
+        self.assertResponseHasErrors(response)
+
+
+class BulkCreateCustomersTests(GraphQLTestCase):
+    MUTATION = """
+        mutation ($input: [CustomerInput]!) {
+          bulkCreateCustomers(input: $input) { customers { email } errors }
+        }
+    """
+
+    def test_valid_rows_created_and_errors_reported(self):
+        Customer.objects.create(name="Taken", email="taken@example.com")
+        rows = [
+            {"name": "A", "email": "a@example.com", "phone": "+1234567890"},
+            {"name": "B", "email": "b@example.com", "phone": "bad"},
+            {"name": "C", "email": "taken@example.com"},
+            {"name": "D", "email": "a@example.com"},
+            {"name": "E", "email": "e@example.com", "phone": "123-456-7890"},
+        ]
+        response = self.query(self.MUTATION, variables={"input": rows})
+        self.assertResponseNoErrors(response)
+        result = response.json()["data"]["bulkCreateCustomers"]
+        self.assertEqual([c["email"] for c in result["customers"]], ["a@example.com", "e@example.com"])
+        self.assertCountEqual(result["errors"], [
+            "b@example.com: Invalid phone number format.",
+            "a@example.com: Duplicate email in input.",
+            "taken@example.com: Email already exists.",
+        ])
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        rows = [{"name": f"C{i}", "email": f"c{i}@example.com"} for i in range(200)]
+        # email check + savepoint + bulk insert + stats update + release
+        with self.assertNumQueries(5):
+            response = self.query(self.MUTATION, variables={"input": rows})
+        self.assertResponseNoErrors(response)
+        self.assertEqual(Customer.objects.count(), 200)
+
+    def test_conflicting_insert_only_rejects_that_row(self):
+        Customer.objects.create(name="Taken", email="taken@example.com")
+        rows = [{"name": "A", "email": "a@example.com"}, {"name": "T", "email": "taken@example.com"}]
+        # Simulate a concurrent insert that the up-front check did not see.
+        with mock.patch("crm.services.existing_emails", return_value=set()):
+            response = self.query(self.MUTATION, variables={"input": rows})
+        result = response.json()["data"]["bulkCreateCustomers"]
+        self.assertEqual([c["email"] for c in result["customers"]], ["a@example.com"])
+        self.assertEqual(result["errors"], ["taken@example.com: Email already exists."])
+
+
+class BulkCreateOrdersTests(GraphQLTestCase):
+    MUTATION = """
+        mutation ($input: [OrderInput]!) {
+          bulkCreateOrders(input: $input) {
+            orders { totalAmount customer { name } products { edges { node { name } } } }
+            errors
+          }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers, cls.products, _ = create_orders(customers=2, products=3, orders=0)
+
+    def test_orders_created_with_totals_and_errors(self):
+        c0, c1 = (str(c.pk) for c in self.customers)
+        p0, p1, p2 = (str(p.pk) for p in self.products)
+        rows = [
+            {"customerId": c0, "productIds": [p0, p1]},
+            {"customerId": "999999", "productIds": [p0]},
+            {"customerId": c1, "productIds": []},
+            {"customerId": c1, "productIds": [p2, "999999"]},
+            {"customerId": c1, "productIds": [p2]},
+        ]
+        response = self.query(self.MUTATION, variables={"input": rows})
+        self.assertResponseNoErrors(response)
+        result = response.json()["data"]["bulkCreateOrders"]
+        self.assertEqual(result["errors"], [
+            "Order 1: Invalid customer ID.",
+            "Order 2: At least one product must be provided.",
+            "Order 3: Some product IDs are invalid.",
+        ])
+        self.assertEqual([o["totalAmount"] for o in result["orders"]], ["21.00", "12.00"])
+        self.assertEqual(result["orders"][0]["customer"]["name"], "Customer 0")
+        self.assertEqual(len(result["orders"][0]["products"]["edges"]), 2)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_orders(self):
+        product_ids = [str(p.pk) for p in self.products]
+        # 240 items: one INSERT within SQLite's 999 parameters (4 per item).
+        rows = [{"customerId": str(self.customers[i % 2].pk), "productIds": product_ids} for i in range(80)]
+        Product.objects.update(stock=100)
+        # customers + products + savepoint + stock (savepoint, one update per
+        # product, release) + orders + items + stats update + daily rollups
+        # (insert missing rows + one update, for three tables) + release
+        with self.assertNumQueries(18):
+            self.query(
+                "mutation ($input: [OrderInput]!) { bulkCreateOrders(input: $input) { errors } }",
+                variables={"input": rows},
+            )
+        self.assertEqual(OrderItem.objects.count(), 240)
+
+
+class UpdateLowStockProductsTests(GraphQLTestCase):
+    MUTATION = """
+        mutation ($threshold: Int, $increment: Int) {
+          updateLowStockProducts(threshold: $threshold, increment: $increment) {
+            message updatedProducts { name stock price }
+          }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, stock in enumerate([0, 4, 9, 10, 25]):
+            Product.objects.create(name=f"P{i}", price=Decimal("9.99"), stock=stock)
+
+    def restock(self, **variables):
+        response = self.query(self.MUTATION, variables=variables)
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]["updateLowStockProducts"]
+
+    def test_defaults_restock_below_ten(self):
+        result = self.restock()
+        self.assertEqual(result["message"], "3 product(s) updated")
+        self.assertCountEqual(
+            [(p["name"], p["stock"], p["price"]) for p in result["updatedProducts"]],
+            [("P0", 10, "9.99"), ("P1", 14, "9.99"), ("P2", 19, "9.99")],
+        )
+        self.assertEqual(
+            list(Product.objects.order_by("name").values_list("stock", flat=True)), [10, 14, 19, 10, 25]
+        )
+
+    def test_threshold_and_increment_arguments(self):
+        result = self.restock(threshold=5, increment=100)
+        self.assertEqual(result["message"], "2 product(s) updated")
+        self.assertEqual(Product.objects.get(name="P1").stock, 104)
+        self.assertEqual(self.restock(increment=0)["message"], "Increment must be positive.")
+
+    def test_query_count_is_constant(self):
+        # savepoint + UPDATE ... RETURNING + release
+        with self.assertNumQueries(3):
+            self.restock()
+
+    def test_fallback_without_returning(self):
+        with mock.patch("crm.services.update_returning_supported", return_value=False):
+            result = self.restock()
+        self.assertEqual(len(result["updatedProducts"]), 3)
+        self.assertEqual(Product.objects.get(name="P0").stock, 10)
+
+
+class CRMStatsTests(GraphQLTestCase):
+    STATS = "{ customersCount ordersCount totalRevenue }"
+
+    def stats(self):
+        response = self.query(self.STATS)
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]
+
+    def test_mutations_maintain_totals(self):
+        product = Product.objects.create(name="P", price=Decimal("12.50"), stock=5)
+        self.query(
+            'mutation { createCustomer(input: {name: "A", email: "a@example.com"}) { message } }'
+        )
+        self.query(
+            "mutation ($input: [CustomerInput]!) { bulkCreateCustomers(input: $input) { errors } }",
+            variables={"input": [{"name": "B", "email": "b@example.com"}, {"name": "C", "email": "c@example.com"}]},
+        )
+        customer = Customer.objects.get(email="a@example.com")
+        self.query(
+            "mutation ($input: OrderInput!) { createOrder(input: $input) { message } }",
+            variables={"input": {"customerId": str(customer.pk), "productIds": [str(product.pk)]}},
+        )
+        self.query(
+            "mutation ($input: [OrderInput]!) { bulkCreateOrders(input: $input) { errors } }",
+            variables={"input": [{"customerId": str(customer.pk), "productIds": [str(product.pk)]}] * 2},
+        )
+        self.assertEqual(self.stats(), {"customersCount": 3, "ordersCount": 3, "totalRevenue": 37.5})
+
+        delete_customers(Customer.objects.filter(pk=customer.pk))
+        self.assertEqual(self.stats(), {"customersCount": 2, "ordersCount": 0, "totalRevenue": 0.0})
+
+    def test_reads_do_not_scan_tables(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.stats()
+        for query in queries.captured_queries:
+            self.assertNotIn('"crm_order"', query["sql"])
+            self.assertNotIn('"crm_customer"', query["sql"])
+
+    def test_rebuild_command_fixes_drift(self):
+        create_orders(customers=2, products=2, orders=3)
+        out = StringIO()
+        call_command("rebuild_crm_stats", "--check", stdout=out)
+        self.assertIn("customers_count: stored 0, actual 2", out.getvalue())
+        call_command("rebuild_crm_stats", stdout=StringIO())
+        self.assertEqual(get_stats().orders_count, 3)
+
+
+class BackgroundJobTests(TestCase):
+    def setUp(self):
+        handle, self.log_path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, self.log_path)
+
+    def read_log(self):
+        with open(self.log_path) as f:
+            return f.read()
+
+    def test_jobs_run_in_process(self):
+        from crm import cron, tasks
+
+        Product.objects.create(name="Low", price=Decimal("1.00"), stock=2)
+        rebuild_stats()
+        with mock.patch("crm.executor.requests.post") as post, \
+                mock.patch.object(tasks, "REPORT_LOG", self.log_path), \
+                mock.patch.object(cron, "LOW_STOCK_LOG", self.log_path), \
+                mock.patch.object(cron, "HEARTBEAT_LOG", self.log_path):
+            tasks.generate_crm_report()
+            cron.update_low_stock()
+            cron.log_crm_heartbeat()
+        post.assert_not_called()
+        log = self.read_log()
+        self.assertIn("Report: 0 customers, 0 orders, 0.0 revenue", log)
+        self.assertIn("1 product(s) updated", log)
+        self.assertIn("- Low new stock: 12", log)
+        self.assertIn("GraphQL OK: {'data': {'hello': 'Hello, GraphQL!'}}", log)
+
+    @override_settings(CRM_HEARTBEAT_EXECUTOR="http")
+    def test_heartbeat_http_mode(self):
+        from crm import cron
+
+        with mock.patch("crm.executor.requests.post") as post, \
+                mock.patch.object(cron, "HEARTBEAT_LOG", self.log_path):
+            post.return_value.json.return_value = {"data": {"hello": "Hello, GraphQL!"}}
+            cron.log_crm_heartbeat()
+        post.assert_called_once()
+        self.assertIn("GraphQL OK", self.read_log())
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_BROKER_URL="memory://")
+class JobQueueTests(GraphQLTestCase):
+    JOB = "query ($id: ID!) { job(id: $id) { kind status total done progress errors result } }"
+
+    def run_in_background(self, mutation, variables=None):
+        # The task is sent on commit and, eagerly, runs right there.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.query(mutation, variables=variables)
+        self.assertResponseNoErrors(response)
+        data = next(iter(response.json()["data"].values()))
+        self.assertEqual(data["job"]["status"], "PENDING")
+        job = self.query(self.JOB, variables={"id": data["job"]["id"]})
+        self.assertResponseNoErrors(job)
+        return job.json()["data"]["job"]
+
+    def test_bulk_create_customers_job(self):
+        Customer.objects.create(name="Taken", email="taken@example.com")
+        rebuild_stats()
+        rows = [
+            {"name": "A", "email": "a@example.com"},
+            {"name": "B", "email": "b@example.com", "phone": "bad"},
+            {"name": "C", "email": "taken@example.com"},
+            {"name": "D", "email": "d@example.com"},
+            {"name": "A2", "email": "a@example.com"},
+        ]
+        with mock.patch("crm.jobs.BULK_BATCH_SIZE", 2):
+            job = self.run_in_background(
+                "mutation ($input: [CustomerInput]!) {"
+                " bulkCreateCustomers(input: $input, background: true) { customers { id } job { id status } } }",
+                {"input": rows},
+            )
+        self.assertEqual(
+            (job["kind"], job["status"], job["total"], job["done"]), ("bulk_create_customers", "SUCCEEDED", 5, 5)
+        )
+        self.assertEqual(job["progress"], 1.0)
+        self.assertCountEqual(job["errors"], [
+            "a@example.com: Duplicate email in input.",
+            "b@example.com: Invalid phone number format.",
+            "taken@example.com: Email already exists.",
+        ])
+        self.assertEqual(json.loads(job["result"])["created"], 2)
+        self.assertEqual(get_stats().customers_count, 3)
+
+    def test_update_low_stock_products_job(self):
+        Product.objects.create(name="Low", price=Decimal("1.00"), stock=2)
+        job = self.run_in_background("mutation { updateLowStockProducts(background: true) { message job { id status } } }")
+        self.assertEqual(job["status"], "SUCCEEDED")
+        self.assertEqual(json.loads(job["result"])["message"], "1 product(s) updated")
+        self.assertEqual(Product.objects.get().stock, 12)
+
+    def test_failures_are_reported(self):
+        mutation = "mutation { updateLowStockProducts(background: true) { job { id status } } }"
+        with mock.patch("crm.jobs.restock_low_stock_products", side_effect=RuntimeError("boom")):
+            job = self.run_in_background(mutation)
+        self.assertEqual((job["status"], job["errors"]), ("FAILED", ["Job failed: boom"]))
+
+        with mock.patch("crm.tasks.run_job.delay", side_effect=ConnectionError("broker down")), \
+                self.assertLogs("crm.jobs", "ERROR"):
+            job = self.run_in_background(mutation)
+        self.assertEqual((job["status"], job["errors"]), ("FAILED", ["Could not enqueue the job: broker down"]))
+
+        response = self.query(self.JOB, variables={"id": "not-a-job"})
+        self.assertIsNone(response.json()["data"]["job"])
+
+
+class OrderItemTests(GraphQLTestCase):
+    MUTATION = """
+        mutation ($input: OrderInput!) {
+          createOrder(input: $input) {
+            order { totalAmount items { product { name } quantity unitPrice lineTotal } }
+            message
+          }
+        }
+    """
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.lamp = Product.objects.create(name="Lamp", price=Decimal("10.00"), stock=5)
+        self.chair = Product.objects.create(name="Chair", price=Decimal("25.50"), stock=5)
+
+    def order(self, **input):
+        response = self.query(self.MUTATION, variables={"input": {"customerId": str(self.customer.pk), **input}})
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]["createOrder"]
+
+    def test_quantities_and_captured_prices(self):
+        result = self.order(
+            productIds=[str(self.chair.pk)],
+            items=[{"productId": str(self.lamp.pk), "quantity": 3}, {"productId": str(self.chair.pk)}],
+        )
+        self.assertEqual(result["order"]["totalAmount"], "81.00")
+        self.assertEqual(result["order"]["items"], [
+            {"product": {"name": "Lamp"}, "quantity": 3, "unitPrice": "10.00", "lineTotal": "30.00"},
+            {"product": {"name": "Chair"}, "quantity": 2, "unitPrice": "25.50", "lineTotal": "51.00"},
+        ])
+        self.assertEqual(dict(Product.objects.values_list("name", "stock")), {"Lamp": 2, "Chair": 3})
+
+        # A later price change leaves the order's lines and total alone.
+        Product.objects.update(price=Decimal("99.00"))
+        order = Order.objects.get()
+        with self.assertNumQueries(2):
+            order.calculate_total()
+        self.assertEqual(order.total_amount, Decimal("81.00"))
+        self.assertEqual(Order.objects.get().total_amount, Decimal("81.00"))
+
+    def test_invalid_quantities(self):
+        result = self.order(items=[{"productId": str(self.lamp.pk), "quantity": 0}])
+        self.assertEqual(result, {"order": None, "message": "Quantity must be positive."})
+        result = self.order(items=[{"productId": str(self.lamp.pk), "quantity": 6}])
+        self.assertEqual(result, {"order": None, "message": "Insufficient stock for Lamp."})
+        result = self.order(productIds=[], items=[])
+        self.assertEqual(result, {"order": None, "message": "At least one product must be provided."})
+        self.assertFalse(Order.objects.exists())
+
+    def test_items_are_batched(self):
+        create_orders()
+        # page + items with their products
+        with self.assertNumQueries(2):
+            response = self.query("""
+                { allOrders(first: 20) { edges { node { items { quantity product { name } } } } } }
+            """)
+        self.assertResponseNoErrors(response)
+        edges = response.json()["data"]["allOrders"]["edges"]
+        self.assertEqual([len(edge["node"]["items"]) for edge in edges[:4]], [1, 2, 3, 4])
+
+
+class AnalyticsTests(GraphQLTestCase):
+    ORDER = """
+        mutation ($input: OrderInput!) { createOrder(input: $input) { message } }
+    """
+
+    def setUp(self):
+        self.ann = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        self.lamp = Product.objects.create(name="Lamp", price=Decimal("10.00"), stock=100)
+        self.chair = Product.objects.create(name="Chair", price=Decimal("25.50"), stock=100)
+        for customer, date, items in [
+            (self.ann, "2026-01-05", [(self.lamp, 1)]),
+            (self.ann, "2026-01-06", [(self.lamp, 2), (self.chair, 1)]),
+            (self.bob, "2026-01-14", [(self.chair, 2)]),
+            (self.bob, "2026-02-02", [(self.lamp, 1)]),
+        ]:
+            response = self.query(self.ORDER, variables={"input": {
+                "customerId": str(customer.pk),
+                "items": [{"productId": str(p.pk), "quantity": n} for p, n in items],
+                "orderDate": f"{date}T12:00:00+00:00",
+            }})
+            self.assertEqual(response.json()["data"]["createOrder"]["message"], "Order created successfully.")
+
+    def analytics(self, query, **variables):
+        response = self.query(query, variables=variables)
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]
+
+    def rollups(self):
+        return (
+            list(DailyRevenue.objects.order_by("date").values_list("date", "orders_count", "revenue")),
+            list(DailyCustomerRevenue.objects.order_by("date", "customer").values_list(
+                "date", "customer", "orders_count", "revenue",
+            )),
+            list(DailyProductSales.objects.order_by("date", "product").values_list(
+                "date", "product", "quantity", "revenue",
+            )),
+        )
+
+    def test_revenue_by_period(self):
+        query = """
+            query ($start: Date!, $end: Date!, $period: RevenuePeriod) {
+              revenueByPeriod(start: $start, end: $end, period: $period) { period ordersCount revenue }
+            }
+        """
+        with CaptureQueriesContext(connection) as queries:
+            days = self.analytics(query, start="2026-01-01", end="2026-01-31")["revenueByPeriod"]
+        self.assertFalse(any('"crm_order"' in q["sql"] for q in queries.captured_queries))
+        self.assertEqual(days, [
+            {"period": "2026-01-05", "ordersCount": 1, "revenue": "10.00"},
+            {"period": "2026-01-06", "ordersCount": 1, "revenue": "45.50"},
+            {"period": "2026-01-14", "ordersCount": 1, "revenue": "51.00"},
+        ])
+        weeks = self.analytics(query, start="2026-01-01", end="2026-02-28", period="WEEK")["revenueByPeriod"]
+        self.assertEqual([(w["period"], w["revenue"]) for w in weeks], [
+            ("2026-01-05", "55.50"), ("2026-01-12", "51.00"), ("2026-02-02", "10.00"),
+        ])
+        months = self.analytics(query, start="2026-01-06", end="2026-12-31", period="MONTH")["revenueByPeriod"]
+        self.assertEqual([(m["period"], m["ordersCount"]) for m in months], [("2026-01-01", 2), ("2026-02-01", 1)])
+
+    def test_top_customers_and_products(self):
+        data = self.analytics("""
+            query ($start: Date!, $end: Date!) {
+              topCustomers(start: $start, end: $end, limit: 1) { customer { name } ordersCount revenue }
+              topProducts(start: $start, end: $end) { product { name } quantity revenue }
+            }
+        """, start="2026-01-01", end="2026-01-31")
+        self.assertEqual(data["topCustomers"], [{"customer": {"name": "Ann"}, "ordersCount": 2, "revenue": "55.50"}])
+        self.assertEqual(data["topProducts"], [
+            {"product": {"name": "Chair"}, "quantity": 3, "revenue": "76.50"},
+            {"product": {"name": "Lamp"}, "quantity": 3, "revenue": "30.00"},
+        ])
+
+    def test_maintained_rollups_match_a_rebuild(self):
+        rows = [{"customerId": str(self.bob.pk), "productIds": [str(self.lamp.pk)], "orderDate": "2026-01-06T08:00:00+00:00"}]
+        response = self.query(
+            "mutation ($input: [OrderInput]!) { bulkCreateOrders(input: $input) { errors } }",
+            variables={"input": rows},
+        )
+        self.assertEqual(response.json()["data"]["bulkCreateOrders"]["errors"], [])
+        delete_customers(Customer.objects.filter(pk=self.ann.pk))
+        maintained = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), maintained)
+        # Ann's only order of the 5th is gone with its row; Bob's remains on the 6th.
+        self.assertEqual([row[1:] for row in maintained[0][:2]], [(1, Decimal("10.00")), (1, Decimal("51.00"))])
+
+    def test_invalid_arguments(self):
+        response = self.query("{ topProducts(start: \"2026-02-01\", end: \"2026-01-01\") { quantity } }")
+        self.assertEqual(response.json()["errors"][0]["message"], "'end' must not be before 'start'.")
+        response = self.query("{ topCustomers(start: \"2026-01-01\", end: \"2026-01-31\", limit: 0) { revenue } }")
+        self.assertEqual(response.json()["errors"][0]["message"], "'limit' must be between 1 and 100.")
+
+
+class StockReservationTests(GraphQLTestCase):
+    MUTATION = """
+        mutation ($input: OrderInput!) { createOrder(input: $input) { order { id } message } }
+    """
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.a = Product.objects.create(name="A", price=Decimal("1.00"), stock=5)
+        self.b = Product.objects.create(name="B", price=Decimal("1.00"), stock=1)
+
+    def stocks(self):
+        return dict(Product.objects.values_list("name", "stock"))
+
+    def order(self, *products):
+        variables = {"input": {"customerId": str(self.customer.pk), "productIds": [str(p.pk) for p in products]}}
+        response = self.query(self.MUTATION, variables=variables)
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]["createOrder"]
+
+    def test_shortfall_rolls_back_the_whole_order(self):
+        self.assertIsNotNone(self.order(self.a, self.b)["order"])
+        self.assertEqual(self.stocks(), {"A": 4, "B": 0})
+        # A is decremented before B falls short: both are undone.
+        result = self.order(self.a, self.b)
+        self.assertEqual(result, {"order": None, "message": "Insufficient stock for B."})
+        self.assertEqual(self.stocks(), {"A": 4, "B": 0})
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_bulk_orders_short_of_stock_are_reported(self):
+        rows = [
+            {"customerId": str(self.customer.pk), "productIds": [str(self.a.pk)]},
+            {"customerId": str(self.customer.pk), "productIds": [str(self.a.pk), str(self.b.pk)]},
+            {"customerId": str(self.customer.pk), "productIds": [str(self.b.pk)]},
+        ]
+        response = self.query(
+            "mutation ($input: [OrderInput]!) { bulkCreateOrders(input: $input) { orders { id } errors } }",
+            variables={"input": rows},
+        )
+        self.assertResponseNoErrors(response)
+        result = response.json()["data"]["bulkCreateOrders"]
+        self.assertEqual(result["errors"], ["Order 2: Insufficient stock for B."])
+        self.assertEqual(len(result["orders"]), 2)
+        self.assertEqual(self.stocks(), {"A": 3, "B": 0})
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_BROKER_URL="memory://")
+class ReplenishmentTests(GraphQLTestCase):
+    MUTATION = """
+        mutation ($input: OrderInput!) { createOrder(input: $input) { order { id } } }
+    """
+
+    def setUp(self):
+        from crm.replenishment import get_cache
+
+        get_cache().clear()
+        self.customer = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.low = Product.objects.create(name="Low", price=Decimal("1.00"), stock=3)
+        self.plenty = Product.objects.create(name="Plenty", price=Decimal("1.00"), stock=50)
+        self.custom = Product.objects.create(
+            name="Custom", price=Decimal("1.00"), stock=50, reorder_threshold=100, reorder_quantity=40
+        )
+
+    def stocks(self):
+        return dict(Product.objects.values_list("name", "stock"))
+
+    def test_orders_replenish_their_low_products(self):
+        Product.objects.create(name="Elsewhere", price=Decimal("1.00"), stock=0)
+        products = [str(p.pk) for p in (self.low, self.plenty, self.custom)]
+        variables = {"input": {"customerId": str(self.customer.pk), "productIds": products}}
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch("crm.schema.stock_changed", wraps=stock_changed) as changed:
+            response = self.query(self.MUTATION, variables=variables)
+        self.assertResponseNoErrors(response)
+        product_ids = changed.call_args.args[0]
+        self.assertIsInstance(product_ids, list)
+        self.assertEqual(sorted(product_ids), sorted(p.pk for p in (self.low, self.plenty, self.custom)))
+        # Per-product threshold and quantity; products not ordered wait for the sweep.
+        self.assertEqual(self.stocks(), {"Low": 12, "Plenty": 49, "Custom": 89, "Elsewhere": 0})
+
+    def test_burst_coalesces_into_one_task(self):
+        from crm.replenishment import release, schedule
+
+        with mock.patch("crm.tasks.replenish_stock.apply_async") as apply_async:
+            self.assertEqual(schedule([self.low.pk, self.plenty.pk]), [self.low.pk])
+            self.assertEqual(schedule([self.low.pk]), [])
+            self.assertEqual(schedule([self.low.pk, self.custom.pk]), [self.custom.pk])
+            release([self.low.pk])
+            self.assertEqual(schedule([self.low.pk]), [self.low.pk])
+        self.assertEqual(apply_async.call_count, 3)
+
+        with mock.patch("crm.tasks.replenish_stock.apply_async", side_effect=ConnectionError), \
+                self.assertLogs("crm.replenishment", "ERROR"):
+            release([self.low.pk])
+            self.assertEqual(schedule([self.low.pk]), [])
+        # Not left pending: the next order tries again.
+        with mock.patch("crm.tasks.replenish_stock.apply_async"):
+            self.assertEqual(schedule([self.low.pk]), [self.low.pk])
+
+    def test_replenishment_is_idempotent(self):
+        from crm.tasks import replenish_stock
+
+        self.assertEqual(replenish_stock([self.low.pk]), [self.low.pk])
+        self.assertEqual(replenish_stock([self.low.pk]), [])
+        self.assertEqual(self.stocks()["Low"], 13)
+        # The daily sweep covers every product.
+        self.assertEqual(replenish_stock(), [self.custom.pk])
+        schedule = celery_app.conf.beat_schedule["replenish-low-stock"]
+        self.assertIn(schedule["task"], celery_app.tasks)
+
+
+class PersistedQueryTests(GraphQLTestCase):
+    QUERY = "{ hello }"
+
+    def setUp(self):
+        documents.get_document_cache().clear()
+
+    def post(self, body):
+        return self.client.post(self.GRAPHQL_URL, json.dumps(body), content_type="application/json")
+
+    def persisted(self, query=None, sha=None):
+        body = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": sha or documents.query_hash(self.QUERY)}}}
+        if query:
+            body["query"] = query
+        return self.post(body)
+
+    def test_documents_are_parsed_once(self):
+        with mock.patch("crm.documents.parse", wraps=documents.parse) as parse:
+            for _ in range(3):
+                self.assertResponseNoErrors(self.query(self.QUERY))
+        self.assertEqual(parse.call_count, 1)
+
+    def test_automatic_persisted_queries(self):
+        response = self.persisted()
+        self.assertEqual(response.json()["errors"][0]["message"], "PersistedQueryNotFound")
+        self.assertResponseNoErrors(self.persisted(query=self.QUERY))
+        response = self.persisted()
+        self.assertEqual(response.json()["data"], {"hello": "Hello, GraphQL!"})
+        response = self.persisted(query=self.QUERY, sha="0" * 64)
+        self.assertEqual(
+            response.json()["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_HASH_MISMATCH"
+        )
+
+    def test_invalid_documents_are_not_cached(self):
+        self.assertResponseHasErrors(self.query("{ nope }"))
+        self.assertEqual(len(documents.get_document_cache()), 0)
+
+    def test_cache_is_bounded(self):
+        cache = documents.DocumentCache(maxsize=2)
+        for key in "abc":
+            cache.set(key, object())
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("a"))
+
+    def test_only_registered_documents(self):
+        handle, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "w") as f:
+            json.dump({documents.query_hash(self.QUERY): self.QUERY}, f)
+        self.addCleanup(os.remove, path)
+        with self.settings(CRM_PERSISTED_QUERIES_ONLY=True, CRM_PERSISTED_QUERIES_FILE=path):
+            self.assertResponseNoErrors(self.persisted())
+            self.assertResponseNoErrors(self.query(self.QUERY))
+            response = self.query("{ customersCount }")
+            self.assertEqual(response.json()["errors"][0]["message"], "PersistedQueryNotRegistered")
+
+
+@override_settings(CRM_RESPONSE_CACHE={"ENABLED": True, "CACHE": "default", "TIMEOUT": 60})
+class ResponseCacheTests(GraphQLTestCase):
+    PRODUCTS = "{ allProducts(first: 10) { edges { node { name stock } } } }"
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        Product.objects.create(name="Widget", price=Decimal("3.00"), stock=2)
+
+    def products(self):
+        response = self.query(self.PRODUCTS)
+        self.assertResponseNoErrors(response)
+        return [edge["node"] for edge in response.json()["data"]["allProducts"]["edges"]]
+
+    def cache_stats(self):
+        return self.query("{ responseCacheStats { hits misses } }").json()["data"]["responseCacheStats"]
+
+    def test_repeated_queries_skip_the_database(self):
+        self.products()
+        with self.assertNumQueries(0):
+            self.products()
+        self.assertEqual(self.cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_mutation_invalidates_its_tag_only(self):
+        self.assertEqual(self.products(), [{"name": "Widget", "stock": 2}])
+        self.query("{ customersCount }")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.query("mutation { updateLowStockProducts { message } }")
+        self.assertEqual(self.products(), [{"name": "Widget", "stock": 12}])
+        with self.assertNumQueries(0):
+            self.query("{ customersCount }")
+
+    @override_settings(CRM_REPLENISHMENT={"ENABLED": False})
+    def test_orders_invalidate_the_stock_they_take(self):
+        customer = Customer.objects.create(name="Ann", email="ann@example.com")
+        widget = Product.objects.get()
+        self.assertEqual(self.products(), [{"name": "Widget", "stock": 2}])
+        mutation = """
+            mutation ($input: OrderInput!) { createOrder(input: $input) { order { id } message } }
+        """
+        variables = {"input": {"customerId": str(customer.pk), "productIds": [str(widget.pk)]}}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertResponseNoErrors(self.query(mutation, variables=variables))
+        self.assertEqual(self.products(), [{"name": "Widget", "stock": 1}])
+
+    def test_variables_are_part_of_the_key(self):
+        query = "query ($n: String) { allProducts(first: 5, name: $n) { edges { node { name } } } }"
+        first = self.query(query, variables={"n": "Widget"}).json()["data"]
+        second = self.query(query, variables={"n": "Gadget"}).json()["data"]
+        self.assertEqual(len(first["allProducts"]["edges"]), 1)
+        self.assertEqual(len(second["allProducts"]["edges"]), 0)
+
+    def test_nested_types_are_tagged(self):
+        query = "{ allCustomers(first: 5) { edges { node { orders { totalCount } } } } }"
+        tags, cacheable = response_cache.document_tags(
+            schema.graphql_schema, documents.parse(query)
+        )
+        self.assertEqual(tags, {"customer", "order"})
+        self.assertTrue(cacheable)
+
+
+class QueryLimitsTests(GraphQLTestCase):
+    def cost(self, query, variables=None):
+        return analyze(schema.graphql_schema, documents.parse(query), variables)
+
+    def test_connections_multiply_their_selection(self):
+        query = """
+            query ($n: Int) {
+              customersCount
+              allOrders(first: $n) { edges { node { customer { name } products(first: 5) { edges { node { name } } } } } }
+            }
+        """
+        # allOrders 1 + n * (edges 1 + node 1 + customer 1 + products (1 + 5 * (edges 1 + node 1)))
+        self.assertEqual(self.cost(query, {"n": 10}), (1 + 10 * 14, 7))
+        # Without first/last a connection is assumed to return a full page,
+        # and a connection nested in another one a few rows per parent.
+        self.assertEqual(self.cost("{ allProducts { edges { node { name } } } }"), (1 + 100 * 2, 4))
+        self.assertEqual(
+            self.cost("{ allOrders { edges { node { products { edges { node { name } } } } } } }"),
+            (1 + 100 * (1 + 1 + 1 + 10 * 2), 7),
+        )
+
+    def test_fragments_are_counted(self):
+        query = """
+            { allCustomers(first: 2) { ...page } }
+            fragment page on CustomerTypeConnection { edges { node { name } } }
+        """
+        self.assertEqual(self.cost(query), (1 + 2 * 2, 4))
+
+    def test_runaway_query_is_rejected_without_sql(self):
+        with self.assertNumQueries(0):
+            response = self.query("""
+                {
+                  allOrders(first: 10000) { edges { node { products { edges { node {
+                    name
+                  } } } } } }
+                }
+            """)
+        self.assertEqual(response.status_code, 400)
+        error = response.json()["errors"][0]
+        self.assertEqual(error["extensions"]["code"], "QUERY_TOO_COMPLEX")
+        self.assertEqual(error["extensions"]["cost"], 1 + 10000 * (1 + 1 + 1 + 10 * 2))
+        self.assertEqual(error["extensions"]["maxCost"], 5000)
+
+    def test_full_order_page_is_within_the_default_limits(self):
+        create_orders(orders=100)
+        response = self.query("""
+            {
+              allOrders(first: 100) {
+                edges { node { customer { name } products { edges { node { name } } } } }
+              }
+            }
+        """)
+        self.assertResponseNoErrors(response)
+        self.assertEqual(len(response.json()["data"]["allOrders"]["edges"]), 100)
+
+    def test_default_page_sizes_are_what_connections_return(self):
+        create_orders(customers=2, products=12, orders=48)
+        query = """
+            { allCustomers(first: 2) { edges { node { orders {
+                pageInfo { hasNextPage } edges { node { products { edges { node { name } } } } }
+            } } } } }
+        """
+        explicit = query.replace("orders {", "orders(first: 10) {").replace("products {", "products(first: 10) {")
+        # allCustomers 1 + 2 * (edges 1 + node 1 + orders (1 + 10 * (pageInfo 1 + edges 1 + node 1 + products (1 + 10 * 2))))
+        self.assertEqual(self.cost(query), (1 + 2 * (3 + 10 * 24), 10))
+        self.assertEqual(self.cost(query), self.cost(explicit))
+
+        response = self.query(query)
+        self.assertResponseNoErrors(response)
+        customers = response.json()["data"]["allCustomers"]["edges"]
+        self.assertEqual(len(customers), 2)
+        for customer in customers:
+            orders = customer["node"]["orders"]
+            # 24 orders each, of up to 12 products: both connections stop at 10.
+            self.assertTrue(orders["pageInfo"]["hasNextPage"])
+            self.assertEqual(len(orders["edges"]), 10)
+            self.assertEqual(max(len(order["node"]["products"]["edges"]) for order in orders["edges"]), 10)
+        self.assertEqual(response.json(), self.query(explicit).json())
+
+    @override_settings(CRM_QUERY_LIMITS={"MAX_DEPTH": 4})
+    def test_depth_limit(self):
+        response = self.query("{ allCustomers(first: 1) { edges { node { orders { totalCount } } } } }")
+        error = response.json()["errors"][0]
+        self.assertEqual(error["extensions"]["code"], "QUERY_TOO_DEEP")
+        self.assertEqual(error["extensions"]["depth"], 5)
+        self.assertResponseNoErrors(self.query("{ allCustomers(first: 1) { edges { node { name } } } }"))
+
+    def test_introspection_is_not_limited(self):
+        with self.settings(CRM_QUERY_LIMITS={"MAX_COST": 1, "MAX_DEPTH": 1}):
+            self.assertResponseNoErrors(
+                self.query("{ __schema { types { name fields { name type { ofType { ofType { name } } } } } } }")
+            )
+
+
+class ProfilingTests(GraphQLTestCase):
+    QUERY = "{ a: customersCount b: customersCount allOrders(first: 5) { edges { node { customer { name } } } } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(customers=2, products=2, orders=5)
+        rebuild_stats()
+
+    def profiled(self, **headers):
+        response = self.query(self.QUERY, headers=headers)
+        self.assertResponseNoErrors(response)
+        return response.json().get("extensions", {}).get("profile")
+
+    @override_settings(DEBUG=True)
+    def test_opt_in_by_header(self):
+        self.assertIsNone(self.profiled())
+        with self.assertLogs("crm.profiling", "INFO") as logs:
+            profile = self.profiled(**{"X-CRM-Profile": "1"})
+        self.assertEqual(logs.records[0].crm_profile, profile)
+
+        # stats row twice, then the orders page joined with its customers
+        self.assertEqual(profile["sql"]["count"], 3)
+        self.assertEqual(len(profile["sql"]["duplicates"]), 1)
+        self.assertEqual(profile["sql"]["duplicates"][0]["count"], 2)
+        fields = {field["field"]: field for field in profile["resolvers"]}
+        self.assertEqual(fields["Query.customersCount"]["calls"], 2)
+        self.assertEqual(fields["OrderType.customer"]["calls"], 5)
+
+    def test_header_is_only_honoured_for_allowed_clients(self):
+        with self.assertNoLogs("crm.profiling", "INFO"):
+            self.assertIsNone(self.profiled(**{"X-CRM-Profile": "1"}))
+        with self.settings(CRM_PROFILING={"SECRET": "s3cret"}), self.assertLogs("crm.profiling", "INFO"):
+            self.assertIsNone(self.profiled(**{"X-CRM-Profile": "wrong"}))
+            self.assertIsNotNone(self.profiled(**{"X-CRM-Profile": "s3cret"}))
+
+        staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.client.force_login(staff)
+        with self.assertLogs("crm.profiling", "INFO"):
+            self.assertIsNotNone(self.profiled(**{"X-CRM-Profile": "1"}))
+
+    def test_sampled_profiles_are_only_logged(self):
+        with self.settings(CRM_PROFILING={"SAMPLE_RATE": 1.0}), self.assertLogs("crm.profiling", "INFO") as logs:
+            self.assertIsNone(self.profiled())
+        self.assertEqual(logs.records[0].crm_profile["sql"]["count"], 3)
+        with self.settings(DEBUG=True, CRM_PROFILING={"EXTENSIONS": False}):
+            with self.assertLogs("crm.profiling", "INFO"):
+                self.assertIsNone(self.profiled(**{"X-CRM-Profile": "1"}))
+
+
+class MetricsTests(GraphQLTestCase):
+    def setUp(self):
+        for metric in metrics.registry.metrics.values():
+            metric.values.clear()
+
+    def scrape(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_operations_mutations_and_queries_are_recorded(self):
+        self.query("query Counts { customersCount }", operation_name="Counts")
+        self.query('mutation { createProduct(input: {name: "Lamp", price: 5}) { product { id } } }')
+        text = self.scrape()
+        self.assertIn('crm_graphql_request_duration_seconds_count{operation="Counts",status="200"} 1', text)
+        self.assertIn('crm_graphql_request_duration_seconds_count{operation="anonymous",status="200"} 1', text)
+        self.assertIn('crm_graphql_mutation_duration_seconds_count{mutation="CreateProduct"} 1', text)
+        self.assertIn('crm_graphql_request_duration_seconds_bucket{operation="Counts",status="200",le="+Inf"} 1', text)
+        queries = metrics.registry.collect()["crm_db_queries_total"][("default",)]
+        self.assertGreaterEqual(queries, 2)
+
+    def test_jobs_are_recorded(self):
+        @metrics.observe_job
+        def failing_job():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            failing_job()
+        self.assertIn('crm_job_duration_seconds_count{job="failing_job",status="error"} 1', self.scrape())
+
+    def test_multiprocess_totals(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Another worker's file, as it would have been flushed.
+        other = {"crm_graphql_mutation_duration_seconds": [[["CreateOrder"], [1] + [0] * 13 + [0.002]]]}
+        with open(os.path.join(directory, "1-other.json"), "w") as f:
+            json.dump(other, f)
+        with self.settings(CRM_METRICS={"MULTIPROCESS_DIR": directory}):
+            metrics.MUTATION_DURATION.observe(0.2, mutation="CreateOrder")
+            text = self.scrape()
+        self.assertIn('crm_graphql_mutation_duration_seconds_count{mutation="CreateOrder"} 2', text)
+        self.assertIn('crm_graphql_mutation_duration_seconds_bucket{mutation="CreateOrder",le="0.005"} 1', text)
+        self.assertIn('crm_graphql_mutation_duration_seconds_sum{mutation="CreateOrder"} 0.202', text)
+
+
+class GenerateCRMDataTests(TestCase):
+    OPTIONS = dict(customers=30, products=10, orders=200, seed=7, end="2025-06-30", chunk_size=64, flush=True)
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command("generate_crm_data", stdout=out, **dict(self.OPTIONS, **options))
+        return out.getvalue()
+
+    def snapshot(self):
+        return list(Order.objects.order_by("pk").values_list(
+            "customer__email", "total_amount", "order_date", "products__name"
+        ))
+
+    def test_deterministic_and_reported(self):
+        output = self.generate()
+        self.assertIn("orders: 200/200 (100%)", output)
+        first = self.snapshot()
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+        self.generate(seed=8)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_distributions_and_totals(self):
+        self.generate()
+        self.assertEqual(get_stats().orders_count, 200)
+        self.assertGreater(Customer.objects.filter(created_at__year=2024).count(), 0)
+        for order in Order.objects.select_related("customer").prefetch_related("products")[:50]:
+            self.assertGreaterEqual(order.order_date, order.customer.created_at)
+            self.assertEqual(order.total_amount, sum(p.price for p in order.products.all()))
+            self.assertTrue(1 <= len(order.products.all()) <= 5)
+        popularity = sorted(Product.objects.annotate(n=Count("orders")).values_list("n", flat=True))
+        # Zipf: the most popular product is ordered far more than the least.
+        self.assertGreater(popularity[-1], 4 * popularity[0])
+
+
+class FlushCRMDataTests(TransactionTestCase):
+    # Foreign keys are only checked once the flush commits, which a
+    # TestCase transaction never does.
+    def test_flush_twice(self):
+        options = dict(customers=10, products=5, orders=40, seed=3, end="2025-06-30", flush=True)
+        call_command("generate_crm_data", stdout=StringIO(), **options)
+        first = list(DailyRevenue.objects.order_by("date").values_list("date", "orders_count", "revenue"))
+        self.assertTrue(first)
+        call_command("generate_crm_data", stdout=StringIO(), **options)
+        self.assertEqual(Order.objects.count(), 40)
+        self.assertEqual(get_stats().orders_count, 40)
+        self.assertEqual(
+            list(DailyRevenue.objects.order_by("date").values_list("date", "orders_count", "revenue")), first
+        )
+
+        call_command("generate_crm_data", stdout=StringIO(), **dict(options, customers=0, orders=0))
+        self.assertFalse(DailyCustomerRevenue.objects.exists())
+        self.assertFalse(DailyProductSales.objects.exists())
+        stats = get_stats()
+        self.assertEqual((stats.customers_count, stats.orders_count, stats.total_revenue), (0, 0, 0))
+
+
+class SearchTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        alice = Customer.objects.create(name="Alice Martin", email="alice@example.com")
+        bob = Customer.objects.create(name="Bob", email="bob.martin@corp.example")
+        lamp = Product.objects.create(name="Desk Lamp", price=Decimal("20.00"), stock=3)
+        chair = Product.objects.create(name="Lamp Chair", price=Decimal("50.00"), stock=3)
+        Product.objects.create(name="Table", price=Decimal("80.00"), stock=3)
+        add_items(Order.objects.create(customer=alice), [lamp, chair])
+        Order.objects.create(customer=bob)
+
+    def names(self, field, search, node="name"):
+        response = self.query(
+            f'{{ {field}(first: 10, search: "{search}") {{ edges {{ node {{ {node} }} }} }} }}'
+        )
+        self.assertResponseNoErrors(response)
+        return [edge["node"] for edge in response.json()["data"][field]["edges"]]
+
+    def test_search_modes(self):
+        self.assertEqual(self.names("allCustomers", "MARTIN"), [{"name": "Alice Martin"}, {"name": "Bob"}])
+        self.assertEqual(self.names("allProducts", "lamp"), [{"name": "Desk Lamp"}, {"name": "Lamp Chair"}])
+        # Two matching products, still one order.
+        self.assertEqual(
+            self.names("allOrders", "lamp", "customer { name }"), [{"customer": {"name": "Alice Martin"}}]
+        )
+        self.assertEqual(len(self.names("allOrders", "bob", "id")), 1)
+
+    def test_product_filters_return_each_order_once(self):
+        lamp = Product.objects.get(name="Desk Lamp")
+        chair = Product.objects.get(name="Lamp Chair")
+        for customer in Customer.objects.all():
+            add_items(Order.objects.create(customer=customer), [lamp, chair])
+        for arguments in ['productName: "lamp"', f"productId: {lamp.pk}"]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.query(
+                    f"{{ allOrders(first: 2, {arguments}) {{ edges {{ node {{ id }} }} pageInfo {{ hasNextPage }} }} }}"
+                )
+            self.assertResponseNoErrors(response)
+            data = response.json()["data"]["allOrders"]
+            ids = [edge["node"]["id"] for edge in data["edges"]]
+            # Three orders carry both products: a full page, no repeats.
+            self.assertEqual(len(set(ids)), 2, arguments)
+            self.assertTrue(data["pageInfo"]["hasNextPage"])
+            self.assertNotIn('JOIN "crm_order_products"', queries[-1]["sql"], arguments)
+
+    def test_range_filters_are_indexed(self):
+        expected = {Customer: ["created_at", "id"], Product: ["stock", "id"], Order: ["order_date", "id"]}
+        for model, columns in expected.items():
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            self.assertIn(columns, [c["columns"] for c in constraints.values() if c["index"]], model)
+
+
+@override_settings(CRM_EXPORT={"CHUNK_SIZE": 5})
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.products, _ = create_orders()
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_orders_ndjson_in_chunks(self):
+        # Session and user, the orders, then one through-table query per chunk of 5 orders.
+        with self.assertNumQueries(2 + 5):
+            body = self.read(self.client.get("/export/orders"))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["id"] for row in rows], list(Order.objects.order_by("pk").values_list("pk", flat=True)))
+        order = Order.objects.order_by("pk")[3]
+        self.assertEqual(rows[3]["customer_id"], order.customer_id)
+        self.assertEqual(rows[3]["total_amount"], str(order.total_amount))
+        self.assertEqual(rows[3]["product_ids"], sorted(order.products.values_list("pk", flat=True)))
+
+    def test_filters_match_the_api(self):
+        body = self.read(self.client.get("/export/orders", {"customer_name": "Customer 1", "product_name": "Product 3"}))
+        self.assertEqual(len(body.splitlines()), 1)
+        response = self.client.get("/export/customers", {"format": "csv", "email": "customer2"})
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0], "id,name,email,phone,created_at")
+        self.assertEqual(len(lines), 2)
+        self.assertIn("customer2@example.com", lines[1])
+
+    def test_invalid_requests(self):
+        response = self.client.get("/export/orders", {"order_date__gte": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("order_date__gte", response.json()["errors"])
+        self.assertEqual(self.client.get("/export/orders", {"format": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get("/export/products").status_code, 404)
+
+    def test_staff_or_view_permission_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/export/customers").status_code, 403)
+        self.assertEqual(self.client.get("/export/orders", {"format": "csv"}).status_code, 403)
+        clerk = User.objects.create_user("clerk")
+        clerk.user_permissions.add(Permission.objects.get(codename="view_customer"))
+        self.client.force_login(clerk)
+        self.read(self.client.get("/export/customers"))
+        self.assertEqual(self.client.get("/export/orders").status_code, 403)
+
+    def test_command(self):
+        out = StringIO()
+        last = self.products[-1].pk
+        call_command("export_crm_data", "orders", "--format", "csv", "--filter", f"product_id={last}", stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "id,customer_id,total_amount,order_date,product_ids")
+        # Every fourth order carries all four products.
+        self.assertEqual(len(lines) - 1, 5)
+        all_products = " ".join(str(product.pk) for product in self.products)
+        self.assertTrue(all(line.endswith(f",{all_products}") for line in lines[1:]), lines)
+        with self.assertRaisesMessage(Exception, "Invalid filters"):
+            call_command("export_crm_data", "customers", "--filter", "created_at__gte=soon", stdout=StringIO())
+
+
+class ImportTests(TestCase):
+    CUSTOMERS = (
+        "name,email,phone\n"
+        "Ann,ann@example.com,+1234567890\n"
+        "Bad Phone,bad@example.com,12345\n"
+        "Old,taken@example.com,\n"
+        "Ann Again,ann@example.com,\n"
+        ",noname@example.com,\n"
+        "Ben,ben@example.com,123-456-7890\n"
+    )
+
+    def setUp(self):
+        Customer.objects.create(name="Taken", email="taken@example.com")
+        rebuild_stats()
+        self.staff = User.objects.create_user("staff", is_staff=True)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_command_validates_by_chunk_and_reports_errors(self):
+        path = self.write("customers.csv", self.CUSTOMERS)
+        report = os.path.join(self.tmp, "errors.csv")
+        out = StringIO()
+        call_command("import_crm_data", "customers", path, "--chunk-size", "2", "--errors", report, stdout=out)
+        self.assertIn('"created": 2, "updated": 0, "skipped": 1, "failed": 3', out.getvalue())
+        self.assertEqual(get_stats().customers_count, 3)
+        with open(report) as f:
+            errors = list(csv.reader(f))
+        self.assertEqual([row[:2] for row in errors[1:]], [
+            ["3", "Invalid phone number format."],
+            ["5", "Duplicate email in input."],
+            ["6", "name: This field cannot be blank."],
+        ])
+
+        path = self.write("update.csv", "name,email\nNew Name,taken@example.com\n")
+        call_command("import_crm_data", "customers", path, "--mode", "update", stdout=StringIO())
+        self.assertEqual(Customer.objects.get(email="taken@example.com").name, "New Name")
+        self.assertEqual(get_stats().customers_count, 3)
+
+    def test_checkpoint_resumes_after_last_chunk(self):
+        from crm.importer import import_rows, read_rows
+
+        checkpoint = os.path.join(self.tmp, "checkpoint.json")
+        rows = list(read_rows(StringIO(self.CUSTOMERS), "csv"))
+
+        def interrupted():
+            yield from rows[:3]
+            raise RuntimeError("connection lost")
+
+        with self.assertRaises(RuntimeError):
+            import_rows("customers", interrupted(), chunk_size=2, checkpoint=checkpoint, source="test")
+        self.assertTrue(Customer.objects.filter(email="ann@example.com").exists())
+        summary = import_rows("customers", rows, chunk_size=2, checkpoint=checkpoint, source="test")
+        self.assertEqual(summary["rows"], 6)
+        self.assertEqual(summary["created"], 2)
+        self.assertEqual(Customer.objects.count(), 3)
+        with self.assertRaisesMessage(ValueError, "another import"):
+            import_rows("customers", rows, checkpoint=checkpoint, source="other")
+
+    def test_upload_products(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        self.client.force_login(self.staff)
+        product = Product.objects.create(name="Lamp", price=Decimal("5.00"), stock=1)
+        content = "\n".join([
+            json.dumps({"id": product.pk, "name": "Lamp", "price": "7.50", "stock": 4}),
+            json.dumps({"name": "Desk", "price": 120}),
+            json.dumps({"name": "Free", "price": "0"}),
+            "not json",
+        ]).encode()
+        response = self.client.post(
+            "/import/products", {"file": SimpleUploadedFile("products.ndjson", content), "mode": "update"}
+        )
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertEqual((summary["created"], summary["updated"], summary["failed"]), (1, 1, 2))
+        self.assertEqual(summary["errors"], [
+            {"line": 3, "error": "Price must be positive."},
+            {"line": 4, "error": "Not a JSON object."},
+        ])
+        product.refresh_from_db()
+        self.assertEqual((product.price, product.stock), (Decimal("7.50"), 4))
+        self.assertEqual(Product.objects.get(name="Desk").stock, 0)
+        self.assertEqual(self.client.post("/import/products").status_code, 400)
+
+    def test_upload_needs_staff_or_model_permissions(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        def upload(mode="skip"):
+            content = SimpleUploadedFile("customers.csv", self.CUSTOMERS.encode())
+            return self.client.post("/import/customers", {"file": content, "mode": mode}).status_code
+
+        self.assertEqual(upload(), 403)
+        self.assertEqual(upload("update"), 403)
+        clerk = User.objects.create_user("clerk")
+        clerk.user_permissions.add(Permission.objects.get(codename="add_customer"))
+        self.client.force_login(clerk)
+        self.assertEqual(upload("update"), 403)
+        self.assertEqual(Customer.objects.get(email="taken@example.com").name, "Taken")
+        self.assertEqual(upload(), 200)
+
+        # Session-authenticated uploads need the CSRF token too.
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(self.staff)
+        self.assertEqual(upload(), 403)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_case_runs(self):
+        from benchmarks.datasets import generate
+        from benchmarks.graphql_suite import cases, run_case
+
+        dataset = generate(customers=10, products=5, orders=20, seed=1)
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(OrderItem.objects.count(), 60)
+        for name, document, variables, is_mutation in cases(dataset):
+            result = run_case(document, variables, is_mutation, iterations=2, warmup=0)
+            self.assertGreater(result["queries"]["min"], 0, name)
+        # Mutations were rolled back.
+        self.assertEqual(Customer.objects.count(), 10)
+
+
+class AsyncGraphQLViewTests(TransactionTestCase):
+    # Root fields run in worker threads with their own connections, so the
+    # data must be committed rather than held in a test transaction.
+    QUERY = """
+        {
+          customersCount
+          ordersCount
+          allOrders(first: 3) { edges { node { customer { name } products { totalCount } } } }
+        }
+    """
+
+    def setUp(self):
+        create_orders(customers=3, products=2, orders=6)
+        rebuild_stats()
+
+    def post(self, query, **headers):
+        request = AsyncRequestFactory().post(
+            "/graphql", json.dumps({"query": query}), content_type="application/json", headers=headers
+        )
+        response = async_to_sync(AsyncCRMGraphQLView.as_view())(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_matches_synchronous_execution(self):
+        status, body = self.post(self.QUERY)
+        self.assertEqual(status, 200)
+        self.assertEqual(body, schema.execute(self.QUERY).formatted)
+
+    def test_root_fields_resolve_concurrently(self):
+        # Both count fields wait for each other: this only completes if they
+        # run at the same time.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def waiting_get_stats():
+            barrier.wait()
+            return get_stats()
+
+        with mock.patch("crm.schema.get_stats", side_effect=waiting_get_stats):
+            status, body = self.post("{ customersCount ordersCount }")
+        self.assertEqual(status, 200)
+        self.assertEqual(body, {"data": {"customersCount": 3, "ordersCount": 6}})
+
+    @override_settings(DEBUG=True)
+    def test_profiles_sql_of_worker_threads(self):
+        with self.assertLogs("crm.profiling", "INFO"):
+            status, body = self.post("{ customersCount ordersCount }", **{"X-CRM-Profile": "1"})
+        profile = body["extensions"]["profile"]
+        self.assertEqual(profile["sql"]["count"], 2)
+        self.assertEqual(len(profile["resolvers"]), 2)
+
+    def test_mutations_and_errors_use_the_sync_path(self):
+        status, body = self.post("""mutation { createProduct(input: {name: "Lamp", price: 5, stock: 1}) { product { name } } }""")
+        self.assertEqual(body["data"]["createProduct"]["product"], {"name": "Lamp"})
+        status, body = self.post("{ noSuchField }")
+        self.assertEqual(status, 400)
+        self.assertIn("noSuchField", body["errors"][0]["message"])
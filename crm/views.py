@@ -1,3 +1,358 @@
-from django.shortcuts import render
+import csv
+import io
+import json
+import time
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse,
+    StreamingHttpResponse,
+)
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate_schema
+
+from crm import export, importer, metrics, response_cache
+from crm.complexity import check_query_limits
+from crm.concurrency import ConcurrentExecutionContext
+from crm.dataloaders import Loaders
+from crm.documents import query_hash, resolve_document
+from crm.profiling import ProfilingMiddleware, get_profile, header_value, report, start_profile
+
+
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView that resolves documents through crm.documents: persisted
+    query hashes and a bounded LRU of parsed + validated documents replace
+    the per-request parse and validate. Operations over the CRM_QUERY_LIMITS
+    cost or depth are rejected before execution (crm.complexity). Query
+    operations are answered from crm.response_cache when CRM_RESPONSE_CACHE
+    is enabled. Requests selected by crm.profiling (CRM_PROFILING) are
+    logged with their resolver and SQL timings, which are also returned in
+    ``extensions.profile`` to the clients allowed to ask for them.
+    """
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        if get_profile(request) is not None:
+            middleware = list(middleware or []) + [ProfilingMiddleware()]
+        return middleware
+
+    def get_response(self, request, data, show_graphiql=False):
+        start = time.perf_counter()
+        query, _, operation_name, _ = self.get_graphql_params(request, data)
+        profile = start_profile(request, operation_name, query_hash(query) if query else None)
+        if profile is None:
+            result, status_code = super().get_response(request, data, show_graphiql)
+        else:
+            with profile.capture_sql():
+                result, status_code = super().get_response(request, data, show_graphiql)
+            extension = report(profile)
+            if result is not None and extension is not None:
+                response = json.loads(result)
+                response.setdefault("extensions", {})["profile"] = extension
+                result = self.json_encode(request, response, pretty=show_graphiql)
+        if result is not None:
+            metrics.observe_request(operation_name, status_code, time.perf_counter() - start)
+        return result, status_code
+
+    @staticmethod
+    def get_extensions(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except Exception:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            document, errors = resolve_document(
+                schema, query, self.get_extensions(request, data), self.validation_rules
+            )
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+        if document is None:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        try:
+            check_query_limits(schema, document, variables, operation_name)
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.QUERY
+                and response_cache.is_enabled()
+            ):
+                return self.execute_cached(schema, document, variables, operation_name, execute_options)
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    @staticmethod
+    def execute_cached(schema, document, variables, operation_name, execute_options):
+        key = response_cache.cache_key(schema, document, variables, operation_name)
+        if key is None:
+            return execute(schema, document, **execute_options)
+        data = response_cache.get_response(key)
+        if data is not None:
+            return ExecutionResult(data=data)
+        result = execute(schema, document, **execute_options)
+        if not result.errors:
+            response_cache.set_response(key, result.data)
+        return result
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """
+    CRMGraphQLView for the ASGI application (see alx_backend_graphql/asgi.py).
+
+    Query operations are executed on the event loop with each root field
+    resolved concurrently in crm.concurrency's bounded thread pool, so one
+    slow root field no longer delays the others and a waiting request does
+    not hold a thread. Mutations, batches, GraphiQL and invalid documents
+    take the synchronous CRMGraphQLView path in a thread.
+    """
+
+    view_is_async = True
+    execution_context_class = ConcurrentExecutionContext
+
+    async def dispatch(self, request, *args, **kwargs):
+        sync_dispatch = sync_to_async(super().dispatch)
+        if self.batch or request.method.lower() not in ("get", "post"):
+            return await sync_dispatch(request, *args, **kwargs)
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_dispatch(request, *args, **kwargs)
+            query, variables, operation_name, _ = self.get_graphql_params(request, data)
+            document = self.query_document(request, data, query, operation_name)
+        except HttpError:
+            # The synchronous path builds the same error response.
+            document = None
+        if document is None:
+            return await sync_dispatch(request, *args, **kwargs)
+
+        start = time.perf_counter()
+        if header_value(request) and hasattr(request, "auser"):
+            # Staff may ask for a profile; resolve the lazy user off the loop.
+            request.user = await request.auser()
+        profile = start_profile(request, operation_name, query_hash(query) if query else None)
+        result = await self.execute_query(request, document, variables, operation_name)
+        response, status_code = {}, 200
+        if result.errors:
+            response["errors"] = [self.format_error(e) for e in result.errors]
+            if any(not getattr(e, "path", None) for e in result.errors):
+                status_code = 400
+        if status_code == 200:
+            response["data"] = result.data
+        if profile is not None:
+            extension = report(profile)
+            if extension is not None:
+                response["extensions"] = {"profile": extension}
+        metrics.observe_request(operation_name, status_code, time.perf_counter() - start)
+        return HttpResponse(
+            status=status_code, content=self.json_encode(request, response), content_type="application/json"
+        )
+
+    def query_document(self, request, data, query, operation_name):
+        """The request's document if it is a valid query operation, else None."""
+        schema = self.schema.graphql_schema
+        if validate_schema(schema):
+            return None
+        try:
+            document, errors = resolve_document(
+                schema, query, self.get_extensions(request, data), self.validation_rules
+            )
+        except GraphQLError:
+            return None
+        if errors or document is None:
+            return None
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return None
+        return document
+
+    async def execute_query(self, request, document, variables, operation_name):
+        schema = self.schema.graphql_schema
+        try:
+            check_query_limits(schema, document, variables, operation_name)
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        key = None
+        if response_cache.is_enabled():
+            key = await sync_to_async(response_cache.cache_key)(schema, document, variables, operation_name)
+            if key is not None:
+                data = await sync_to_async(response_cache.get_response)(key)
+                if data is not None:
+                    return ExecutionResult(data=data)
+
+        # Created up front so that every root field shares one set of loaders.
+        request.crm_loaders = Loaders()
+        try:
+            result = execute(
+                schema,
+                document,
+                root_value=self.get_root_value(request),
+                context_value=self.get_context(request),
+                variable_values=variables,
+                operation_name=operation_name,
+                middleware=self.get_middleware(request),
+                execution_context_class=self.execution_context_class,
+            )
+            if isawaitable(result):
+                result = await result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+        if key is not None and not result.errors:
+            await sync_to_async(response_cache.set_response)(key, result.data)
+        return result
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint: totals of every process sharing CRM_METRICS."""
+    return HttpResponse(metrics.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _permitted(request, *perms):
+    """Whether the user of ``request`` is staff or holds all of ``perms``."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return False
+    return user.is_staff or user.has_perms(perms)
+
+
+async def _iterate_in_thread(iterator):
+    # Under ASGI, Django reads a sync iterator to its end before sending a
+    # byte; advance it block by block in the thread that owns its cursor.
+    next_block = sync_to_async(next, thread_sensitive=True)
+    while (block := await next_block(iterator, None)) is not None:
+        yield block
+
+
+def export_view(request, kind):
+    """
+    Stream every customer or order matching the query string, as NDJSON
+    (default) or CSV with ``?format=csv``. The other parameters are the
+    fields of CustomerFilter/OrderFilter, e.g. ``?customer_name=Ann``.
+    Staff only, or users allowed to view the exported model.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    if kind not in export.EXPORTS:
+        raise Http404(f"Nothing to export as {kind!r}.")
+    model = export.EXPORTS[kind][0]
+    if not _permitted(request, f"{model._meta.app_label}.view_{model._meta.model_name}"):
+        return HttpResponseForbidden(f"Not allowed to export {kind}.")
+    params = request.GET.copy()
+    format = params.pop("format", ["ndjson"])[-1]
+    try:
+        columns, rows = export.export_rows(kind, params)
+        content = export.render(columns, rows, format)
+    except ValidationError as e:
+        return JsonResponse({"errors": e.message_dict}, status=400)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if isinstance(request, ASGIRequest):
+        content = _iterate_in_thread(content)
+    response = StreamingHttpResponse(content, content_type=export.CONTENT_TYPES[format])
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{format}"'
+    return response
+
+
+def import_view(request, kind):
+    """
+    Import an uploaded CSV or NDJSON file of customers or products: the
+    multipart ``file`` field, with optional ``format`` and ``mode``
+    ("skip" or "update" existing rows). Answers with the counts and the
+    first row errors. Staff only, or users allowed to add (and, to update,
+    change) the imported model.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    if kind not in ("customers", "products"):
+        raise Http404(f"Nothing to import as {kind!r}.")
+    mode = request.POST.get("mode", "skip")
+    model_name = kind[:-1]
+    perms = [f"crm.add_{model_name}"] + ([f"crm.change_{model_name}"] if mode == "update" else [])
+    if not _permitted(request, *perms):
+        return HttpResponseForbidden(f"Not allowed to import {kind}.")
+    upload = request.FILES.get("file")
+    if upload is None:
+        return HttpResponseBadRequest("Upload the rows as a multipart 'file' field.")
+    format = request.POST.get("format") or importer.format_for(upload.name)
+    if format is None:
+        return HttpResponseBadRequest("Cannot tell the format from the file name; send format=csv or ndjson.")
+    # Large uploads are spooled to a temporary file and read back by chunks.
+    stream = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    try:
+        summary = importer.import_rows(kind, importer.read_rows(stream, format), mode=mode)
+    except (ValueError, csv.Error) as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(summary)